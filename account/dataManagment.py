@@ -1,10 +1,12 @@
 from misc import models, logging
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import HTTPException, status, File, UploadFile
 from misc import db, schemas
+import travel
 
-def get_user_data(user_id: str, session: Session):
-    user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+async def get_user_data(user_id: str, session: AsyncSession):
+    user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
     if not user:
         logging.log(f"User {user_id} not found", "warning")
         raise HTTPException(status_code=404, detail="User not found")
@@ -25,8 +27,8 @@ def get_user_data(user_id: str, session: Session):
         "points": points,
     }
 
-def update_user_data(user_id: str, field: str, data: str, file, session: Session):
-    user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+async def update_user_data(user_id: str, field: str, data: str, file, session: AsyncSession):
+    user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
     if not user:
         logging.log(f"User {user_id} not found", "warning")
         raise HTTPException(status_code=404, detail="User not found")
@@ -42,54 +44,35 @@ def update_user_data(user_id: str, field: str, data: str, file, session: Session
             buffer.write(file)
         setattr(user, "pfp_url", file_location)
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
         return {"success": True, "updated_field": "pfp_url", "new_value": file_location}
     
     setattr(user, field, data)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     return {"success": True, "updated_field": field, "new_value": data}
 
-def get_user_data_hours(user_id: str, session: Session):
-    user_hours = session.exec(select(models.UserHours).where(models.UserHours.user_id == int(user_id))).first()
+async def get_user_data_hours(user_id: str, session: AsyncSession):
+    user_hours = (await session.exec(select(models.UserHours).where(models.UserHours.user_id == int(user_id)))).first()
     if not user_hours:
         # Create UserHours record if it doesn't exist
         user_hours = models.UserHours(user_id=int(user_id))
         session.add(user_hours)
-        session.commit()
-        session.refresh(user_hours)
+        await session.commit()
+        await session.refresh(user_hours)
         logging.log(f"Created UserHours record for user {user_id}", "info")
     
-    # struct for hours data
+    # period values are bucket sums from the daily rollup, the stored columns are not maintained
+    hours = await travel.get_user_hours_async(session, user_id)
     return {
         "id": user_hours.id,
         "user_id": user_hours.user_id,
-        "hours": {
-            "total": user_hours.hoursTotal,
-            "weekly": user_hours.hoursWeekly,
-            "monthly": user_hours.hoursMonthly,
-            "daily": user_hours.hoursDaily    
-        },
+        "hours": hours["total"],
         "transport": {
-            "bus": {
-                "total": user_hours.bus_hoursTotal,
-                "weekly": user_hours.bus_hoursWeekly,
-                "monthly": user_hours.bus_hoursMonthly,
-                "daily": user_hours.bus_hoursDaily    
-            },
-            "train": {
-                "total": user_hours.train_hoursTotal,
-                "weekly": user_hours.train_hoursWeekly,
-                "monthly": user_hours.train_hoursMonthly,
-                "daily": user_hours.train_hoursDaily    
-            },
-            "ferry": {  # was "fairy" lol
-                "total": user_hours.ferry_hoursTotal,
-                "weekly": user_hours.ferry_hoursWeekly,
-                "monthly": user_hours.ferry_hoursMonthly,
-                "daily": user_hours.ferry_hoursDaily    
-            },
+            "bus": hours["bus"],
+            "train": hours["train"],
+            "ferry": hours["ferry"],
         }
-    }
\ No newline at end of file
+    }
@@ -4,10 +4,11 @@ API Verification Script
 Quick test to verify all major API endpoints are working
 """
 
+import os
 import requests
 import json
 
-BASE_URL = "http://localhost:8001"
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8001")
 
 def test_public_endpoints():
     """Test public endpoints"""
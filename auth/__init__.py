@@ -5,8 +5,8 @@ from random import randrange
 from fastapi import Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy import select, update
-from sqlmodel import Session
-from misc import config, db, schemas, logging, models, email
+from sqlmodel.ext.asyncio.session import AsyncSession
+from misc import config, db, schemas, logging, models, email, leaderboard
 import pyotp
 ######
 # Auth Functions 
@@ -32,9 +32,9 @@ DB_NAME = jsonConfig['app']['nameDB']
 # Helper Functions
 # ======================
 
-def get_db_user(user_id: int, session: Session) -> models.User:
+async def get_db_user(user_id: int, session: AsyncSession) -> models.User:
     """Retrieve user from database with error handling"""
-    user = session.exec(select(models.User).where(models.User.id == user_id)).first() # type: ignore
+    user = (await session.exec(select(models.User).where(models.User.id == user_id))).first() # type: ignore
     if not user:
         logging.log(f"User {user_id} not found", "warning")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -47,12 +47,12 @@ def get_db_user(user_id: int, session: Session) -> models.User:
 
 async def register(
     user: schemas.UserCreate,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Register a new user in the system"""
     try:
         # Check for existing user
-        existing_user = session.exec(select(models.User).where(models.User.email == user.email)).first() # type: ignore
+        existing_user = (await session.exec(select(models.User).where(models.User.email == user.email))).first() # type: ignore
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -61,14 +61,14 @@ async def register(
 
         # Generate unique user ID
         user_id = randrange(100000000, 999999999)
-        while session.exec(select(models.User).where(models.User.id == user_id)).first(): # type: ignore
+        while (await session.exec(select(models.User).where(models.User.id == user_id))).first(): # type: ignore
             user_id = randrange(100000000, 999999999)
 
         # Create new user object
         new_user = models.User(
             id=user_id,
             email=user.email,
-            hashed_password=hash_password(user.password),
+            hashed_password=await db.run_sync(hash_password, user.password),
             email_verified=False,
             name=user.name,
             phonenumber=user.phonenumber,
@@ -77,7 +77,9 @@ async def register(
 
         # Database operations
         session.add(new_user)
-        session.commit()
+        await session.commit()
+        for board in ("points", "xp"):
+            leaderboard.record_score(board, user_id, 0)
         
         # Generate tokens
         access_token = create_access_token({"sub": str(new_user.id) + str("a")})
@@ -85,7 +87,7 @@ async def register(
 
         # Send verification email
         if not DEBUG:
-            email.send_verify_email(new_user.email, verification_token)
+            await db.run_sync(email.send_verify_email, new_user.email, verification_token)
         else:
             logging.log(f"Verification URL: {BASE_URL}/verify-email/{verification_token}", "debug")
 
@@ -96,7 +98,7 @@ async def register(
         }
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"Registration error: {str(e)}", "error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -105,13 +107,13 @@ async def register(
     
 async def login(
     credentials: schemas.UserLogin,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Authenticate user and return access token"""
     try:
-        user = session.exec(select(models.User)
-                          .where(models.User.email == credentials.email)).first() # type: ignore
-        if not user or not verify_password(credentials.password, user[0].hashed_password):
+        user = (await session.exec(select(models.User)
+                          .where(models.User.email == credentials.email))).first() # type: ignore
+        if not user or not await db.run_sync(verify_password, credentials.password, user[0].hashed_password):
             logging.log(f"Failed login attempt for {credentials.email}", "warning")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -164,11 +166,11 @@ async def logout(token: str = Depends(schemas.oauth2_scheme)):
 
 async def initiate_password_reset(
     email: str,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Initiate password reset process"""
     try:
-        user = session.exec(select(models.User).where(models.User.email == email)).first() # type: ignore
+        user = (await session.exec(select(models.User).where(models.User.email == email))).first() # type: ignore
         if not user:
             # Still return success to prevent email enumeration
             return {"message": "If the email exists, reset instructions have been sent"}
@@ -184,7 +186,7 @@ async def initiate_password_reset(
             expires_at=expiry
         )
         session.add(reset_record)
-        session.commit()
+        await session.commit()
 
         if not DEBUG:
             # Send actual email
@@ -196,7 +198,7 @@ async def initiate_password_reset(
         return {"message": "Password reset instructions sent"}
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"Password reset initiation error: {str(e)}", "error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -205,19 +207,19 @@ async def initiate_password_reset(
 
 async def confirm_password_reset(
     reset_data: schemas.PasswordReset,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Finalize password reset with new password"""
     try:
         # Verify token
-        token_record = session.exec(
+        token_record = (await session.exec(
             select(models.PasswordResetToken)
             .where(
                 models.PasswordResetToken.token == reset_data.token, # type: ignore
                 models.PasswordResetToken.used == False, # type: ignore
                 models.PasswordResetToken.expires_at > datetime.utcnow() # type: ignore
             )
-        ).first() # type: ignore
+        )).first() # type: ignore
         
         if not token_record:
             raise HTTPException(
@@ -226,10 +228,10 @@ async def confirm_password_reset(
             )
         
         # Get user and update password
-        user = session.exec(
+        user = (await session.exec(
             select(models.User)
             .where(models.User.email == token_record.email) # type: ignore
-        ).first() # type: ignore
+        )).first() # type: ignore
         
         if not user:
             raise HTTPException(
@@ -238,12 +240,12 @@ async def confirm_password_reset(
             )
         
         # Update password
-        user.hashed_password = hash_password(reset_data.new_password) # type: ignore
+        user.hashed_password = await db.run_sync(hash_password, reset_data.new_password) # type: ignore
         
         # Mark token as used
         token_record.used = True
         
-        session.commit()
+        await session.commit()
         
         # Log the event
         logging.log(f"Password reset completed for {user.email}", "info")
@@ -253,7 +255,7 @@ async def confirm_password_reset(
     except HTTPException:
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"Password reset confirmation error: {str(e)}", "error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -262,7 +264,7 @@ async def confirm_password_reset(
     
 async def verify_email(
     token: str,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Verify user's email address"""
     try:
@@ -270,7 +272,7 @@ async def verify_email(
         if not jsonTokenResponse["valid"]:
             return jsonable_encoder(jsonTokenResponse)
         
-        user = session.exec(select(models.User).where(models.User.email == jsonTokenResponse['userid'])).first() # type: ignore
+        user = (await session.exec(select(models.User).where(models.User.email == jsonTokenResponse['userid']))).first() # type: ignore
 
         if not user:
             raise HTTPException(
@@ -278,8 +280,8 @@ async def verify_email(
                 detail="User not found"
             )
 
-        email = session.exec(select(str(models.User.email))  # type: ignore
-                            .where(models.User.email == jsonTokenResponse['userid'])).first()
+        email = (await session.exec(select(str(models.User.email))  # type: ignore
+                            .where(models.User.email == jsonTokenResponse['userid']))).first()
         
         if not email:
             raise HTTPException(
@@ -289,16 +291,16 @@ async def verify_email(
 
 
 
-        session.exec(update(models.User)
+        await session.exec(update(models.User)
                     .where(models.User.email == str(email)) # type: ignore
                     .values(email_verified=True))
-        session.commit()
+        await session.commit()
         
         logging.log(f"Email verified for user {user}", "info")
         return {"message": "Email successfully verified"}
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"Email verification error: {str(e)}", "error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -307,11 +309,11 @@ async def verify_email(
 
 async def request_email_verification(
     email: str,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Request email verification for the current user"""
     try:
-        current_user = session.exec(select(models.User).where(models.User.email == email)).first() # type: ignore
+        current_user = (await session.exec(select(models.User).where(models.User.email == email))).first() # type: ignore
         if not current_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -328,7 +330,7 @@ async def request_email_verification(
         verification_url = f"{BASE_URL}/verify-email/{verification_token}"
 
         if not DEBUG:
-            email.send_verify_email(current_user.email, verification_token)
+            await db.run_sync(email.send_verify_email, current_user.email, verification_token)
         else:
             logging.log(f"Verification URL: {verification_url}", "debug")
 
@@ -341,7 +343,7 @@ async def request_email_verification(
             detail="Failed to send verification email"
         )
     
-async def check_token(token: str, session: Session = Depends(db.get_session)):
+async def check_token(token: str, session: AsyncSession = Depends(db.get_async_session)):
     """Check if the token is valid"""
     try:
         if not is_token_valid(token):
@@ -359,17 +361,17 @@ async def check_token(token: str, session: Session = Depends(db.get_session)):
 
 async def enable_2fa(
     current_user: models.User = Depends(get_current_user),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Enable two-factor authentication for user"""
     try:
         #TODO: add auth
         # Generate MFA secret
         mfa_secret = pyotp.random_base32()
-        session.exec(update(models.User)
+        await session.exec(update(models.User)
                     .where(models.User.id == current_user.id) # type: ignore
                     .values(mfa_secret=mfa_secret))
-        session.commit()
+        await session.commit()
         
         # Generate provisioning URI for authenticator apps
         provisioning_uri = pyotp.totp.TOTP(mfa_secret).provisioning_uri(
@@ -380,7 +382,7 @@ async def enable_2fa(
         return {"provisioning_uri": provisioning_uri}
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"2FA enable error: {str(e)}", "error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -389,7 +391,7 @@ async def enable_2fa(
 
 async def revoke_tokens(
     current_user: models.User = Depends(get_current_user),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Revoke all tokens for the current user"""
     try:
@@ -400,13 +402,13 @@ async def revoke_tokens(
         )
         
         session.add(revocation)
-        session.commit()
+        await session.commit()
         
         logging.log(f"All tokens revoked for user {current_user.email}", "info")
         return {"message": "All tokens have been revoked. Please log in again."}
     
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"Token revocation error: {str(e)}", "error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
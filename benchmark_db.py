@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+SQLite Storage Profile Benchmark
+Runs writer processes (trip inserts and updates, one commit each, like the
+ping path) next to reader processes (history listings) on a scratch copy of
+the schema, once per storage profile. Each profile adds one setting to the
+previous one, so the table shows what each setting contributes.
+
+Usage: python benchmark_db.py [--writers N] [--readers N] [--seconds S]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import update
+from sqlmodel import SQLModel, Session, select
+from sqlalchemy.exc import OperationalError
+from misc import db, models
+
+USERS = 200
+SEED_TRIPS = 20
+
+# None keeps the driver/SQLite default for that setting
+_DEFAULTS = {"journalMode": None, "synchronous": None, "mmapSizeMB": None,
+             "cacheSizeMB": None, "busyTimeoutMs": None, "tempStore": None}
+PROFILES = [
+    ("sqlite defaults", {}),
+    ("+ WAL", {"journalMode": "WAL"}),
+    ("+ synchronous=NORMAL", {"synchronous": "NORMAL"}),
+    ("+ busy_timeout", {"busyTimeoutMs": db.SQLITE_PROFILE["busyTimeoutMs"]}),
+    ("+ mmap", {"mmapSizeMB": db.SQLITE_PROFILE["mmapSizeMB"]}),
+    ("+ cache_size, temp_store", {"cacheSizeMB": db.SQLITE_PROFILE["cacheSizeMB"],
+                                  "tempStore": db.SQLITE_PROFILE["tempStore"]}),
+]
+WORKER_POOL = {"size": 1, "maxOverflow": 0, "timeoutSeconds": 30, "recycleSeconds": -1}
+
+def _trip(user_id):
+    points = random.randint(20, 200)
+    return models.TravelHistory(
+        user_id=user_id, timestamp=datetime.utcnow(), startLatitude=52.5, startLongitude=13.4,
+        listLatitude=[52.5] * points, listLongitude=[13.4] * points, point_count=points,
+        distance=random.uniform(1, 20), duration=random.uniform(150, 3600)
+    )
+
+def _seed(url, profile):
+    engine = db.create_db_engine(url, profile, WORKER_POOL)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for user_id in range(1, USERS + 1):
+            for _ in range(SEED_TRIPS):
+                session.add(_trip(user_id))
+        session.commit()
+    engine.dispose()
+
+def _worker(role, url, profile, seconds, results):
+    engine = db.create_db_engine(url, profile, WORKER_POOL)
+    latencies, errors = [], 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        user_id = random.randint(1, USERS)
+        started = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                if role == "writer":
+                    trip = _trip(user_id)
+                    session.add(trip)
+                    session.commit()
+                    session.exec(update(models.TravelHistory).where(models.TravelHistory.id == trip.id)
+                                 .values(duration=trip.duration + 30))
+                    session.commit()
+                else:
+                    session.exec(
+                        select(models.TravelHistory.id, models.TravelHistory.timestamp, models.TravelHistory.point_count)
+                        .where(models.TravelHistory.user_id == user_id)
+                        .order_by(models.TravelHistory.timestamp.desc()).limit(50)
+                    ).all()
+        except OperationalError:
+            errors += 1  # "database is locked"
+            continue
+        latencies.append(time.perf_counter() - started)
+    engine.dispose()
+    results.put((role, latencies, errors))
+
+def _summarize(latencies, errors, seconds):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+    return f"{len(latencies) / seconds:9.0f} ops/s  p95 {p95:7.1f} ms  {errors:5d} errors"
+
+def run_profile(profile, writers, readers, seconds):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        _seed(url, profile)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_worker, args=(role, url, profile, seconds, results))
+                     for role in ["writer"] * writers + ["reader"] * readers]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    by_role = {}
+    for role, latencies, errors in collected:
+        entry = by_role.setdefault(role, ([], 0))
+        by_role[role] = (entry[0] + latencies, entry[1] + errors)
+    return {role: _summarize(latencies, errors, seconds) for role, (latencies, errors) in by_role.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite storage profiles with concurrent processes")
+    parser.add_argument("--writers", type=int, default=2, help="writer processes")
+    parser.add_argument("--readers", type=int, default=4, help="reader processes")
+    parser.add_argument("--seconds", type=float, default=5, help="run time per profile")
+    args = parser.parse_args()
+
+    print("SQLite Storage Profile Benchmark")
+    print("=" * 50)
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s per profile\n")
+
+    profile = dict(_DEFAULTS)
+    for name, changes in PROFILES:
+        profile.update(changes)
+        results = run_profile(dict(profile), args.writers, args.readers, args.seconds)
+        print(name)
+        for role in ("writer", "reader"):
+            if role in results:
+                print(f"    {role}s {results[role]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Run the test session from a scratch directory.
+
+Importing the app writes config.json, log/<timestamp>.txt, the SQLite
+database under db/ and the analytics stores relative to the working
+directory; the tests import modules by package path, so they can run from
+anywhere and leave the checkout clean.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+_scratch = None
+
+def pytest_configure(config):
+    global _scratch
+    _scratch = tempfile.mkdtemp(prefix="traveltime-tests-")
+    os.makedirs(os.path.join(_scratch, "log"))
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.chdir(_scratch)
+
+def pytest_unconfigure(config):
+    os.chdir(ROOT)
+    if _scratch:
+        shutil.rmtree(_scratch, ignore_errors=True)
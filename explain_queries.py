@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check Script
+Prints the query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL)
+for the hot queries the API runs, against the configured database after
+migrations, and flags full table scans and sorts without an index. Run it
+after adding a query or a migration.
+
+Usage: python explain_queries.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlmodel import select
+from misc import db, migrations, models
+from misc.pagination import encode_cursor, keyset_page
+from travel.dailyRollup import stats_statements, hours_statement
+
+USER_ID = 1
+
+def hot_queries():
+    """(description, statement) for each query on a request path"""
+    TravelHistory = models.TravelHistory
+    UserHours = models.UserHours
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rollup, recent = stats_statements(USER_ID, today - timedelta(days=7))
+    cursor = encode_cursor(today, 1000)
+    queries = [
+        ("latest trip (gps status, trip hydration)",
+         select(TravelHistory.id, TravelHistory.timestamp, TravelHistory.duration)
+         .where(TravelHistory.user_id == USER_ID).order_by(TravelHistory.timestamp.desc()).limit(1)),
+        ("travel history page (after cursor)", keyset_page(
+            select(TravelHistory.id, TravelHistory.timestamp, TravelHistory.point_count)
+            .where(TravelHistory.user_id == USER_ID, TravelHistory.duration > 120),
+            TravelHistory.timestamp, TravelHistory.id, cursor, 50)),
+        ("travel stats, rollup totals", rollup),
+        ("travel stats, trips not rolled up", recent),
+        ("manual rides page (after cursor)", keyset_page(
+            select(models.ManualRide).where(models.ManualRide.user_id == USER_ID),
+            models.ManualRide.created_at, models.ManualRide.id, cursor, 50)),
+        ("user hours lookup", select(UserHours).where(UserHours.user_id == USER_ID)),
+        ("user travel matches", select(models.TravelMatch).where(models.TravelMatch.user_id == USER_ID)),
+        ("users count counter", select(models.GlobalCounter.value).where(models.GlobalCounter.name == "users_count")),
+        ("mfa token check",
+         select(models.MFAToken).where(models.MFAToken.token == "000000", models.MFAToken.user_id == USER_ID,
+                                       models.MFAToken.used == False)),
+    ]
+    queries.append(("user hours from rollup buckets", hours_statement(USER_ID, {
+        "daily": today.date(), "weekly": (today - timedelta(days=7)).date(), "monthly": (today - timedelta(days=30)).date()
+    })))
+    return queries
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    if conn.dialect.name == "sqlite":
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).fetchall()
+    else:
+        rows = conn.exec_driver_sql("EXPLAIN " + str(compiled), dict(compiled.params)).fetchall()
+    return [row[-1] for row in rows]
+
+def is_flagged(detail):
+    """Full table scans and sorts that no index serves"""
+    if detail.startswith("SCAN ") and " USING " not in detail:
+        return True
+    # PostgreSQL plan lines; the planner may still pick a Seq Scan for tiny tables
+    return detail.lstrip(" ->").startswith(("Seq Scan", "Sort "))
+
+def main():
+    print("Hot Query Plans")
+    print("=" * 50)
+
+    db.init_database()
+    print(f"Schema version {migrations.current_version(db.engine)}\n")
+
+    problems = 0
+    with db.engine.connect() as conn:
+        for description, statement in hot_queries():
+            plan = explain(conn, statement)
+            flagged = [d for d in plan if is_flagged(d) or "TEMP B-TREE" in d]
+            problems += bool(flagged)
+            print(f"{'✗' if flagged else '✓'} {description}")
+            for detail in plan:
+                print(f"    {detail}")
+
+    print()
+    if problems:
+        print(f"✗ {problems} queries scan a table or sort without an index")
+    else:
+        print("✓ Every hot query is served by an index")
+
+if __name__ == "__main__":
+    main()
@@ -128,7 +128,7 @@ def verify_analytics_data():
     print("\nVerifying analytics data...")
     
     # Check route usage
-    total_usage = sum(route_analytics.route_usage_stats.values())
+    total_usage = route_analytics.get_total_usage()
     print(f"✓ Total route usage events: {total_usage}")
     
     # Check popular routes
@@ -1,5 +1,5 @@
 from sqlmodel import select
-from misc import models, logging, db
+from misc import models, logging, db, leaderboard
 
 
 def calcXP(user_id, minutes, session=None):
@@ -33,6 +33,7 @@ def calcXP(user_id, minutes, session=None):
         # Save changes
         session.add(user)
         session.commit()
+        leaderboard.record_score("xp", user.id, user.xp)
         
         logging.log(f"Added {xp_to_add} XP to user {user_id}", "info")
         return True
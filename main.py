@@ -8,7 +8,7 @@ import routes.travel
 import routes.gamling
 import routes.levels
 import routes.admin
-from misc import logging, db
+from misc import logging, db, leaderboard
 import misc.models
 import os
 import logging as log
@@ -34,6 +34,8 @@ log.getLogger('passlib').setLevel(log.ERROR)
 try: 
     db.init_database()
     logging.log("DB loaded", "info")
+    leaderboard.load()
+    logging.log("Leaderboards loaded", "info")
 
 except Exception as e:
     logging.log(f"DB error: {e}", "critical")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Trip Map-Matching Backfill Script
+Matches completed TravelHistory sessions that have no TravelMatch row yet.
+New trips are matched automatically when they end; this covers older data.
+With --classify, trips the matcher could not type are labelled by the trained
+transport classifier in one batch.
+
+Usage: python match_trips.py [--limit N] [--rematch] [--classify]
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlmodel import select
+from misc import db, models
+import travel
+
+def find_unmatched_trips(limit=None, rematch=False):
+    """Ids of completed trips that still need matching"""
+    # Trips whose last activity is within the stale window may still be open
+    cutoff = datetime.utcnow() - timedelta(seconds=travel.trip_engine.timeouts.stale_seconds)
+
+    with db.get_session() as session:
+        statement = select(models.TravelHistory.id).where(
+            models.TravelHistory.timestamp < cutoff,
+            models.TravelHistory.duration >= travel.trip_engine.timeouts.confirm_seconds
+        )
+        if not rematch:
+            matched = select(models.TravelMatch.travel_id)
+            statement = statement.where(models.TravelHistory.id.not_in(matched))
+        statement = statement.order_by(models.TravelHistory.id)
+        if limit:
+            statement = statement.limit(limit)
+        return list(session.exec(statement).all())
+
+def classify_untyped_trips(travel_ids):
+    """Fill in primary_transport_type for matches left "unknown"; returns how many were set"""
+    if not travel.route_analytics.classifier.is_trained:
+        print("✗ No trained transport classifier, run train_transport_classifier.py first")
+        return 0
+
+    records = [r for r in travel.load_trip_records(travel_ids) if r["matched_type"] == "unknown"]
+    predictions = travel.route_analytics.classify_trips(records)
+    predicted = {r["id"]: transport_type for r, (transport_type, _) in zip(records, predictions)}
+
+    with db.get_session() as session:
+        matches = session.exec(
+            select(models.TravelMatch).where(models.TravelMatch.travel_id.in_(list(predicted)))
+        ).all()
+        for match in matches:
+            travel.reassign_trip_mode(session, session.get(models.TravelHistory, match.travel_id),
+                                      match.primary_transport_type, predicted[match.travel_id])
+            match.primary_transport_type = predicted[match.travel_id]
+            session.add(match)
+        session.commit()
+    return len(predicted)
+
+def main():
+    parser = argparse.ArgumentParser(description="Map-match completed trips")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of trips to match")
+    parser.add_argument("--rematch", action="store_true", help="also re-match trips that already have a match")
+    parser.add_argument("--classify", action="store_true", help="label trips the matcher left untyped with the trained classifier")
+    args = parser.parse_args()
+
+    print("Trip Map-Matching Backfill")
+    print("=" * 50)
+
+    db.init_database()
+    travel_ids = find_unmatched_trips(args.limit, args.rematch)
+    print(f"Found {len(travel_ids)} trips to match")
+
+    if not travel_ids:
+        return
+
+    matched = travel.map_matcher.match_many(travel_ids)
+    print(f"✓ Matched {matched}/{len(travel_ids)} trips")
+
+    if args.classify:
+        classified = classify_untyped_trips(travel_ids)
+        print(f"✓ Classified {classified} untyped trips")
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,80 @@ def generate_default_config():
             "nameDB": "traveltime",
             "jwtSecretKey": secrets.token_hex(32)
         },
+        "database": {
+            "url": None,
+            "asyncUrl": None,
+            "readUrl": None,
+            "readAsyncUrl": None,
+            "echo": False,
+            "syncWorkers": 8,
+            "sqlite": {
+                "journalMode": "WAL",
+                "synchronous": "NORMAL",
+                "mmapSizeMB": 256,
+                "cacheSizeMB": 64,
+                "busyTimeoutMs": 5000,
+                "tempStore": "MEMORY"
+            },
+            "pool": {
+                "size": 8,
+                "maxOverflow": 8,
+                "timeoutSeconds": 30,
+                "recycleSeconds": 3600
+            }
+        },
+        "tracking": {
+            "confirmSeconds": 120,
+            "endingGraceSeconds": 300,
+            "staleSeconds": 900,
+            "checkpointPoints": 30,
+            "evictIntervalSeconds": 600,
+            "maxAccuracyMeters": 100,
+            "duplicateMeters": 1,
+            "minMovementMeters": 15,
+            "serviceArea": None,
+            "candidatePingSeconds": 10,
+            "endingPingSeconds": 15,
+            "ridingPingSeconds": 30,
+            "ridingFastPingSeconds": 60,
+            "idleNearPingSeconds": 20,
+            "idleMidPingSeconds": 60,
+            "idleFarPingSeconds": 120,
+            "idleOutsidePingSeconds": 300
+        },
+        "analytics": {
+            "topRoutesCapacity": 500,
+            "flushIntervalSeconds": 5,
+            "maxBatch": 1000,
+            "eventRetentionDays": 8,
+            "compactIntervalSeconds": 3600,
+            "readCacheSeconds": 2,
+            "dashboardRefreshSeconds": 300,
+            "dbFile": "route_analytics.db"
+        },
+        "speedProfiles": {
+            "binWidthKmh": 2,
+            "maxKmh": 200,
+            "minSamples": 20,
+            "flushIntervalSeconds": 10,
+            "dbFile": "transport_patterns.db"
+        },
+        "locationContext": {
+            "cellMeters": 5,
+            "maxEntries": 10000
+        },
+        "leaderboard": {
+            "refreshSeconds": 300,
+            "pageSize": 50,
+            "maxPageSize": 200
+        },
+        "mapMatching": {
+            "searchRadiusMeters": 50,
+            "sigmaMeters": 15,
+            "switchPenalty": 8,
+            "maxPoints": 500,
+            "workers": 2
+        },
         "email": {
             "smtp": {
                 "host": "smtp.example.com",
@@ -41,6 +115,11 @@ def load_config():
         if os.getenv("JWT_SECRET_KEY"):
             config["app"]["jwtSecretKey"] = os.getenv("JWT_SECRET_KEY")
             
+        if os.getenv("DATABASE_URL"):
+            config.setdefault("database", {})["url"] = os.getenv("DATABASE_URL")
+        if os.getenv("DATABASE_ASYNC_URL"):
+            config.setdefault("database", {})["asyncUrl"] = os.getenv("DATABASE_ASYNC_URL")
+            
         if os.getenv("EMAIL_ENABLED"):
             config["email"]["enabled"] = os.getenv("EMAIL_ENABLED").lower() == "true"
         if os.getenv("EMAIL_HOST"):
@@ -61,7 +140,8 @@ def load_config():
         with open('config.json', 'w') as f:
             json.dump(default_config, f, indent=2)
         logging.log("Created default config.json", "warning")
-        return default_config
+        # read it back so env overrides (e.g. DATABASE_URL in containers) apply on first start too
+        return load_config()
     except Exception as e:
         logging.log(f"Config error: {e}", "critical")
         exit(1)
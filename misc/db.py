@@ -1,13 +1,151 @@
 import os
-from sqlalchemy import create_engine
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlmodel import SQLModel, Session
-from misc import config, logging
+from sqlmodel.ext.asyncio.session import AsyncSession
+from misc import config, logging, migrations
 
 engine = None
+async_engine = None
+async_session_factory = None
+
+# Pure-read endpoints use these so long reads never hold up the ping write path;
+# they fall back to the primary engines when there is nothing separate to read from
+read_engine = None
+async_read_engine = None
+async_read_session_factory = None
+
+_database_cfg = config.config.get('database', {})
+
+# Blocking work (sync sessions, shapely, bcrypt) runs here instead of on the event loop
+SYNC_WORKERS = _database_cfg.get('syncWorkers', 8)
+sync_executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="sync-db")
+
+# Applied to every new SQLite connection; WAL lets readers run beside the one writer
+# and busy_timeout makes other workers wait for the write lock instead of failing
+SQLITE_PROFILE = {
+    "journalMode": "WAL",
+    "synchronous": "NORMAL",
+    "mmapSizeMB": 256,
+    "cacheSizeMB": 64,
+    "busyTimeoutMs": 5000,
+    "tempStore": "MEMORY",
+    **_database_cfg.get('sqlite', {}),
+}
+POOL = {
+    "size": 8,
+    "maxOverflow": 8,
+    "timeoutSeconds": 30,
+    "recycleSeconds": 3600,
+    **_database_cfg.get('pool', {}),
+}
+
+_PRAGMA_CHOICES = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+def sqlite_pragmas(profile):
+    """PRAGMA statements for a storage profile; unset (None) settings keep SQLite's default"""
+    values = {
+        "journal_mode": profile.get("journalMode"),
+        "synchronous": profile.get("synchronous"),
+        "temp_store": profile.get("tempStore"),
+        "busy_timeout": profile.get("busyTimeoutMs"),
+        "mmap_size": profile["mmapSizeMB"] * 1024 * 1024 if profile.get("mmapSizeMB") is not None else None,
+        # negative cache_size is in KiB rather than pages
+        "cache_size": -profile["cacheSizeMB"] * 1024 if profile.get("cacheSizeMB") is not None else None,
+    }
+    pragmas = []
+    for name, value in values.items():
+        if value is None:
+            continue
+        if name in _PRAGMA_CHOICES:
+            value = str(value).upper()
+            if value not in _PRAGMA_CHOICES[name]:
+                logging.log(f"Ignoring invalid SQLite {name} '{value}'", "warning")
+                continue
+        else:
+            value = int(value)
+        pragmas.append(f"PRAGMA {name} = {value}")
+    return pragmas
+
+def database_url(db_name, debug):
+    """database.url (or DATABASE_URL), else the per-mode SQLite file under ./db"""
+    url = _database_cfg.get('url')
+    if url:
+        return url
+    return f"sqlite:///./db/{db_name}{'_debug' if debug else ''}.db"
+
+def async_url(url):
+    """Async driver URL for a sync database URL"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    raise ValueError(f"No async driver known for {backend}, set database.asyncUrl")
+
+def sqlite_read_only_url(url):
+    """The same SQLite file opened read-only; in WAL mode each read transaction sees a snapshot"""
+    parsed = make_url(url)
+    if not parsed.database or parsed.database == ":memory:":
+        return None
+    return f"{parsed.drivername}:///file:{parsed.database}?mode=ro&uri=true"
+
+def read_urls(db_url, async_db_url):
+    """(sync, async) URLs for the read engines, or (None, None) to read from the primary"""
+    read_url = _database_cfg.get('readUrl')
+    if read_url:
+        return read_url, _database_cfg.get('readAsyncUrl') or async_url(read_url)
+    if make_url(db_url).get_backend_name() == "sqlite":
+        return sqlite_read_only_url(db_url), sqlite_read_only_url(async_db_url)
+    return None, None
+
+def create_db_engine(url, profile=None, pool=None, is_async=False):
+    """Engine with the explicit pool settings and, for SQLite, the storage profile on every connection"""
+    pool = POOL if pool is None else pool
+    parsed = make_url(url)
+    options = {
+        "pool_recycle": pool["recycleSeconds"],
+        # server connections can be dropped behind the pool's back, SQLite files can't
+        "pool_pre_ping": parsed.get_backend_name() != "sqlite",
+        "echo": _database_cfg.get('echo', False),
+    }
+    # In-memory SQLite gets SingletonThreadPool/StaticPool, which take no queue sizing
+    in_memory = parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+    )
+    if not in_memory:
+        options.update(
+            pool_size=pool["size"],
+            max_overflow=pool["maxOverflow"],
+            pool_timeout=pool["timeoutSeconds"],
+        )
+    new_engine = create_async_engine(url, **options) if is_async else create_engine(url, **options)
+
+    if new_engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(SQLITE_PROFILE if profile is None else profile)
+        sync_engine = new_engine.sync_engine if is_async else new_engine
+
+        @event.listens_for(sync_engine, "connect")
+        def _apply_profile(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return new_engine
 
 def init_database():
-    global engine
-    
+    global engine, async_engine, async_session_factory
+    global read_engine, async_read_engine, async_read_session_factory
+
     if engine:
         logging.log("DB already up", "info")
         return
@@ -17,17 +155,32 @@ def init_database():
         debug = cfg['app']['debug']
         db_name = cfg['app']['nameDB']
 
-        if not os.path.exists("./db"):
+        db_url = database_url(db_name, debug)
+        async_db_url = _database_cfg.get('asyncUrl') or async_url(db_url)
+        if make_url(db_url).get_backend_name() == "sqlite" and not os.path.exists("./db"):
             os.makedirs("./db")
 
-        filename = f"{db_name}{'_debug' if debug else ''}.db"
-        db_url = f"sqlite:///./db/{filename}"
-
-        engine = create_engine(db_url)
+        engine = create_db_engine(db_url)
         SQLModel.metadata.create_all(engine)
+        migrations.migrate(engine)
+
+        async_engine = create_db_engine(async_db_url, is_async=True)
+        # keep attributes loaded after commit, lazy refreshes can't run outside a greenlet
+        async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+        read_url, async_read_url = read_urls(db_url, async_db_url)
+        if read_url:
+            # journal mode and sync level belong to the writer, a read-only connection can't set them
+            read_profile = {**SQLITE_PROFILE, "journalMode": None, "synchronous": None}
+            read_engine = create_db_engine(read_url, read_profile)
+            async_read_engine = create_db_engine(async_read_url, read_profile, is_async=True)
+            async_read_session_factory = async_sessionmaker(async_read_engine, class_=AsyncSession, expire_on_commit=False)
+        else:
+            read_engine, async_read_engine = engine, async_engine
+            async_read_session_factory = async_session_factory
 
         mode = "Debug" if debug else "Prod"
-        logging.log(f"{mode} DB ready: {db_url}", "info")
+        logging.log(f"{mode} DB ready: {make_url(db_url).render_as_string(hide_password=True)}", "info")
 
     except Exception as e:
         logging.log(f"DB init failed: {e}", "critical")
@@ -37,6 +190,37 @@ def get_session():
     if not engine:
         logging.log("DB engine not ready", "error")
         raise RuntimeError("DB not initialized")
-    
+
     return Session(engine)
 
+async def get_async_session():
+    """FastAPI dependency yielding an AsyncSession, closed after the request"""
+    if not async_session_factory:
+        logging.log("Async DB engine not ready", "error")
+        raise RuntimeError("DB not initialized")
+
+    async with async_session_factory() as session:
+        yield session
+
+def get_sync_read_session():
+    """FastAPI dependency yielding a Session on the read engine, closed after the request"""
+    if not read_engine:
+        logging.log("DB read engine not ready", "error")
+        raise RuntimeError("DB not initialized")
+
+    with Session(read_engine) as session:
+        yield session
+
+async def get_read_session():
+    """FastAPI dependency yielding a read-only AsyncSession for endpoints that never write"""
+    if not async_read_session_factory:
+        logging.log("Async DB read engine not ready", "error")
+        raise RuntimeError("DB not initialized")
+
+    async with async_read_session_factory() as session:
+        yield session
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking call on the bounded sync worker pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sync_executor, functools.partial(func, *args, **kwargs))
@@ -1,30 +1,201 @@
-from sqlmodel import select, desc, Session
-from misc import db, models, logging
-from typing import Optional, List
+"""
+In-memory ranked leaderboards (points, XP and travel hours).
 
-def get_leaderboard(limit: int = 10, type: str = "total") -> List[dict]:
+Each board keeps (-score, user_id) keys in an order-statistic list
+(sortedcontainers.SortedList), so updates, "my rank", neighbour lookups and
+page starts all cost O(log n); a page of k rows costs O(log n + k). Boards
+are loaded from the database at startup and updated in place when XP,
+points or hours change, so no request sorts the user table.
+
+Every worker process holds its own boards, so each one is reloaded from the
+database every leaderboard.refreshSeconds to pick up changes written by
+other workers or scripts, and as soon as the daily/weekly/monthly windows
+move. Reloads run on a background thread while the current boards keep
+serving, so no request pays for the table scans.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlmodel import select, Session
+from misc import config, db, models, logging
+
+_leaderboard_cfg = config.config.get('leaderboard', {})
+REFRESH_SECONDS = _leaderboard_cfg.get('refreshSeconds', 300)
+PAGE_SIZE = _leaderboard_cfg.get('pageSize', 50)
+MAX_PAGE_SIZE = _leaderboard_cfg.get('maxPageSize', 200)
+
+HOURS_BOARDS = {"total": "hours", "daily": "hours_daily", "weekly": "hours_weekly", "monthly": "hours_monthly"}
+BOARDS = ("points", "xp") + tuple(HOURS_BOARDS.values())
+
+class RankedBoard:
+    """Scores per user, ordered highest first with ties broken by user id"""
+
+    def __init__(self, scores: Optional[Dict[int, float]] = None):
+        self._scores: Dict[int, float] = dict(scores or {})
+        self._entries = SortedList((-score, user_id) for user_id, score in self._scores.items())
+        self._lock = threading.Lock()
+
+    def set(self, user_id: int, score: float):
+        with self._lock:
+            old = self._scores.get(user_id)
+            if old is not None:
+                self._entries.remove((-old, user_id))
+            self._scores[user_id] = score
+            self._entries.add((-score, user_id))
+
+    def add(self, user_id: int, delta: float):
+        with self._lock:
+            old = self._scores.get(user_id)
+            if old is not None:
+                self._entries.remove((-old, user_id))
+            self._scores[user_id] = (old or 0) + delta
+            self._entries.add((-self._scores[user_id], user_id))
+
+    def remove(self, user_id: int):
+        with self._lock:
+            old = self._scores.pop(user_id, None)
+            if old is not None:
+                self._entries.remove((-old, user_id))
+
+    def score(self, user_id: int) -> Optional[float]:
+        with self._lock:
+            return self._scores.get(user_id)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of user_id, or None when the user is not on the board"""
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return self._entries.index((-score, user_id)) + 1
+
+    def page(self, offset: int = 0, limit: int = PAGE_SIZE) -> List[Tuple[int, int, float]]:
+        """(rank, user_id, score) rows from offset"""
+        with self._lock:
+            return [(offset + i + 1, user_id, -negative)
+                    for i, (negative, user_id) in enumerate(self._entries.islice(offset, offset + limit))]
+
+    def around(self, user_id: int, radius: int = 5) -> List[Tuple[int, int, float]]:
+        """The user's row with up to radius rows either side, or [] when not ranked"""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(0, rank - 1 - radius)
+        return self.page(start, rank - start + radius)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+boards: Dict[str, RankedBoard] = {name: RankedBoard() for name in BOARDS}
+_loaded_at: Optional[float] = None
+_period_starts: Optional[dict] = None
+_load_lock = threading.Lock()
+_reloading = False
+
+def load(session=None):
+    """Rebuild every board from the database"""
+    global _loaded_at, _period_starts
+    import travel
+    close_session = session is None
+    if session is None:
+        session = Session(db.read_engine)
+    try:
+        starts = travel.hours_period_starts()
+        users = session.exec(select(models.User.id, models.User.points, models.User.xp)).all()
+        fresh = {
+            "points": RankedBoard({user_id: points or 0 for user_id, points, _ in users}),
+            "xp": RankedBoard({user_id: xp or 0 for user_id, _, xp in users}),
+        }
+        for period, name in HOURS_BOARDS.items():
+            fresh[name] = RankedBoard(dict(travel.get_hours_leaderboard(session, period)))
+        boards.update(fresh)
+        _period_starts = starts
+        _loaded_at = time.monotonic()
+    finally:
+        if close_session:
+            session.close()
+
+def _reload_in_background():
+    global _reloading
+    try:
+        load()
+    except Exception as e:
+        logging.log(f"Leaderboard reload failed: {str(e)}", "error")
+    finally:
+        with _load_lock:
+            _reloading = False
+
+def _ensure_current():
+    """
+    Load the boards on first use. Boards older than REFRESH_SECONDS, or whose
+    period moved, keep serving while a background thread reloads them.
+    """
+    global _reloading
+    import travel
+    with _load_lock:
+        if _loaded_at is None:
+            load()
+            return
+        if _reloading:
+            return
+        if time.monotonic() - _loaded_at > REFRESH_SECONDS or travel.hours_period_starts() != _period_starts:
+            _reloading = True
+            threading.Thread(target=_reload_in_background, daemon=True).start()
+
+def record_score(board: str, user_id: int, score: float):
+    """Set a user's points or XP after it was committed"""
+    boards[board].set(int(user_id), score)
+
+def record_hours(user_id: int, day, seconds: float):
+    """Add a committed trip's travel time to every hours board whose window holds its day"""
+    hours = seconds / 3600
+    boards["hours"].add(int(user_id), hours)
+    for period, name in HOURS_BOARDS.items():
+        if period != "total" and _period_starts is not None and day >= _period_starts[period]:
+            boards[name].add(int(user_id), hours)
+
+def remove_user(user_id: int):
+    for board in boards.values():
+        board.remove(int(user_id))
+
+def get_page(board: str, offset: int = 0, limit: int = PAGE_SIZE) -> Tuple[List[Tuple[int, int, float]], int]:
+    """A page of (rank, user_id, score) rows and the board size"""
+    _ensure_current()
+    ranked = boards[board]  # one board for both reads, a reload may swap it meanwhile
+    return ranked.page(offset, limit), len(ranked)
+
+def get_rank(board: str, user_id: int, radius: int = 5) -> Tuple[Optional[int], List[Tuple[int, int, float]], int]:
+    """The user's rank, the rows around it and the board size"""
+    _ensure_current()
+    ranked = boards[board]
+    return ranked.rank(int(user_id)), ranked.around(int(user_id), radius), len(ranked)
+
+def get_leaderboard(limit: int = 10, type: str = "total", offset: int = 0) -> List[dict]:
     """
     Get the leaderboard for a given type
     """
     try:
-        with Session(db.engine) as session:
-            if type == "total" or type is None:
-                users = session.exec(select(models.User).order_by(desc(models.User.points)).limit(limit)).all()
-            elif type == "xp":
-                users = session.exec(select(models.User).order_by(desc(models.User.xp)).limit(limit)).all()
-            else:
-                return []
-                
-            return [
-                {
-                    "id": user.id,
-                    "name": user.name or "Anonymous",
-                    "points": user.points,
-                    "xp": user.xp,
-                    "level": user.level
-                }
-                for user in users
-            ]
+        if type not in ("total", "xp", None):
+            return []
+        rows, _ = get_page("xp" if type == "xp" else "points", offset, limit)
+        with Session(db.read_engine) as session:
+            users = {user.id: user for user in session.exec(
+                select(models.User).where(models.User.id.in_([user_id for _, user_id, _ in rows]))
+            )}
+        return [
+            {
+                "rank": rank,
+                "id": user_id,
+                "name": users[user_id].name or "Anonymous",
+                "points": users[user_id].points,
+                "xp": users[user_id].xp,
+                "level": users[user_id].level
+            }
+            for rank, user_id, _ in rows if user_id in users
+        ]
     except Exception as e:
         logging.log(f"Error getting leaderboard: {str(e)}", "error")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,166 @@
+"""
+Versioned schema migrations.
+
+create_all only creates missing tables, so every change to an existing table
+or index is a numbered migration here. init_database applies the pending ones
+in order and records each in schema_migrations, in the same transaction as
+the change itself. Migrations must also be safe on a database that create_all
+has just built with the current models.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from misc import logging
+
+MIGRATIONS = []  # (version, name, apply(conn)), in version order
+
+def migration(version, name):
+    def register(apply):
+        MIGRATIONS.append((version, name, apply))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return apply
+    return register
+
+@migration(1, "travelhistory.point_count")
+def _add_point_count(conn):
+    """Databases created before TravelHistory.point_count get the column, filled from the stored lists"""
+    columns = [c["name"] for c in inspect(conn).get_columns("travelhistory")]
+    if "point_count" in columns:
+        return
+    conn.execute(text("ALTER TABLE travelhistory ADD COLUMN point_count INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text('UPDATE travelhistory SET point_count = COALESCE(json_array_length("listLatitude"), 0)'))
+
+# name -> (table, columns); explain_queries.py shows the query each one serves
+HOT_PATH_INDEXES = {
+    "ix_travelhistory_user_timestamp": ("travelhistory", ["user_id", "timestamp"]),
+    "ix_manualride_user_created": ("manualride", ["user_id", "created_at"]),
+    "ix_userhours_user": ("userhours", ["user_id"]),
+    "ix_userhours_total": ("userhours", ["hoursTotal"]),
+    "ix_userhours_daily": ("userhours", ["hoursDaily"]),
+    "ix_userhours_weekly": ("userhours", ["hoursWeekly"]),
+    "ix_userhours_monthly": ("userhours", ["hoursMonthly"]),
+    "ix_user_points": ("user", ["points"]),
+    "ix_user_xp": ("user", ["xp"]),
+    "ix_mfatoken_user_token": ("mfatoken", ["user_id", "token"]),
+}
+
+@migration(2, "hot path indexes")
+def _add_hot_path_indexes(conn):
+    for name, (table, columns) in HOT_PATH_INDEXES.items():
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({quoted})'))
+
+# Keep globalcounter in step with every write to "user", including raw SQL and scripts
+SQLITE_COUNTER_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_user_counters_insert AFTER INSERT ON "user" BEGIN
+        UPDATE globalcounter SET value = value + 1 WHERE name = 'users_count';
+        UPDATE globalcounter SET value = value + COALESCE(NEW.points, 0) WHERE name = 'points_total';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_user_counters_delete AFTER DELETE ON "user" BEGIN
+        UPDATE globalcounter SET value = value - 1 WHERE name = 'users_count';
+        UPDATE globalcounter SET value = value - COALESCE(OLD.points, 0) WHERE name = 'points_total';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_user_counters_points AFTER UPDATE OF points ON "user" BEGIN
+        UPDATE globalcounter SET value = value + COALESCE(NEW.points, 0) - COALESCE(OLD.points, 0)
+        WHERE name = 'points_total';
+    END""",
+]
+
+POSTGRES_COUNTER_TRIGGERS = [
+    """CREATE OR REPLACE FUNCTION user_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE globalcounter SET value = value + 1 WHERE name = 'users_count';
+            UPDATE globalcounter SET value = value + COALESCE(NEW.points, 0) WHERE name = 'points_total';
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE globalcounter SET value = value - 1 WHERE name = 'users_count';
+            UPDATE globalcounter SET value = value - COALESCE(OLD.points, 0) WHERE name = 'points_total';
+        ELSE
+            UPDATE globalcounter SET value = value + COALESCE(NEW.points, 0) - COALESCE(OLD.points, 0)
+            WHERE name = 'points_total';
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS trg_user_counters ON "user"',
+    """CREATE TRIGGER trg_user_counters AFTER INSERT OR DELETE OR UPDATE OF points ON "user"
+    FOR EACH ROW EXECUTE FUNCTION user_counters()""",
+]
+
+@migration(3, "global counters")
+def _add_global_counters(conn):
+    """Seed users_count and points_total from the user table and install the triggers that maintain them"""
+    conn.execute(text("DELETE FROM globalcounter WHERE name IN ('users_count', 'points_total')"))
+    conn.execute(text("INSERT INTO globalcounter (name, value) SELECT 'users_count', COUNT(*) FROM \"user\""))
+    conn.execute(text("INSERT INTO globalcounter (name, value) SELECT 'points_total', COALESCE(SUM(points), 0) FROM \"user\""))
+    triggers = POSTGRES_COUNTER_TRIGGERS if conn.dialect.name == "postgresql" else SQLITE_COUNTER_TRIGGERS
+    for statement in triggers:
+        conn.execute(text(statement))
+
+# Keyset pagination orders by (timestamp, id), so id joins the listing indexes; the
+# two-column ones from migration 2 become redundant prefixes
+KEYSET_INDEXES = {
+    "ix_travelhistory_user_timestamp_id": ("travelhistory", ["user_id", "timestamp", "id"], "ix_travelhistory_user_timestamp"),
+    "ix_manualride_user_created_id": ("manualride", ["user_id", "created_at", "id"], "ix_manualride_user_created"),
+}
+
+@migration(4, "keyset pagination indexes")
+def _add_keyset_indexes(conn):
+    for name, (table, columns, replaces) in KEYSET_INDEXES.items():
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({quoted})'))
+        conn.execute(text(f"DROP INDEX IF EXISTS {replaces}"))
+
+@migration(5, "userdailytravel mode index")
+def _add_rollup_mode_index(conn):
+    """Per-mode hours group a user's rollup rows by mode; this keeps them in mode order"""
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_userdailytravel_user_mode_day ON "userdailytravel" ("user_id", "mode", "day")'))
+
+@migration(6, "travelhistory.ended")
+def _add_ended(conn):
+    """Trips already folded into the rollup are closed; anything newer may still be open"""
+    columns = [c["name"] for c in inspect(conn).get_columns("travelhistory")]
+    if "ended" in columns:
+        return
+    conn.execute(text("ALTER TABLE travelhistory ADD COLUMN ended BOOLEAN NOT NULL DEFAULT FALSE"))
+    conn.execute(text(
+        "UPDATE travelhistory SET ended = TRUE WHERE id <= (SELECT COALESCE(MAX(last_travel_id), 0) "
+        "FROM userdailytravel WHERE userdailytravel.user_id = travelhistory.user_id)"
+    ))
+
+def _ensure_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at VARCHAR(32) NOT NULL)"
+        ))
+
+def applied_versions(engine):
+    _ensure_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def current_version(engine):
+    return max(applied_versions(engine), default=0)
+
+def migrate(engine):
+    """Apply pending migrations in order; returns the versions applied by this call"""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, apply in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                apply(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow().isoformat()}
+                )
+        except (IntegrityError, OperationalError):
+            # Another worker starting at the same time may have applied it first
+            if version in applied_versions(engine):
+                continue
+            raise
+        logging.log(f"Applied migration {version}: {name}", "info")
+        applied.append(version)
+    return applied
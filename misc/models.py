@@ -1,7 +1,8 @@
 from sqlmodel import SQLModel, Field, Column
 from typing import List, Optional
-from datetime import datetime 
-from sqlalchemy.dialects.sqlite import JSON
+from datetime import datetime, date
+from sqlalchemy import JSON, UniqueConstraint, false
+from sqlalchemy.orm import deferred
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -25,6 +26,8 @@ class User(SQLModel, table=True):
     level: int = Field(default=0)
 
 class UserHours(SQLModel, table=True):
+    # The hour columns are no longer written; hours are summed from UserDailyTravel
+    # buckets (travel.get_user_hours_async) so periods roll over without resets
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     # General hours
@@ -52,19 +55,61 @@ class UserHours(SQLModel, table=True):
     ferry_hoursDaily: float = Field(default=0)
 
 
+# Trip coordinates grow with trip length; they are only loaded when asked for
+# with undefer(TravelHistory.listLatitude) or by touching the attribute
+_list_latitude = Column("listLatitude", JSON)
+_list_longitude = Column("listLongitude", JSON)
+
 class TravelHistory(SQLModel, table=True):
+    __mapper_args__ = {"properties": {
+        "listLatitude": deferred(_list_latitude),
+        "listLongitude": deferred(_list_longitude),
+    }}
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     startLatitude: float
     # Store lists as JSON instead of raw list
-    listLatitude: Optional[List[float]] = Field(sa_column=Column(JSON))
+    listLatitude: Optional[List[float]] = Field(sa_column=_list_latitude)
     startLongitude: float
-    listLongitude: Optional[List[float]] = Field(sa_column=Column(JSON))
+    listLongitude: Optional[List[float]] = Field(sa_column=_list_longitude)
+    point_count: int = Field(default=0)  # len(listLatitude), kept so listings skip the coordinates
+    ended: bool = Field(default=False, sa_column_kwargs={"server_default": false()})  # set when the trip closes; only open trips are hydrated
     distance: float
     duration: float
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class TravelMatch(SQLModel, table=True):
+    """Offline map-matching result of a completed TravelHistory session"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    travel_id: int = Field(foreign_key="travelhistory.id", unique=True, index=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    # Distinct matched route ids in ride order
+    route_ids: Optional[List[str]] = Field(sa_column=Column(JSON))
+    # One entry per leg: route_id, transport_type, start_index, end_index, distance_km
+    legs: Optional[List[dict]] = Field(sa_column=Column(JSON))
+    primary_transport_type: str = Field(default="unknown")
+    matched_ratio: float = Field(default=0.0)
+    matched_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UserDailyTravel(SQLModel, table=True):
+    """Per-user, per-day, per-mode travel totals, folded in as trips end"""
+    __table_args__ = (UniqueConstraint("user_id", "day", "mode"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    day: date = Field(index=True)  # UTC day the trip started
+    mode: str = Field(default="unknown")
+    trips: int = Field(default=0)
+    seconds: float = Field(default=0)
+    km: float = Field(default=0)
+    # Highest TravelHistory id folded into this user's rollup; later trips are read directly
+    last_travel_id: int = Field(default=0)
+
+class GlobalCounter(SQLModel, table=True):
+    """Site-wide totals (users_count, points_total), kept current by triggers on the user table"""
+    name: str = Field(primary_key=True, max_length=50)
+    value: int = Field(default=0)
+
 class PasswordResetToken(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
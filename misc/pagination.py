@@ -0,0 +1,47 @@
+"""
+Keyset (cursor) pagination for newest-first listings.
+
+Pages are ordered by (timestamp, id) descending and the cursor is the last
+row's pair, so the next page is an index range seek that costs the same
+however deep the client has paged, unlike OFFSET which reads and discards
+every earlier row. Cursors are opaque to clients: base64 of the pair.
+"""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(timestamp, id) from a cursor; ValueError when it was not made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_page(statement, timestamp_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Newest-first page of statement after cursor. One extra row is fetched to
+    tell whether another page exists; next_page drops it again.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # The plain range bound lets the (user_id, timestamp, id) index seek straight to the cursor
+        statement = statement.where(
+            timestamp_column <= timestamp,
+            or_(timestamp_column < timestamp, and_(timestamp_column == timestamp, id_column < row_id)),
+        )
+    return statement.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
+
+def next_page(rows, limit: int, timestamp_of, id_of):
+    """(rows for this page, next_cursor or None)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(timestamp_of(rows[-1]), id_of(rows[-1]))
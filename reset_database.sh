@@ -17,10 +17,13 @@ fi
 # Backup current database if it exists
 if [ -f "db/traveltime_debug.db" ]; then
     echo "💾 Creating backup of current database..."
+    sqlite3 db/traveltime_debug.db "PRAGMA wal_checkpoint(TRUNCATE);" > /dev/null 2>&1
     cp db/traveltime_debug.db "db/traveltime_debug_backup_$(date +%Y%m%d_%H%M%S).db"
     
     echo "🗑️ Removing old database..."
     rm db/traveltime_debug.db
+    # WAL mode side files belong to the old database
+    rm -f db/traveltime_debug.db-wal db/traveltime_debug.db-shm
 else
     echo "📂 No existing database found"
 fi
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Daily Travel Rollup Backfill Script
+Rebuilds the per-user, per-day, per-mode totals (UserDailyTravel) that the
+travel stats endpoints read. Finished trips are rolled up automatically when
+they end; run this once after upgrading, or to repair a user's totals.
+Trips that are still open are skipped and stay on the live path.
+
+Usage: python rollup_travel.py [--user ID ...]
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from misc import db
+import travel
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily travel rollup")
+    parser.add_argument("--user", type=int, action="append", default=None, help="only rebuild this user (repeatable)")
+    args = parser.parse_args()
+
+    print("Daily Travel Rollup Backfill")
+    print("=" * 50)
+
+    db.init_database()
+    with db.get_session() as session:
+        rows = travel.rebuild_rollups(session, args.user)
+
+    scope = f"{len(args.user)} users" if args.user else "all users"
+    print(f"✓ Wrote {rows} rollup rows for {scope}")
+
+if __name__ == "__main__":
+    main()
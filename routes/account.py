@@ -3,7 +3,8 @@ from fastapi.responses import FileResponse
 import shutil
 import os
 from datetime import datetime, timedelta
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from auth.accountManagment import get_current_user, is_token_valid
 from misc import db, schemas, models
 import travel
@@ -20,7 +21,7 @@ config_data = config.config
 debug_mode = config_data['app']['debug']
 db_name = config_data['app']['nameDB']
 
-def check_user_access(user_id: str, current_user: dict, session: Session) -> bool:
+async def check_user_access(user_id: str, current_user: dict, session: AsyncSession) -> bool:
     """Check if current user can access the specified user's data"""
     roles = current_user.get("roles", [])
     user_id_from_token = current_user.get("sub")
@@ -33,7 +34,7 @@ def check_user_access(user_id: str, current_user: dict, session: Session) -> boo
         return False
     
     # Get user to check against
-    user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+    user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
     if not user:
         return False
     
@@ -48,14 +49,14 @@ def check_user_access(user_id: str, current_user: dict, session: Session) -> boo
     return False
 
 @app.get("/user/{user_id}/points")
-def user_points(user_id: str, current_user: dict = Depends(get_current_user), session: Session = Depends(db.get_session)):
+async def user_points(user_id: str, current_user: dict = Depends(get_current_user), session: AsyncSession = Depends(db.get_read_session)):
     """Get user's points."""
     try:
         # Check authorization
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             raise HTTPException(status_code=403, detail="Access denied")
             
-        points = travel.get_user_points(user_id)
+        points = await db.run_sync(travel.get_user_points, user_id)
         return {"points": points, "user_id": user_id}
     except HTTPException:
         raise
@@ -66,36 +67,37 @@ def user_points(user_id: str, current_user: dict = Depends(get_current_user), se
         raise HTTPException(status_code=500, detail="Error getting points")
 
 @app.get("/user/{user_id}/profile")
-def get_user_profile(user_id: str, current_user: dict = Depends(get_current_user), session: Session = Depends(db.get_session)):
+async def get_user_profile(user_id: str, current_user: dict = Depends(get_current_user), session: AsyncSession = Depends(db.get_async_session)):
     """Get user profile with travel stats and achievements."""
     try:
         # Check authorization
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail="You can only access your own profile unless you have admin privileges."
             )
         
         # Get user data
-        user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+        user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         
         # Get user hours data
-        user_hours = session.exec(select(models.UserHours).where(models.UserHours.user_id == int(user_id))).first()
+        user_hours = (await session.exec(select(models.UserHours).where(models.UserHours.user_id == int(user_id)))).first()
         
         # Create UserHours record if it doesn't exist
         if not user_hours:
             user_hours = models.UserHours(user_id=int(user_id))
             session.add(user_hours)
-            session.commit()
-            session.refresh(user_hours)
+            await session.commit()
+            await session.refresh(user_hours)
         
         # Get travel statistics
-        travel_stats = travel.get_user_travel_stats(user_id, "all")
+        travel_stats = await travel.get_user_travel_stats_async(session, user_id, "all")
+        hours = await travel.get_user_hours_async(session, user_id)
         
         # Calculate achievements
-        achievements = calculate_user_achievements(user, user_hours, travel_stats)
+        achievements = calculate_user_achievements(user, hours, travel_stats)
         
         # Build profile response
         profile_data = {
@@ -136,19 +138,19 @@ async def update_user_profile(
     bio: Optional[str] = Form(None),
     privacy_settings: Optional[str] = Form(None),
     current_user: dict = Depends(get_current_user),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Update user profile with validation."""
     try:
         # Check authorization
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail="Access denied - admin or owner only"
             )
         
         # Get user
-        user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+        user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         
@@ -157,7 +159,7 @@ async def update_user_profile(
         
         if username is not None:
             # Check if username is already taken
-            existing_user = session.exec(select(models.User).where(models.User.username == username, models.User.id != int(user_id))).first()
+            existing_user = (await session.exec(select(models.User).where(models.User.username == username, models.User.id != int(user_id)))).first()
             if existing_user:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken")
             user.username = username
@@ -169,7 +171,7 @@ async def update_user_profile(
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid email format")
             
             # Check if email is already taken
-            existing_user = session.exec(select(models.User).where(models.User.email == email, models.User.id != int(user_id))).first()
+            existing_user = (await session.exec(select(models.User).where(models.User.email == email, models.User.id != int(user_id)))).first()
             if existing_user:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already taken")
             user.email = email
@@ -193,7 +195,7 @@ async def update_user_profile(
         
         # Save changes
         session.add(user)
-        session.commit()
+        await session.commit()
         
         return {
             "success": True,
@@ -204,7 +206,7 @@ async def update_user_profile(
     except HTTPException:
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logging.log(f"Error updating user profile: {str(e)}", "error")
         if debug_mode:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -216,14 +218,14 @@ async def upload_profile_picture(
     user_id: str, 
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """
     Upload and process user profile picture with image validation and optimization.
     """
     try:
         # Check authorization
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail="Access denied - admin or owner only"
@@ -248,20 +250,10 @@ async def upload_profile_picture(
         upload_dir = "/workspaces/backend-traveltime/misc/templates/pfp"
         os.makedirs(upload_dir, exist_ok=True)
         
-        # Process and optimize image
+        # Process and optimize image (decode/resize is CPU bound, keep it off the event loop)
         try:
-            image = Image.open(io.BytesIO(contents))
-            
-            # Convert to RGB if necessary
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-            
-            # Resize to standard profile picture size
-            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            
-            # Save optimized image
             file_location = f"{upload_dir}/{user_id}.jpg"
-            image.save(file_location, "JPEG", quality=85, optimize=True)
+            await db.run_sync(save_profile_picture, contents, file_location)
             
         except Exception as img_error:
             logging.log(f"Error processing image: {str(img_error)}", "error")
@@ -271,7 +263,7 @@ async def upload_profile_picture(
             )
         
         # Update user profile picture timestamp
-        user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+        user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
         if user:
             set_user_preference(user_id, "profile_picture_updated", datetime.utcnow().isoformat(), session)
         
@@ -312,13 +304,13 @@ def get_user_picture(user_id: str):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error retrieving profile picture")
 
 @app.get("/user/{user_id}/achievements")
-def get_user_achievements(user_id: str, current_user: dict = Depends(get_current_user), session: Session = Depends(db.get_session)):
+async def get_user_achievements(user_id: str, current_user: dict = Depends(get_current_user), session: AsyncSession = Depends(db.get_read_session)):
     """
     Get user achievements and badges based on travel activity.
     """
     try:
         # Check if user can access this data
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             # Check if user has public achievements
             privacy_settings = get_user_preference(user_id, "privacy_settings", session)
             if privacy_settings and not privacy_settings.get("achievements_public", True):
@@ -328,14 +320,14 @@ def get_user_achievements(user_id: str, current_user: dict = Depends(get_current
                 )
         
         # Get user data
-        user = session.exec(select(models.User).where(models.User.id == int(user_id))).first()
+        user = (await session.exec(select(models.User).where(models.User.id == int(user_id)))).first()
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         
-        user_hours = session.exec(select(models.UserHours).where(models.UserHours.user_id == int(user_id))).first()
-        travel_stats = travel.get_user_travel_stats(user_id, "all")
+        hours = await travel.get_user_hours_async(session, user_id)
+        travel_stats = await travel.get_user_travel_stats_async(session, user_id, "all")
         
-        achievements = calculate_user_achievements(user, user_hours, travel_stats)
+        achievements = calculate_user_achievements(user, hours, travel_stats)
         
         return {"success": True, "data": achievements}
         
@@ -349,13 +341,13 @@ def get_user_achievements(user_id: str, current_user: dict = Depends(get_current
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error retrieving achievements")
 
 @app.get("/user/{user_id}/preferences")
-def get_user_preferences_endpoint(user_id: str, current_user: dict = Depends(get_current_user), session: Session = Depends(db.get_session)):
+async def get_user_preferences_endpoint(user_id: str, current_user: dict = Depends(get_current_user), session: AsyncSession = Depends(db.get_read_session)):
     """
     Get user preferences and settings.
     """
     try:
         # Check authorization
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail="Access denied - admin or owner only"
@@ -379,14 +371,14 @@ async def update_user_preferences(
     user_id: str,
     preferences: dict,
     current_user: dict = Depends(get_current_user),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """
     Update user preferences and settings.
     """
     try:
         # Check authorization
-        if not check_user_access(user_id, current_user, session):
+        if not await check_user_access(user_id, current_user, session):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail="Access denied - admin or owner only"
@@ -413,6 +405,20 @@ async def update_user_preferences(
 
 # Helper functions
 
+def save_profile_picture(contents: bytes, file_location: str):
+    """Decode, resize and save an uploaded profile picture as JPEG."""
+    image = Image.open(io.BytesIO(contents))
+    
+    # Convert to RGB if necessary
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    
+    # Resize to standard profile picture size
+    image.thumbnail((300, 300), Image.Resampling.LANCZOS)
+    
+    # Save optimized image
+    image.save(file_location, "JPEG", quality=85, optimize=True)
+
 def calculate_user_level(points: int) -> int:
     """Calculate user level based on points (100 points per level)."""
     return max(1, points // 100)
@@ -423,7 +429,7 @@ def calculate_points_to_next_level(points: int) -> int:
     return (current_level * 100) - points
 
 def calculate_user_achievements(user, user_hours, travel_stats) -> list:
-    """Calculate user achievements based on their activity."""
+    """Calculate user achievements based on their activity (user_hours from travel.get_user_hours_async)."""
     achievements = []
     
     # Points-based achievements
@@ -434,9 +440,9 @@ def calculate_user_achievements(user, user_hours, travel_stats) -> list:
     
     # Travel time achievements
     if user_hours:
-        if user_hours.hoursTotal >= 100:
+        if user_hours["total"]["total"] >= 100:
             achievements.append({"name": "Century Traveler", "description": "100+ hours of travel", "icon": "⏰"})
-        if user_hours.hoursTotal >= 500:
+        if user_hours["total"]["total"] >= 500:
             achievements.append({"name": "Travel Veteran", "description": "500+ hours of travel", "icon": "🌟"})
     
     # Travel stats achievements
@@ -449,7 +455,7 @@ def calculate_user_achievements(user, user_hours, travel_stats) -> list:
     
     return achievements
 
-def get_user_preferences(user_id: str, session: Session) -> dict:
+def get_user_preferences(user_id: str, session: AsyncSession) -> dict:
     """Get user preferences from database."""
     try:
         # TODO: query a user_preferences table
@@ -475,29 +481,29 @@ def get_user_preferences(user_id: str, session: Session) -> dict:
         logging.log(f"Error getting user preferences: {str(e)}", "error")
         return {}
 
-def get_user_preference(user_id: str, key: str, session: Session):
+def get_user_preference(user_id: str, key: str, session: AsyncSession):
     """Get a specific user preference."""
     preferences = get_user_preferences(user_id, session)
     return preferences.get(key)
 
-def set_user_preference(user_id: str, key: str, value, session: Session):
+def set_user_preference(user_id: str, key: str, value, session: AsyncSession):
     """Set a user preference (TODO: implement database storage)."""
     # TODO: save to a user_preferences table
     pass
 
 # Legacy endpoints for backward compatibility
 @app.get("/user/{user_id}/getData")
-def user_get_data(user_id: str, current_user: dict = Depends(get_current_user), session: Session = Depends(db.get_session)):
+async def user_get_data(user_id: str, current_user: dict = Depends(get_current_user), session: AsyncSession = Depends(db.get_read_session)):
     """Legacy endpoint - use /user/{user_id}/profile instead."""
-    if not check_user_access(user_id, current_user, session):
+    if not await check_user_access(user_id, current_user, session):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-    user = account.user_get_data(user_id, session)
+    user = await account.user_get_data(user_id, session)
     return user
 
 @app.get("/user/{user_id}/getDataHours")
-async def user_get_data_hours(user_id: str, current_user: dict = Depends(get_current_user), session: Session = Depends(db.get_session)):
+async def user_get_data_hours(user_id: str, current_user: dict = Depends(get_current_user), session: AsyncSession = Depends(db.get_async_session)):
     """Legacy endpoint for user hours data."""
-    if not check_user_access(user_id, current_user, session):
+    if not await check_user_access(user_id, current_user, session):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     user = await account.user_get_data_hours(user_id, session)
     return user
\ No newline at end of file
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
-from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from auth.accountManagment import get_current_user
 from misc import schemas, models, db
 import auth
@@ -11,14 +11,14 @@ app = APIRouter(tags=["Authentication"])
           status_code=status.HTTP_201_CREATED)
 async def register(
     user: schemas.UserCreate,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     return await auth.register(user, session)
 
 @app.post("/login", response_model=schemas.Token)
 async def login(
     credentials: schemas.UserLogin,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     return await auth.login(credentials, session)
 
@@ -30,7 +30,7 @@ async def logout(token: str = Depends(schemas.oauth2_scheme)):
           response_model=schemas.Token)
 async def refresh_token(
     token: str = Depends(schemas.oauth2_scheme),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Refresh access token using refresh token"""
     return await auth.refresh_token(token, session) # type: ignore
@@ -41,7 +41,7 @@ async def refresh_token(
 async def check_token(
     response: Response,
     access_token: schemas.Token = Depends(schemas.Token),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Check if the provided access token is valid"""
     try:
@@ -58,28 +58,28 @@ async def check_token(
 @app.post("/password-reset/initiate")
 async def initiate_password_reset(
     email: str,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     return await auth.initiate_password_reset(email, session) # type: ignore
 
 @app.post("/password-reset/confirm")
 async def confirm_password_reset(
     reset_data: schemas.PasswordResetConfirm,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     return await auth.confirm_password_reset(reset_data, session) # type: ignore
 
 @app.get("/verify-email/{token}")
 async def verify_email(
     token: str,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     return await auth.verify_email(token, session) # type: ignore
 
 @app.post("/resend-verification")
 async def resend_verification(
     email: str,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Resend email verification link to user"""
     return await auth.request_email_verification(email, session) # type: ignore
@@ -96,7 +96,7 @@ async def resend_verification(
           description="Initiate two-factor authentication setup process")
 async def enable_2fa(
     current_user: dict = Depends(get_current_user),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Enable two-factor authentication for user"""
     return await auth.enable_2fa(current_user, session) # type: ignore
@@ -109,7 +109,7 @@ async def enable_2fa(
           description="Validate two-factor authentication code")
 async def verify_2fa(
     verification: schemas.MFAVerification,
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Verify MFA code and return access token"""
     return await auth.verify_2fa(verification, session) # type: ignore
@@ -7,7 +7,7 @@ from levels.calcXP import calcXP
 app = APIRouter(tags=["levels"])
 
 @app.get("/xp/{userID}")
-def get_xp(userID: int, session: Session = Depends(db.get_session)):
+def get_xp(userID: int, session: Session = Depends(db.get_sync_read_session)):
     try:
         user = session.exec(select(models.User).where(models.User.id == userID)).first()
         if not user:
@@ -19,7 +19,7 @@ def get_xp(userID: int, session: Session = Depends(db.get_session)):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/level/{userID}")
-def get_level(userID: int, session: Session = Depends(db.get_session)):
+def get_level(userID: int, session: Session = Depends(db.get_sync_read_session)):
     try:
         xp_data = get_xp(userID, session)
         if xp_data["xp"] == 0:
@@ -1,51 +1,91 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select, desc
 from typing import Optional
-from misc import db, models, logging
-from sqlalchemy import func
+from misc import db, models, logging, leaderboard
 
 app = APIRouter(tags=["misc"])
 
+def _counter(session: Session, name: str) -> int:
+    """Maintained total from globalcounter (see migration 3), a primary key lookup"""
+    value = session.exec(select(models.GlobalCounter.value).where(models.GlobalCounter.name == name)).first()
+    return value or 0
+
 @app.get("/stats/users_count")
-def get_users_count(session: Session = Depends(db.get_session)):
+def get_users_count(session: Session = Depends(db.get_sync_read_session)):
     try:
-        count = session.exec(select(models.User)).count()
-        return {"users_count": count}
-    except Exception:
+        return {"users_count": _counter(session, "users_count")}
+    except Exception as e:
+        logging.log(f"Error counting users: {str(e)}", "error")
         raise HTTPException(status_code=500, detail="Error counting users")
 
+# leaderboard type -> (board, score key in each entry)
+LEADERBOARD_TYPES = {
+    "total": ("hours", "hoursTotal"),
+    "daily": ("hours_daily", "hoursDaily"),
+    "weekly": ("hours_weekly", "hoursWeekly"),
+    "monthly": ("hours_monthly", "hoursMonthly"),
+    "points": ("points", "points"),
+    "xp": ("xp", "xp"),
+}
+
+def _leaderboard_type(types: Optional[str]):
+    if (types or "total") not in LEADERBOARD_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid type")
+    return LEADERBOARD_TYPES[types or "total"]
+
+def _leaderboard_entries(rows, key):
+    return [{"rank": rank, "user_id": user_id, key: score} for rank, user_id, score in rows]
+
 @app.get("/stats/leaderboard")
-def get_leaderboard(types: Optional[str] = None, session: Session = Depends(db.get_session)):
+def get_leaderboard(types: Optional[str] = None, offset: int = 0, limit: int = leaderboard.PAGE_SIZE):
+    board, key = _leaderboard_type(types)
+    if offset < 0 or not 1 <= limit <= leaderboard.MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {leaderboard.MAX_PAGE_SIZE}")
     try:
-        if types == "total" or types is None:
-            leaderboard = session.exec(select(models.UserHours).order_by(desc(models.UserHours.hoursTotal))).all()
-        elif types == "daily":
-            leaderboard = session.exec(select(models.UserHours).order_by(desc(models.UserHours.hoursDaily))).all()
-        elif types == "weekly":
-            leaderboard = session.exec(select(models.UserHours).order_by(desc(models.UserHours.hoursWeekly))).all()
-        elif types == "monthly":
-            leaderboard = session.exec(select(models.UserHours).order_by(desc(models.UserHours.hoursMonthly))).all()
-        else:
-            raise HTTPException(status_code=400, detail="Invalid type")
+        rows, total = leaderboard.get_page(board, offset, limit)
     except Exception as e:
         logging.log("Error fetching leaderboard: " + str(e), "error")
         raise HTTPException(status_code=500, detail="Database error")
     
-    if not leaderboard:
-        return {"leaderboard": []}
+    next_offset = offset + len(rows)
+    return {
+        "leaderboard": _leaderboard_entries(rows, key),
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset if next_offset < total else None
+    }
+
+@app.get("/stats/leaderboard/{user_id}")
+def get_leaderboard_rank(user_id: int, types: Optional[str] = None, radius: int = 5):
+    """The user's rank and the users around them"""
+    board, key = _leaderboard_type(types)
+    if not 0 <= radius <= leaderboard.MAX_PAGE_SIZE // 2:
+        raise HTTPException(status_code=400, detail=f"radius must be between 0 and {leaderboard.MAX_PAGE_SIZE // 2}")
+    try:
+        rank, rows, total = leaderboard.get_rank(board, user_id, radius)
+    except Exception as e:
+        logging.log("Error fetching leaderboard rank: " + str(e), "error")
+        raise HTTPException(status_code=500, detail="Database error")
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not on this leaderboard")
     
-    return {"leaderboard": [user.dict() for user in leaderboard]}
+    return {
+        "user_id": user_id,
+        "rank": rank,
+        "total": total,
+        "offset": rows[0][0] - 1,
+        "neighbours": _leaderboard_entries(rows, key)
+    }
 
 @app.get("/ping")
 def ping():
     return {"message": "pong"}
 
 @app.get("/stats/points_total")
-def get_total_points(session: Session = Depends(db.get_session)):
+def get_total_points(session: Session = Depends(db.get_sync_read_session)):
     try:
-        result = session.query(func.sum(models.User.points)).scalar()
-        total = result or 0
-        return {"points_total": total}
+        return {"points_total": _counter(session, "points_total")}
     except Exception as e:
         logging.log(f"Error calculating total points: {str(e)}", "error")
         raise HTTPException(status_code=500, detail="Database error")
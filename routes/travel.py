@@ -1,23 +1,26 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends, Response
 from auth.accountManagment import is_token_valid
 from misc import schemas
 from misc.schemas import ManualRideLog
 from misc.models import ManualRide
-from misc.db import get_session
+from misc.pagination import keyset_page, next_page
 import travel
 from misc import config, db, models
 from levels.calcXP import calcXP
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import json
 from collections import defaultdict
 import statistics
+from typing import Optional
 
 app = APIRouter(tags=["travel"])
 config_data = config.config
 debug_mode = config_data['app']['debug']
 base_url = config_data['app']['baseURL']
 db_name = config_data['app']['nameDB']
+ANALYTICS_MAX_WINDOW_MINUTES = 7 * 24 * 60  # rolling windows cover one week
 
 @app.post("/gps/track/{user_id}")
 async def track_gps_location(user_id: str, ping: schemas.LocationPing, request: Request):
@@ -38,7 +41,7 @@ async def track_gps_location(user_id: str, ping: schemas.LocationPing, request:
         
         # Process the GPS ping
         timestamp = ping.timestamp if hasattr(ping, 'timestamp') and ping.timestamp else None
-        result = travel.gpsinput(user_id, ping.latitude, ping.longitude, timestamp)
+        result = await db.run_sync(travel.gpsinput, user_id, ping.latitude, ping.longitude, timestamp, ping.accuracy, ping.speed)
         
         # Update analytics if we detected transport
         if result.get("on_transport", False):
@@ -65,6 +68,8 @@ async def track_gps_location(user_id: str, ping: schemas.LocationPing, request:
             "travel_status": "on_transport" if result.get("on_transport", False) else "off_transport",
             "session_info": {
                 "type": result.get("session_type", "none"),
+                "state": result.get("session_state", "idle"),
+                "filter_decision": result.get("filter_decision", "accepted"),
                 "travel_id": result.get("travel_id"),
                 "duration_seconds": result.get("duration", 0.0),
                 "distance_km": round(result.get("distance", 0.0), 3),
@@ -76,22 +81,27 @@ async def track_gps_location(user_id: str, ping: schemas.LocationPing, request:
                 "timestamp": timestamp or datetime.utcnow().isoformat(),
                 "on_route": result.get("on_transport", False)
             },
+            "tracking_hint": {
+                "next_ping_seconds": result.get("next_ping_seconds"),
+                "reason": result.get("ping_hint_reason")
+            },
             "user_id": user_id
         }
         
-        # Award XP if trip ended
-        if result.get("session_type") == "ended" and result.get("duration", 0) > 0:
-            duration_minutes = result["duration"] / 60
+        # Award XP once per trip, when the session engine closes a valid one
+        completed_trip = result.get("completed_trip")
+        if completed_trip and completed_trip.get("duration", 0) > 0:
+            duration_minutes = completed_trip["duration"] / 60
             
             if duration_minutes >= 2:  # Only meaningful trips
                 try:
-                    xp = calcXP(user_id, duration_minutes)
+                    xp = await db.run_sync(calcXP, user_id, duration_minutes)
                     response_data["xp_awarded"] = xp
                 except Exception:
                     pass  # XP calculation failed, no big deal
                 
                 try:
-                    daily_stats = travel.get_user_travel_stats(user_id, "daily")
+                    daily_stats = await db.run_sync(travel.get_user_travel_stats, user_id, "daily")
                     response_data["daily_stats"] = daily_stats
                 except Exception:
                     pass  # Stats failed, whatever
@@ -116,7 +126,7 @@ async def heartbeat(user_id: str, ping: schemas.LocationPing, request: Request):
     return await track_gps_location(user_id, ping, request)
 
 @app.get("/travel/stats/{user_id}")
-async def get_travel_statistics(user_id: str, timeframe: str = "daily", request: Request = None):
+async def get_travel_statistics(user_id: str, timeframe: str = "daily", request: Request = None, session: AsyncSession = Depends(db.get_read_session)):
     """
     Get user travel statistics for different timeframes.
     
@@ -138,7 +148,7 @@ async def get_travel_statistics(user_id: str, timeframe: str = "daily", request:
         if timeframe not in ["daily", "weekly", "monthly", "all"]:
             return {"error": "Invalid timeframe. Use 'daily', 'weekly', 'monthly', or 'all'"}
         
-        stats = travel.get_user_travel_stats(user_id, timeframe)
+        stats = await travel.get_user_travel_stats_async(session, user_id, timeframe)
         return {"success": True, "data": stats}
         
     except Exception as e:
@@ -148,17 +158,18 @@ async def get_travel_statistics(user_id: str, timeframe: str = "daily", request:
             return {"error": "Server error occurred"}
 
 @app.get("/travel/history/{user_id}")
-async def get_travel_history(user_id: str, limit: int = 10, request: Request = None):
+async def get_travel_history(user_id: str, limit: int = 10, cursor: Optional[str] = None, request: Request = None, session: AsyncSession = Depends(db.get_read_session)):
     """
-    Get user's recent travel history.
+    Get user's travel history, newest first.
     
     Args:
         user_id: User identifier
-        limit: Number of recent trips to return (default 10, max 50)
+        limit: Number of trips per page (default 10, max 50)
+        cursor: next_cursor from the previous page, omitted for the first page
         request: FastAPI request object for headers
         
     Returns:
-        JSON response with travel history
+        JSON response with travel history and next_cursor (None on the last page)
     """
     headers = request.headers if request else {}
     auth = str(headers.get("Authorization", ""))
@@ -167,40 +178,47 @@ async def get_travel_history(user_id: str, limit: int = 10, request: Request = N
         return {"error": "Invalid JWT"}
     
     try:
-        from misc.db import get_session
         from misc.models import TravelHistory
-        from sqlmodel import select
         
         # Limit the number of results to prevent abuse
         limit = min(max(1, limit), 50)
         
-        with get_session() as session:
-            statement = select(TravelHistory).where(
-                TravelHistory.user_id == int(user_id),
-                TravelHistory.duration > 120  # Only show trips longer than 2 minutes
-            ).order_by(TravelHistory.timestamp.desc()).limit(limit)
-            
-            travels = session.exec(statement).all()
-            
-            travel_data = []
-            for travel in travels:
-                travel_data.append({
-                    "id": travel.id,
-                    "timestamp": travel.timestamp.isoformat(),
-                    "duration_minutes": round(travel.duration / 60, 2),
-                    "distance_km": round(travel.distance, 2),
-                    "start_location": {
-                        "latitude": travel.startLatitude,
-                        "longitude": travel.startLongitude
-                    },
-                    "route_points": len(travel.listLatitude) if travel.listLatitude else 1
-                })
-            
-            return {"success": True, "data": {
-                "travels": travel_data,
-                "total_count": len(travel_data)
-            }}
-            
+        # Scalar columns only, the coordinate lists are not needed for a listing
+        statement = select(
+            TravelHistory.id, TravelHistory.timestamp, TravelHistory.duration, TravelHistory.distance,
+            TravelHistory.startLatitude, TravelHistory.startLongitude, TravelHistory.point_count
+        ).where(
+            TravelHistory.user_id == int(user_id),
+            TravelHistory.duration > 120  # Only show trips longer than 2 minutes
+        )
+        try:
+            statement = keyset_page(statement, TravelHistory.timestamp, TravelHistory.id, cursor, limit)
+        except ValueError:
+            return {"error": "Invalid cursor"}
+        
+        travels, next_cursor = next_page((await session.exec(statement)).all(), limit,
+                                         lambda row: row.timestamp, lambda row: row.id)
+        
+        travel_data = []
+        for travel in travels:
+            travel_data.append({
+                "id": travel.id,
+                "timestamp": travel.timestamp.isoformat(),
+                "duration_minutes": round(travel.duration / 60, 2),
+                "distance_km": round(travel.distance, 2),
+                "start_location": {
+                    "latitude": travel.startLatitude,
+                    "longitude": travel.startLongitude
+                },
+                "route_points": travel.point_count or 1
+            })
+        
+        return {"success": True, "data": {
+            "travels": travel_data,
+            "total_count": len(travel_data),
+            "next_cursor": next_cursor
+        }}
+        
     except Exception as e:
         if debug_mode:
             return {"error": "Server error", "detail": str(e)}
@@ -208,7 +226,7 @@ async def get_travel_history(user_id: str, limit: int = 10, request: Request = N
             return {"error": "Server error occurred"}
 
 @app.get("/gps/status/{user_id}")
-async def get_tracking_status(user_id: str, request: Request):
+async def get_tracking_status(user_id: str, request: Request, session: AsyncSession = Depends(db.get_read_session)):
     """
     Get current GPS tracking status for a user without submitting new location data.
     
@@ -240,83 +258,82 @@ async def get_tracking_status(user_id: str, request: Request):
                 "code": "INVALID_USER_ID"
             }
         
-        from misc.db import get_session
         from misc.models import TravelHistory, User
-        from sqlmodel import select
-        from datetime import datetime, timedelta
-        
-        with get_session() as session:
-            # Verify user exists
-            user_statement = select(User).where(User.id == int(user_id))
-            user = session.exec(user_statement).first()
-            if not user:
-                return {
-                    "error": "User not found",
-                    "message": f"User with ID {user_id} does not exist",
-                    "code": "USER_NOT_FOUND"
-                }
-            
-            # Get most recent travel session
-            statement = select(TravelHistory).where(
-                TravelHistory.user_id == int(user_id)
-            ).order_by(TravelHistory.timestamp.desc()).limit(1)
-            
-            last_travel = session.exec(statement).first()
-            
-            # Determine current status
-            now = datetime.utcnow()
-            is_active_session = False
-            session_data = None
-            
-            if last_travel:
-                time_since_last = (now - last_travel.timestamp).total_seconds()
-                
-                # Consider session active if within 10 minutes and has valid duration
-                if time_since_last <= 600 and last_travel.duration > 0:
-                    is_active_session = True
-                    session_data = {
-                        "travel_id": last_travel.id,
-                        "start_time": last_travel.timestamp.isoformat(),
-                        "duration_seconds": last_travel.duration,
-                        "distance_km": round(last_travel.distance, 3),
-                        "start_location": {
-                            "latitude": last_travel.startLatitude,
-                            "longitude": last_travel.startLongitude
-                        },
-                        "route_points": len(last_travel.listLatitude) if last_travel.listLatitude else 1
-                    }
-            
-            # Get travel statistics for different timeframes
-            daily_stats = travel.get_user_travel_stats(user_id, "daily")
-            weekly_stats = travel.get_user_travel_stats(user_id, "weekly")
-            monthly_stats = travel.get_user_travel_stats(user_id, "monthly")
-            
-            response_data = {
-                "user_id": user_id,
-                "tracking_status": {
-                    "is_active_session": is_active_session,
-                    "current_session": session_data,
-                    "last_activity": last_travel.timestamp.isoformat() if last_travel else None
-                },
-                "travel_statistics": {
-                    "daily": daily_stats,
-                    "weekly": weekly_stats,
-                    "monthly": monthly_stats
-                },
-                "user_profile": {
-                    "name": user.name,
-                    "total_xp": user.xp,
-                    "level": user.level,
-                    "total_points": user.points
-                }
-            }
-            
+        
+        # Verify user exists
+        user_statement = select(User).where(User.id == int(user_id))
+        user = (await session.exec(user_statement)).first()
+        if not user:
             return {
-                "success": True,
-                "data": response_data,
-                "timestamp": now.isoformat()
+                "error": "User not found",
+                "message": f"User with ID {user_id} does not exist",
+                "code": "USER_NOT_FOUND"
             }
+        
+        # Get most recent travel session
+        statement = select(
+            TravelHistory.id, TravelHistory.timestamp, TravelHistory.duration, TravelHistory.distance,
+            TravelHistory.startLatitude, TravelHistory.startLongitude, TravelHistory.point_count
+        ).where(
+            TravelHistory.user_id == int(user_id)
+        ).order_by(TravelHistory.timestamp.desc()).limit(1)
+        
+        last_travel = (await session.exec(statement)).first()
+        
+        # Determine current status
+        now = datetime.utcnow()
+        is_active_session = False
+        session_data = None
+        
+        if last_travel:
+            time_since_last = (now - last_travel.timestamp).total_seconds()
             
+            # Consider session active if within 10 minutes and has valid duration
+            if time_since_last <= 600 and last_travel.duration > 0:
+                is_active_session = True
+                session_data = {
+                    "travel_id": last_travel.id,
+                    "start_time": last_travel.timestamp.isoformat(),
+                    "duration_seconds": last_travel.duration,
+                    "distance_km": round(last_travel.distance, 3),
+                    "start_location": {
+                        "latitude": last_travel.startLatitude,
+                        "longitude": last_travel.startLongitude
+                    },
+                    "route_points": last_travel.point_count or 1
+                }
+        
+        # Get travel statistics for different timeframes
+        daily_stats = await travel.get_user_travel_stats_async(session, user_id, "daily")
+        weekly_stats = await travel.get_user_travel_stats_async(session, user_id, "weekly")
+        monthly_stats = await travel.get_user_travel_stats_async(session, user_id, "monthly")
+        
+        response_data = {
+            "user_id": user_id,
+            "tracking_status": {
+                "is_active_session": is_active_session,
+                "current_session": session_data,
+                "last_activity": last_travel.timestamp.isoformat() if last_travel else None
+            },
+            "travel_statistics": {
+                "daily": daily_stats,
+                "weekly": weekly_stats,
+                "monthly": monthly_stats
+            },
+            "user_profile": {
+                "name": user.name,
+                "total_xp": user.xp,
+                "level": user.level,
+                "total_points": user.points
+            }
+        }
+        
+        return {
+            "success": True,
+            "data": response_data,
+            "timestamp": now.isoformat()
+        }
+        
     except Exception as e:
         error_response = {
             "error": "Server error",
@@ -379,14 +396,16 @@ async def get_nearby_routes(latitude: float, longitude: float, radius: int = 100
         # Limit radius to reasonable bounds
         radius = max(50, min(radius, 5000))
         
-        # Get nearby routes using the travel module
-        nearby_routes = travel.get_nearby_routes(latitude, longitude, radius_meters=radius)
-        
-        # Check if user would be considered "on route" at this location
-        on_route = travel.is_user_on_any_nearby_route(latitude, longitude)
+        # One cached context answers on-route and transport type (shapely work runs on the sync pool)
+        context = await db.run_sync(travel.get_location_context, latitude, longitude)
         
-        # Detect likely transport type
-        transport_type = travel.detect_transport_type(latitude, longitude)
+        # The context already holds the default radius, other radii need their own query
+        if radius == travel.CONTEXT_RADIUS_METERS:
+            nearby_indices = [route_idx for route_idx, _ in context.candidates]
+        else:
+            candidates = await db.run_sync(travel.route_manager.get_route_candidates, latitude, longitude, radius)
+            nearby_indices = [route_idx for route_idx, _ in candidates]
+        routes_lines = travel.route_manager.get_routes_lines()
         
         response_data = {
             "location": {
@@ -395,17 +414,17 @@ async def get_nearby_routes(latitude: float, longitude: float, radius: int = 100
                 "search_radius_meters": radius
             },
             "route_analysis": {
-                "nearby_routes_count": len(nearby_routes),
-                "on_transport_route": on_route,
-                "detected_transport_type": transport_type
+                "nearby_routes_count": len(nearby_indices),
+                "on_transport_route": context.on_route,
+                "detected_transport_type": [context.transport_type, context.transport_confidence]
             },
             "routes": [
                 {
-                    "route_id": idx,
-                    "coordinates_count": len(route.coords) if hasattr(route, 'coords') else 0,
-                    "route_length_km": round(route.length * 111.32, 2) if hasattr(route, 'length') else 0
+                    "route_id": travel.route_manager.get_route_id(route_idx),
+                    "coordinates_count": len(routes_lines[route_idx].coords),
+                    "route_length_km": round(routes_lines[route_idx].length * 111.32, 2)
                 }
-                for idx, route in enumerate(nearby_routes[:20])  # Limit to first 20 routes
+                for route_idx in nearby_indices[:20]  # Limit to first 20 routes
             ]
         }
         
@@ -458,7 +477,7 @@ async def refresh_route_cache(request: Request):
     try:
         # Force refresh the route cache
         start_time = datetime.utcnow()
-        travel.route_manager.refresh_cache()
+        await db.run_sync(travel.route_manager.refresh_cache)
         end_time = datetime.utcnow()
         
         refresh_duration = (end_time - start_time).total_seconds()
@@ -547,7 +566,9 @@ async def get_route_cache_status(request: Request):
                 "cache_file_path": cache_file,
                 "lazy_loading_enabled": True,
                 "spatial_indexing_enabled": True
-            }
+            },
+            "ping_filter": travel.ping_filter.get_stats(),
+            "location_context": travel.location_context_cache.get_stats()
         }
         
         return {
@@ -579,77 +600,78 @@ import json
 from collections import defaultdict
 import statistics
 
+def _popular_routes_data(limit, minutes):
+    """Popular routes payload; reads the shared analytics store, so run it through db.run_sync"""
+    if minutes:
+        popular_routes = travel.route_analytics.get_popular_routes_window(minutes, limit)
+    else:
+        popular_routes = travel.route_analytics.get_popular_routes(limit)
+    
+    routes = []
+    for route_id, usage_count in popular_routes:
+        route_info = travel.route_analytics.get_route_analytics(route_id)
+        
+        # Route details from the catalogue index
+        route_details = travel.route_manager.get_route_details(route_id) if travel.route_manager._loaded else None
+        
+        routes.append({
+            "route_id": route_id,
+            "usage_count": usage_count,
+            "route_details": route_details,
+            "confidence": route_info.get("confidence", 0.0)
+        })
+    
+    return {"routes": routes, "total_analyzed": travel.route_analytics.get_tracked_routes_count(), "window_minutes": minutes}
+
 @app.get("/analytics/popular-routes")
-async def get_popular_routes(request: Request, limit: int = 10):
-    """Get the most popular bus/train routes."""
+async def get_popular_routes(request: Request, limit: int = 10, minutes: Optional[int] = None):
+    """Get the most popular bus/train routes, optionally only over the last `minutes` minutes."""
     if not is_token_valid(str(request.headers.get("Authorization", ""))):
         return {"error": "Unauthorized"}
     
     try:
         limit = min(max(1, limit), 50)  # Between 1 and 50
-        popular_routes = travel.route_analytics.get_popular_routes(limit)
-        
-        routes = []
-        for route_id, usage_count in popular_routes:
-            route_info = travel.route_analytics.get_route_analytics(route_id)
-            
-            # Try to get route details
-            route_details = None
-            if travel.route_manager._loaded:
-                for route in travel.route_manager.routes:
-                    if route.get('id') == route_id:
-                        route_details = {
-                            "name": route.get('name', 'Unknown Route'),
-                            "transport_type": route.get('transport_type', 'unknown'),
-                            "operator": route.get('operator', 'unknown')
-                        }
-                        break
-            
-            routes.append({
-                "route_id": route_id,
-                "usage_count": usage_count,
-                "route_details": route_details,
-                "confidence": route_info.get("confidence", 0.0)
-            })
-        
-        return {"routes": routes, "total_analyzed": len(travel.route_analytics.route_usage_stats)}
+        if minutes:
+            minutes = min(max(1, minutes), ANALYTICS_MAX_WINDOW_MINUTES)
+        return await db.run_sync(_popular_routes_data, limit, minutes)
         
     except Exception as e:
         return {"error": f"Failed to get routes: {str(e)}" if debug_mode else "Server error"}
 
 @app.get("/analytics/operator-stats")
-async def get_operator_stats(request: Request):
-    """Get stats on different transport operators."""
+async def get_operator_stats(request: Request, minutes: Optional[int] = None, period: Optional[str] = None,
+                             start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Get stats on different transport operators.
+    
+    Lifetime totals by default. Narrow it with `minutes` (rolling, up to a week),
+    `period` ("today", "week" or "month", UTC) or a custom `start`/`end` range.
+    """
     if not is_token_valid(str(request.headers.get("Authorization", ""))):
         return {"error": "Unauthorized"}
     
     try:
-        operator_stats = travel.route_analytics.get_operator_stats()
-        total_routes = sum(sum(types.values()) for types in operator_stats.values())
-        
-        operators = []
-        for operator, transport_types in operator_stats.items():
-            operator_routes = sum(transport_types.values())
-            operators.append({
-                "operator": operator,
-                "routes": operator_routes,
-                "types": dict(transport_types),
-                "share": round(operator_routes / total_routes * 100, 1) if total_routes > 0 else 0
-            })
-        
-        operators.sort(key=lambda x: x['routes'], reverse=True)
-        
-        # Transport type totals
-        type_totals = defaultdict(int)
-        for types in operator_stats.values():
-            for transport_type, count in types.items():
-                type_totals[transport_type] += count
-        
-        return {
-            "operators": operators,
-            "transport_types": dict(type_totals),
-            "total_routes": total_routes
-        }
+        if period:
+            now = datetime.utcnow()
+            midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            period_starts = {
+                "today": midnight,
+                "week": midnight - timedelta(days=midnight.weekday()),
+                "month": midnight.replace(day=1),
+            }
+            if period not in period_starts:
+                return {"error": "Invalid period", "message": "period must be one of today, week, month"}
+            start, end = period_starts[period], None
+        
+        # The summary reads the analytics store (and may replay the rolling windows), keep it off the event loop
+        if start is not None:
+            summary = await db.run_sync(travel.route_analytics.get_operator_summary, start=start, end=end)
+        elif minutes:
+            summary = await db.run_sync(travel.route_analytics.get_operator_summary,
+                                        minutes=min(max(1, minutes), ANALYTICS_MAX_WINDOW_MINUTES))
+        else:
+            summary = await db.run_sync(travel.route_analytics.get_operator_summary)
+        return summary
         
     except Exception as e:
         return {"error": f"Failed: {str(e)}" if debug_mode else "Server error"}
@@ -683,12 +705,15 @@ async def get_transport_patterns(request: Request):
             # Calculate pattern statistics
             speed_stats = {}
             if pattern.speed_profile:
+                profile = pattern.speed_profile
                 speed_stats = {
-                    "avg_speed": round(statistics.mean(pattern.speed_profile), 2),
-                    "speed_variance": round(statistics.variance(pattern.speed_profile), 2) if len(pattern.speed_profile) > 1 else 0,
-                    "min_speed": round(min(pattern.speed_profile), 2),
-                    "max_speed": round(max(pattern.speed_profile), 2),
-                    "data_points": len(pattern.speed_profile)
+                    "avg_speed": round(profile.mean(), 2),
+                    "speed_variance": round(profile.variance(), 2),
+                    "min_speed": round(profile.min, 2),
+                    "max_speed": round(profile.max, 2),
+                    "median_speed": round(profile.quantile(0.5), 2),
+                    "p90_speed": round(profile.quantile(0.9), 2),
+                    "data_points": profile.count
                 }
             
             transport_patterns[transport_type] = {
@@ -736,7 +761,7 @@ async def get_transport_patterns(request: Request):
         return error_response
 
 @app.get("/analytics/user/{user_id}/travel-insights")
-async def get_user_travel_insights(user_id: str, request: Request):
+async def get_user_travel_insights(user_id: str, request: Request, session: AsyncSession = Depends(db.get_read_session)):
     """
     Get personalized travel insights and analytics for a specific user.
     
@@ -766,13 +791,12 @@ async def get_user_travel_insights(user_id: str, request: Request):
                 "code": "INVALID_USER_ID"
             }
         
-        # Get user travel data from database
-        session = next(db.get_session())
-        
         # Query user's travel sessions
-        user_travels = session.exec(
-            select(models.Travel).where(models.Travel.user_id == int(user_id))
-        ).all()
+        user_travels = (await session.exec(
+            select(
+                models.TravelHistory.distance, models.TravelHistory.duration, models.TravelHistory.timestamp
+            ).where(models.TravelHistory.user_id == int(user_id))
+        )).all()
         
         if not user_travels:
             return {
@@ -787,18 +811,31 @@ async def get_user_travel_insights(user_id: str, request: Request):
         
         # Convert to dictionary format for analysis
         travel_data = []
-        for travel in user_travels:
+        for trip in user_travels:
             travel_data.append({
-                "transport_type": travel.transport_type or "unknown",
-                "distance": travel.distance or 0,
-                "duration": travel.duration or 0,
-                "avg_speed": (travel.distance / (travel.duration / 3600)) if travel.duration and travel.distance else 0,
-                "timestamp": travel.timestamp.isoformat() if travel.timestamp else None
+                "transport_type": getattr(trip, "transport_type", None) or "unknown",
+                "distance": trip.distance or 0,
+                "duration": trip.duration or 0,
+                "avg_speed": (trip.distance / (trip.duration / 3600)) if trip.duration and trip.distance else 0,
+                "timestamp": trip.timestamp.isoformat() if trip.timestamp else None
             })
         
         # Analyze travel patterns
         patterns = travel.route_analytics.analyze_transport_patterns(travel_data)
         
+        # Routes the user rides most, from map-matched trips
+        matches = (await session.exec(
+            select(models.TravelMatch).where(models.TravelMatch.user_id == int(user_id))
+        )).all()
+        route_counts = defaultdict(int)
+        for match in matches:
+            for route_id in set(match.route_ids or []):
+                route_counts[route_id] += 1
+        frequent_routes = [
+            {"route_id": route_id, "trips": trips, "route_details": _route_summary(route_id)}
+            for route_id, trips in sorted(route_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        ]
+        
         # Calculate user-specific statistics
         total_distance = sum(t["distance"] for t in travel_data)
         total_duration = sum(t["duration"] for t in travel_data)
@@ -806,8 +843,8 @@ async def get_user_travel_insights(user_id: str, request: Request):
         
         # Transport type preferences
         transport_usage = defaultdict(int)
-        for travel in travel_data:
-            transport_usage[travel["transport_type"]] += 1
+        for trip in travel_data:
+            transport_usage[trip["transport_type"]] += 1
         
         preferred_transport = max(transport_usage.items(), key=lambda x: x[1]) if transport_usage else ("unknown", 0)
         
@@ -826,6 +863,7 @@ async def get_user_travel_insights(user_id: str, request: Request):
                 "transport_diversity": len(transport_usage)
             },
             "travel_patterns": patterns,
+            "frequent_routes": frequent_routes,
             "efficiency_metrics": {
                 "avg_speed_kmh": round(total_distance / (total_duration / 3600), 2) if total_duration > 0 else 0,
                 "trips_per_pattern": {transport_type: data["trip_count"] for transport_type, data in patterns.items()},
@@ -861,9 +899,102 @@ async def get_user_travel_insights(user_id: str, request: Request):
             
         return error_response
 
+def _route_summary(route_id):
+    """Name, operator, type and length of a route from the catalogue, without forcing a route load"""
+    if not travel.route_manager._loaded:
+        return None
+    details = travel.route_manager.get_route_details(route_id)
+    if details is None:
+        return None
+    return {key: details[key] for key in ("name", "operator", "transport_type", "length_km")}
+
+def _build_dashboard_data():
+    """Compute the analytics dashboard payload; run by dashboard_view on its schedule"""
+    # Get all analytics data
+    popular_routes = travel.route_analytics.get_popular_routes(5)
+    operator_stats = travel.route_analytics.get_operator_stats()
+    
+    # Route cache statistics
+    route_count = travel.route_manager.get_routes_count() if travel.route_manager._loaded else 0
+    cache_loaded = travel.route_manager._loaded
+    
+    # Transport pattern statistics
+    transport_patterns = travel.route_analytics.transport_patterns
+    total_samples = sum(p.sample_count for p in transport_patterns.values())
+    high_confidence = sum(1 for p in transport_patterns.values() if p.confidence > 0.7)
+    
+    # Usage statistics
+    total_route_usage = travel.route_analytics.get_total_usage()
+    unique_routes_used = travel.route_analytics.get_tracked_routes_count()
+    
+    # Calculate system health metrics
+    system_health = {
+        "route_cache_status": "healthy" if cache_loaded and route_count > 0 else "degraded",
+        "analytics_status": "active" if total_samples > 0 else "learning",
+        "detection_accuracy": round(high_confidence / len(transport_patterns) * 100, 1) if transport_patterns else 0
+    }
+    
+    # Recent activity from the rolling usage windows
+    recent_activity = {
+        "routes_accessed_last_hour": travel.route_analytics.get_usage_in_window(60),
+        "routes_accessed_last_day": travel.route_analytics.get_usage_in_window(24 * 60),
+        "top_routes_last_hour": [
+            {"route_id": route_id, "usage_count": count, "route_details": _route_summary(route_id)}
+            for route_id, count in travel.route_analytics.get_popular_routes_window(60, 5)
+        ],
+        "new_patterns_learned": sum(1 for p in transport_patterns.values() if p.sample_count > 0),
+        "cache_hits": total_route_usage
+    }
+    
+    dashboard_data = {
+        "system_overview": {
+            "total_routes": route_count,
+            "routes_cached": cache_loaded,
+            "unique_routes_used": unique_routes_used,
+            "total_usage_events": total_route_usage,
+            "system_health": system_health
+        },
+        "popular_routes": [
+            {
+                "route_id": route_id,
+                "usage_count": usage_count,
+                "percentage": round(usage_count / total_route_usage * 100, 2) if total_route_usage > 0 else 0,
+                "route_details": _route_summary(route_id)
+            }
+            for route_id, usage_count in popular_routes
+        ],
+        "transport_analytics": {
+            "total_operators": len(operator_stats),
+            "transport_types_detected": len(transport_patterns),
+            "high_confidence_patterns": high_confidence,
+            "total_learning_samples": total_samples
+        },
+        "recent_activity": recent_activity,
+        "performance_metrics": {
+            "cache_efficiency": round(total_route_usage / route_count * 100, 2) if route_count > 0 else 0,
+            "pattern_learning_rate": round(total_samples / max(len(transport_patterns), 1), 1),
+            "route_coverage": round(unique_routes_used / route_count * 100, 2) if route_count > 0 else 0
+        }
+    }
+    
+    return dashboard_data
+
+# Materialized dashboard shared by all workers, rebuilt in the background
+dashboard_view = travel.MaterializedView(
+    "dashboard",
+    _build_dashboard_data,
+    travel.route_analytics.store,
+    refresh_interval=config_data.get('analytics', {}).get('dashboardRefreshSeconds', 300),
+)
+
 @app.get("/analytics/dashboard")
-async def get_analytics_dashboard(request: Request):
-    """Get analytics dashboard for admin monitoring."""
+async def get_analytics_dashboard(request: Request, response: Response):
+    """
+    Get analytics dashboard for admin monitoring.
+    
+    Served from a periodically rebuilt snapshot; a stale snapshot is returned
+    immediately while a fresh one is built. Supports If-None-Match.
+    """
     headers = request.headers
     auth = str(headers.get("Authorization", ""))
     
@@ -875,72 +1006,21 @@ async def get_analytics_dashboard(request: Request):
         }
     
     try:
-        # Get all analytics data
-        popular_routes = travel.route_analytics.get_popular_routes(5)
-        operator_stats = travel.route_analytics.get_operator_stats()
-        
-        # Route cache statistics
-        route_count = travel.route_manager.get_routes_count() if travel.route_manager._loaded else 0
-        cache_loaded = travel.route_manager._loaded
-        
-        # Transport pattern statistics
-        transport_patterns = travel.route_analytics.transport_patterns
-        total_samples = sum(p.sample_count for p in transport_patterns.values())
-        high_confidence = sum(1 for p in transport_patterns.values() if p.confidence > 0.7)
-        
-        # Usage statistics
-        total_route_usage = sum(travel.route_analytics.route_usage_stats.values())
-        unique_routes_used = len(travel.route_analytics.route_usage_stats)
-        
-        # Calculate system health metrics
-        system_health = {
-            "route_cache_status": "healthy" if cache_loaded and route_count > 0 else "degraded",
-            "analytics_status": "active" if total_samples > 0 else "learning",
-            "detection_accuracy": round(high_confidence / len(transport_patterns) * 100, 1) if transport_patterns else 0
-        }
-        
-        # Recent activity (mock data - in production this would come from real activity logs)
-        recent_activity = {
-            "routes_accessed_last_hour": min(total_route_usage, 50),  # Simulated
-            "new_patterns_learned": sum(1 for p in transport_patterns.values() if p.sample_count > 0),
-            "cache_hits": total_route_usage
-        }
-        
-        dashboard_data = {
-            "system_overview": {
-                "total_routes": route_count,
-                "routes_cached": cache_loaded,
-                "unique_routes_used": unique_routes_used,
-                "total_usage_events": total_route_usage,
-                "system_health": system_health
-            },
-            "popular_routes": [
-                {
-                    "route_id": route_id,
-                    "usage_count": usage_count,
-                    "percentage": round(usage_count / total_route_usage * 100, 2) if total_route_usage > 0 else 0
-                }
-                for route_id, usage_count in popular_routes
-            ],
-            "transport_analytics": {
-                "total_operators": len(operator_stats),
-                "transport_types_detected": len(transport_patterns),
-                "high_confidence_patterns": high_confidence,
-                "total_learning_samples": total_samples
-            },
-            "recent_activity": recent_activity,
-            "performance_metrics": {
-                "cache_efficiency": round(total_route_usage / route_count * 100, 2) if route_count > 0 else 0,
-                "pattern_learning_rate": round(total_samples / max(len(transport_patterns), 1), 1),
-                "route_coverage": round(unique_routes_used / route_count * 100, 2) if route_count > 0 else 0
-            }
+        snapshot = await db.run_sync(dashboard_view.get)
+        max_age = max(int(dashboard_view.refresh_interval - snapshot.age), 0)
+        cache_headers = {
+            "ETag": snapshot.etag,
+            "Cache-Control": f"private, max-age={max_age}, stale-while-revalidate={int(dashboard_view.refresh_interval)}",
         }
+        if headers.get("If-None-Match") == snapshot.etag:
+            return Response(status_code=304, headers=cache_headers)
+        response.headers.update(cache_headers)
         
         return {
             "success": True,
-            "data": dashboard_data,
-            "timestamp": datetime.utcnow().isoformat(),
-            "refresh_interval": 300  # Recommend refresh every 5 minutes
+            "data": snapshot.payload,
+            "timestamp": datetime.utcfromtimestamp(snapshot.built_at).isoformat(),
+            "refresh_interval": int(dashboard_view.refresh_interval)
         }
         
     except Exception as e:
@@ -960,13 +1040,13 @@ async def get_analytics_dashboard(request: Request):
 
 from misc.models import ManualRide
 from misc.schemas import ManualRideLog
-from misc.db import get_session
 from fastapi import Depends
 
 @app.post("/rides/manual")
 async def log_manual_ride(
     ride: ManualRideLog,
-    request: Request
+    request: Request,
+    session: AsyncSession = Depends(db.get_async_session)
 ):
     """Log a manual ride entry for the authenticated user."""
     headers = request.headers
@@ -994,41 +1074,40 @@ async def log_manual_ride(
         return {"success": False, "error": f"Invalid token: {str(e)}"}
     
     try:
-        with get_session() as session:
-            manual_ride = ManualRide(
-                user_id=user_id,
-                transport_type=ride.transport_type,
-                start_location=ride.start_location,
-                end_location=ride.end_location,
-                duration_minutes=ride.duration_minutes,
-                distance_km=ride.distance_km,
-                date=ride.date,
-                time=ride.time,
-                notes=ride.notes,
-                manual_entry=ride.manual_entry
-            )
-            session.add(manual_ride)
-            session.commit()
-            session.refresh(manual_ride)
-            
-            # Calculate and award XP for manual rides if duration is significant
-            if ride.duration_minutes >= 2:
-                try:
-                    xp = calcXP(str(user_id), ride.duration_minutes)
-                    return {"success": True, "ride_id": manual_ride.id, "xp_awarded": xp}
-                except Exception:
-                    return {"success": True, "ride_id": manual_ride.id}
-            
-            return {"success": True, "ride_id": manual_ride.id}
-            
+        manual_ride = ManualRide(
+            user_id=user_id,
+            transport_type=ride.transport_type,
+            start_location=ride.start_location,
+            end_location=ride.end_location,
+            duration_minutes=ride.duration_minutes,
+            distance_km=ride.distance_km,
+            date=ride.date,
+            time=ride.time,
+            notes=ride.notes,
+            manual_entry=ride.manual_entry
+        )
+        session.add(manual_ride)
+        await session.commit()
+        await session.refresh(manual_ride)
+        
+        # Calculate and award XP for manual rides if duration is significant
+        if ride.duration_minutes >= 2:
+            try:
+                xp = await db.run_sync(calcXP, str(user_id), ride.duration_minutes)
+                return {"success": True, "ride_id": manual_ride.id, "xp_awarded": xp}
+            except Exception:
+                return {"success": True, "ride_id": manual_ride.id}
+        
+        return {"success": True, "ride_id": manual_ride.id}
+        
     except Exception as e:
         if debug_mode:
             return {"success": False, "error": f"Failed to log manual ride: {str(e)}"}
         return {"success": False, "error": "Failed to log manual ride. Please try again."}
 
 @app.get("/rides/manual/{user_id}")
-async def get_manual_rides(user_id: str, limit: int = 10, request: Request = None):
-    """Get manual ride history for a user."""
+async def get_manual_rides(user_id: str, limit: int = 10, cursor: Optional[str] = None, request: Request = None, session: AsyncSession = Depends(db.get_read_session)):
+    """Get manual ride history for a user, newest first; pass next_cursor back as cursor for older rides."""
     headers = request.headers if request else {}
     auth = str(headers.get("Authorization", ""))
     
@@ -1056,41 +1135,44 @@ async def get_manual_rides(user_id: str, limit: int = 10, request: Request = Non
         # Limit the number of results
         limit = min(max(1, limit), 50)
         
-        with get_session() as session:
-            statement = select(ManualRide).where(
-                ManualRide.user_id == int(user_id)
-            ).order_by(ManualRide.created_at.desc()).limit(limit)
-            
-            rides = session.exec(statement).all()
-            
-            ride_data = []
-            for ride in rides:
-                ride_data.append({
-                    "id": ride.id,
-                    "transport_type": ride.transport_type,
-                    "start_location": ride.start_location,
-                    "end_location": ride.end_location,
-                    "duration_minutes": ride.duration_minutes,
-                    "distance_km": ride.distance_km,
-                    "date": ride.date,
-                    "time": ride.time,
-                    "notes": ride.notes,
-                    "manual_entry": ride.manual_entry,
-                    "created_at": ride.created_at.isoformat()
-                })
-            
-            return {"success": True, "data": {
-                "rides": ride_data,
-                "total_count": len(ride_data)
-            }}
-            
+        statement = select(ManualRide).where(ManualRide.user_id == int(user_id))
+        try:
+            statement = keyset_page(statement, ManualRide.created_at, ManualRide.id, cursor, limit)
+        except ValueError:
+            return {"error": "Invalid cursor"}
+        
+        rides, next_cursor = next_page((await session.exec(statement)).all(), limit,
+                                       lambda ride: ride.created_at, lambda ride: ride.id)
+        
+        ride_data = []
+        for ride in rides:
+            ride_data.append({
+                "id": ride.id,
+                "transport_type": ride.transport_type,
+                "start_location": ride.start_location,
+                "end_location": ride.end_location,
+                "duration_minutes": ride.duration_minutes,
+                "distance_km": ride.distance_km,
+                "date": ride.date,
+                "time": ride.time,
+                "notes": ride.notes,
+                "manual_entry": ride.manual_entry,
+                "created_at": ride.created_at.isoformat()
+            })
+        
+        return {"success": True, "data": {
+            "rides": ride_data,
+            "total_count": len(ride_data),
+            "next_cursor": next_cursor
+        }}
+        
     except Exception as e:
         if debug_mode:
             return {"error": f"Server error: {str(e)}"}
         return {"error": "Failed to retrieve manual rides"}
 
 @app.delete("/rides/manual/{ride_id}")
-async def delete_manual_ride(ride_id: int, request: Request):
+async def delete_manual_ride(ride_id: int, request: Request, session: AsyncSession = Depends(db.get_async_session)):
     """Delete a manual ride entry."""
     headers = request.headers
     auth = str(headers.get("Authorization", ""))
@@ -1112,29 +1194,28 @@ async def delete_manual_ride(ride_id: int, request: Request):
         
         user_id = int(sub[:-1])  # Remove the 'a' suffix
         
-        with get_session() as session:
-            # Find the ride and verify ownership
-            statement = select(ManualRide).where(
-                ManualRide.id == ride_id,
-                ManualRide.user_id == user_id
-            )
-            ride = session.exec(statement).first()
-            
-            if not ride:
-                return {"success": False, "error": "Ride not found or access denied"}
-            
-            session.delete(ride)
-            session.commit()
-            
-            return {"success": True, "message": "Manual ride deleted successfully"}
-            
+        # Find the ride and verify ownership
+        statement = select(ManualRide).where(
+            ManualRide.id == ride_id,
+            ManualRide.user_id == user_id
+        )
+        ride = (await session.exec(statement)).first()
+        
+        if not ride:
+            return {"success": False, "error": "Ride not found or access denied"}
+        
+        await session.delete(ride)
+        await session.commit()
+        
+        return {"success": True, "message": "Manual ride deleted successfully"}
+        
     except Exception as e:
         if debug_mode:
             return {"success": False, "error": f"Failed to delete manual ride: {str(e)}"}
         return {"success": False, "error": "Failed to delete manual ride. Please try again."}
 
 @app.put("/rides/manual/{ride_id}")
-async def update_manual_ride(ride_id: int, ride: ManualRideLog, request: Request):
+async def update_manual_ride(ride_id: int, ride: ManualRideLog, request: Request, session: AsyncSession = Depends(db.get_async_session)):
     """Update a manual ride entry."""
     headers = request.headers
     auth = str(headers.get("Authorization", ""))
@@ -1156,34 +1237,33 @@ async def update_manual_ride(ride_id: int, ride: ManualRideLog, request: Request
         
         user_id = int(sub[:-1])  # Remove the 'a' suffix
         
-        with get_session() as session:
-            # Find the ride and verify ownership
-            statement = select(ManualRide).where(
-                ManualRide.id == ride_id,
-                ManualRide.user_id == user_id
-            )
-            existing_ride = session.exec(statement).first()
-            
-            if not existing_ride:
-                return {"success": False, "error": "Ride not found or access denied"}
-            
-            # Update the ride with new data
-            existing_ride.transport_type = ride.transport_type
-            existing_ride.start_location = ride.start_location
-            existing_ride.end_location = ride.end_location
-            existing_ride.duration_minutes = ride.duration_minutes
-            existing_ride.distance_km = ride.distance_km
-            existing_ride.date = ride.date
-            existing_ride.time = ride.time
-            existing_ride.notes = ride.notes
-            existing_ride.manual_entry = ride.manual_entry
-            
-            session.add(existing_ride)
-            session.commit()
-            session.refresh(existing_ride)
-            
-            return {"success": True, "ride_id": existing_ride.id, "message": "Manual ride updated successfully"}
-            
+        # Find the ride and verify ownership
+        statement = select(ManualRide).where(
+            ManualRide.id == ride_id,
+            ManualRide.user_id == user_id
+        )
+        existing_ride = (await session.exec(statement)).first()
+        
+        if not existing_ride:
+            return {"success": False, "error": "Ride not found or access denied"}
+        
+        # Update the ride with new data
+        existing_ride.transport_type = ride.transport_type
+        existing_ride.start_location = ride.start_location
+        existing_ride.end_location = ride.end_location
+        existing_ride.duration_minutes = ride.duration_minutes
+        existing_ride.distance_km = ride.distance_km
+        existing_ride.date = ride.date
+        existing_ride.time = ride.time
+        existing_ride.notes = ride.notes
+        existing_ride.manual_entry = ride.manual_entry
+        
+        session.add(existing_ride)
+        await session.commit()
+        await session.refresh(existing_ride)
+        
+        return {"success": True, "ride_id": existing_ride.id, "message": "Manual ride updated successfully"}
+        
     except Exception as e:
         if debug_mode:
             return {"success": False, "error": f"Failed to update manual ride: {str(e)}"}
@@ -3,13 +3,14 @@
 Test the analytics API endpoints.
 """
 
+import os
 import requests
 import json
 import time
 import sys
 from datetime import datetime
 
-BASE_URL = "http://localhost:8000"
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 TEST_TOKEN = "test_token_123"  # Update with valid token
 TEST_USER_ID = "12345"
 
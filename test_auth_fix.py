@@ -3,11 +3,12 @@
 Quick test script to verify the authentication fix
 """
 
+import os
 import requests
 import json
 
 # Configuration
-BASE_URL = "http://localhost:8000"
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
 def test_authentication():
     """Test authentication and profile access"""
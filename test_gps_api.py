@@ -6,6 +6,7 @@ This script tests the enhanced GPS location tracking endpoints to ensure they wo
 It simulates a user journey on public transportation.
 """
 
+import os
 import requests
 import json
 import time
@@ -13,7 +14,7 @@ from datetime import datetime, timedelta
 import random
 
 # Test configuration
-BASE_URL = "http://localhost:8000"  # Adjust if your server runs on different port
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")  # Adjust if your server runs on different port
 TEST_USER_ID = "1"  # Adjust to a valid user ID in your system
 TEST_TOKEN = "your_test_token_here"  # Replace with a valid JWT token
 
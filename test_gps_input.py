@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the /gps/track pipeline behind travel.gpsinput
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import undefer
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import travel
+from misc import db
+from misc.models import TravelHistory, User, UserDailyTravel
+from travel.locationContext import LocationContextCache
+from travel.mapMatching import MapMatcher
+from travel.pingFilter import PingFilter, PingFilterConfig
+from travel.sessionEngine import TripSessionEngine, SessionTimeouts
+
+ROUTE = [[52.52, 13.40], [52.52, 13.42]]
+
+class GpsInputTestCase(unittest.TestCase):
+    """gpsinput against one bus route, an in-memory database and fresh per-user state"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        path = os.path.join(self.tmpdir.name, "routes.json")
+        with open(path, "w") as f:
+            json.dump({"routes": [{"coordinates": ROUTE, "metadata": {"route_id": "bus_100", "transport_type": "bus"}}],
+                       "cache_created": time.time()}, f)
+        manager = travel.RouteManager()
+        manager._cache_file = path
+
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        with Session(engine) as session:
+            session.add(User(id=1, email="1@example.com", hashed_password="x"))
+            session.commit()
+
+        replacements = (
+            (travel, "route_manager", manager),
+            (travel, "trip_engine", TripSessionEngine(SessionTimeouts())),
+            (travel, "ping_filter", PingFilter(PingFilterConfig())),
+            (travel, "location_context_cache", LocationContextCache(travel.build_location_context)),
+            (travel, "map_matcher", MapMatcher(manager, travel.DEGREES_TO_METERS, on_matched=travel.reassign_trip_mode)),
+            (db, "engine", engine),
+        )
+        for module, name, value in replacements:
+            self.addCleanup(setattr, module, name, getattr(module, name))
+            setattr(module, name, value)
+        self.addCleanup(self.wait_for_matching)
+        self.engine = engine
+        self.start = datetime(2024, 5, 1, 8, 0)
+
+    def wait_for_matching(self):
+        """Let map matching queued by closed trips finish, it shares the test database"""
+        if travel.map_matcher._pool is not None:
+            travel.map_matcher._pool.shutdown(wait=True)
+            travel.map_matcher._pool = None
+
+    def ping(self, lat, lon, seconds, speed=None):
+        return travel.gpsinput(1, lat, lon, self.start + timedelta(seconds=seconds), accuracy=10, speed=speed)
+
+class TestGpsInputResult(GpsInputTestCase):
+
+    def test_speed_kmh_reported(self):
+        self.assertEqual(self.ping(52.52, 13.41, 0, speed=10)["speed_kmh"], 36.0)
+        self.assertEqual(self.ping(52.53, 13.41, 60)["speed_kmh"], 0.0)
+
+class TestGpsInputPingHints(GpsInputTestCase):
+
+    def test_idle_hint_follows_corridor_distance(self):
+        # The route runs along latitude 52.52, 0.001 degrees of latitude are ~111 m
+        hints = travel.ping_interval_config
+        for lat, reason, seconds in ((52.5215, "near_corridor", hints.idle_near_seconds),
+                                     (52.5235, "approaching_corridor", hints.idle_mid_seconds),
+                                     (52.5265, "far_from_corridor", hints.idle_far_seconds),
+                                     (52.535, "no_corridor_nearby", hints.idle_outside_seconds)):
+            travel.ping_filter.forget(1)
+            result = self.ping(lat, 13.41, 0)
+            self.assertEqual(result["session_state"], "idle")
+            self.assertEqual((result["ping_hint_reason"], result["next_ping_seconds"]), (reason, seconds))
+
+class TestGpsInputWorkers(GpsInputTestCase):
+    """Two workers with their own in-memory state taking turns on one user's pings"""
+
+    def setUp(self):
+        super().setUp()
+        self.workers = [(TripSessionEngine(SessionTimeouts()), PingFilter(PingFilterConfig())) for _ in range(2)]
+
+    def ping_on(self, worker, seconds, on_route=True):
+        travel.trip_engine, travel.ping_filter = self.workers[worker]
+        lat = 52.52 if on_route else 52.53
+        return self.ping(lat, 13.40 + seconds / 100000, seconds)
+
+    def trips(self):
+        with Session(self.engine) as session:
+            return session.exec(select(TravelHistory).options(undefer(TravelHistory.listLongitude))
+                                 .order_by(TravelHistory.id)).all()
+
+    def test_worker_picks_up_points_written_elsewhere(self):
+        self.addCleanup(setattr, travel, "CHECKPOINT_POINTS", travel.CHECKPOINT_POINTS)
+        travel.CHECKPOINT_POINTS = 1
+        for seconds in range(0, 300, 60):
+            first = self.ping_on(0, seconds)
+        second = self.ping_on(1, 300)
+        self.assertEqual((second["session_type"], second["travel_id"]), ("continuing", first["travel_id"]))
+        third = self.ping_on(0, 360)
+        self.assertEqual(third["travel_id"], first["travel_id"])
+        [trip] = self.trips()
+        self.assertEqual(trip.duration, 360)
+        self.assertEqual(trip.point_count, 7)
+        self.assertEqual(trip.listLongitude[-2:], [13.403, 13.4036])
+
+    def test_trip_closed_elsewhere_is_not_revived(self):
+        for seconds in range(0, 300, 60):
+            self.ping_on(1, seconds)
+        for seconds in range(300, 420, 60):
+            opened = self.ping_on(0, seconds)
+        self.ping_on(0, 420, on_route=False)
+        closed = self.ping_on(0, 800, on_route=False)
+        self.assertEqual(closed["session_type"], "ended")
+        self.wait_for_matching()
+
+        # Worker 1 still holds the trip as riding
+        result = self.ping_on(1, 860)
+        self.assertEqual(result["session_type"], "new")
+        self.assertNotEqual(result["travel_id"], opened["travel_id"])
+        old, new = self.trips()
+        self.assertTrue(old.ended)
+        self.assertEqual(old.duration, 360)
+        self.assertFalse(new.ended)
+        with Session(self.engine) as session:
+            self.assertEqual(sum(session.exec(select(UserDailyTravel.trips)).all()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
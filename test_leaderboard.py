@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory ranked leaderboards (misc/leaderboard.py)
+"""
+
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from misc import leaderboard
+from misc.leaderboard import RankedBoard
+from misc.models import User
+from travel.dailyRollup import add_to_rollup
+
+class TestRankedBoard(unittest.TestCase):
+
+    def setUp(self):
+        self.board = RankedBoard({1: 50, 2: 80, 3: 50, 4: 10})
+
+    def test_order_and_ties(self):
+        self.assertEqual(self.board.page(0, 10), [(1, 2, 80), (2, 1, 50), (3, 3, 50), (4, 4, 10)])
+        self.assertEqual(self.board.page(2, 1), [(3, 3, 50)])
+        self.assertEqual(self.board.page(10, 5), [])
+
+    def test_updates_move_rank(self):
+        self.board.add(4, 100)
+        self.board.set(2, 0)
+        self.board.add(5, 20)
+        self.assertEqual(self.board.rank(4), 1)
+        self.assertEqual(self.board.rank(2), 5)
+        self.assertEqual(self.board.rank(5), 4)
+        self.board.remove(2)
+        self.assertIsNone(self.board.rank(2))
+        self.assertEqual(len(self.board), 4)
+
+    def test_around(self):
+        self.assertEqual([user_id for _, user_id, _ in self.board.around(1, 1)], [2, 1, 3])
+        self.assertEqual([user_id for _, user_id, _ in self.board.around(2, 1)], [2, 1])
+        self.assertEqual(self.board.around(99, 1), [])
+
+class TestLeaderboardLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.saved = dict(leaderboard.boards)
+
+    def tearDown(self):
+        leaderboard.boards.update(self.saved)
+        self.session.close()
+        self.engine.dispose()
+
+    def test_load_and_record_hours(self):
+        today = datetime.utcnow().date()
+        for user_id, points, xp in ((1, 10, 300), (2, 40, 100)):
+            self.session.add(User(id=user_id, email=f"{user_id}@example.com", hashed_password="x", points=points, xp=xp))
+        add_to_rollup(self.session, 1, today - timedelta(days=10), "bus", 1, 7200, 10.0)
+        add_to_rollup(self.session, 2, today, "train", 1, 3600, 10.0)
+        self.session.commit()
+
+        leaderboard.load(self.session)
+        self.assertEqual(leaderboard.boards["points"].rank(2), 1)
+        self.assertEqual(leaderboard.boards["xp"].rank(2), 2)
+        self.assertEqual(leaderboard.boards["hours"].page(0, 2), [(1, 1, 2.0), (2, 2, 1.0)])
+        self.assertIsNone(leaderboard.boards["hours_weekly"].rank(1))
+
+        leaderboard.record_hours(1, today, 3600)
+        self.assertEqual(leaderboard.boards["hours"].score(1), 3.0)
+        self.assertEqual(leaderboard.boards["hours_daily"].page(0, 2), [(1, 1, 1.0), (2, 2, 1.0)])
+        leaderboard.record_hours(2, today - timedelta(days=20), 3600)
+        self.assertEqual(leaderboard.boards["hours_weekly"].score(2), 1.0)
+        self.assertEqual(leaderboard.boards["hours_monthly"].score(2), 2.0)
+
+    def test_stale_boards_served_while_reloading(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_load(session=None):
+            started.set()
+            release.wait(5)
+
+        saved = (leaderboard.load, leaderboard._loaded_at)
+        self.addCleanup(lambda: (setattr(leaderboard, "load", saved[0]), setattr(leaderboard, "_loaded_at", saved[1])))
+        self.addCleanup(release.set)
+        leaderboard.load = slow_load
+        leaderboard._loaded_at = time.monotonic() - leaderboard.REFRESH_SECONDS - 1
+        leaderboard.boards["points"] = RankedBoard({1: 5})
+
+        begun = time.time()
+        self.assertEqual(leaderboard.get_page("points", 0, 10), ([(1, 1, 5)], 1))
+        self.assertEqual(leaderboard.get_page("points", 0, 10), ([(1, 1, 5)], 1))
+        self.assertLess(time.time() - begun, 0.5)
+        self.assertTrue(started.wait(1))
+        release.set()
+        deadline = time.time() + 5
+        while leaderboard._reloading and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(leaderboard._reloading)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,13 +4,14 @@ Test script for manual ride logging API endpoints.
 Tests the new /rides/manual endpoints for creating, reading, updating, and deleting manual rides.
 """
 
+import os
 import requests
 import json
 import time
 from datetime import datetime
 
 # Configuration
-BASE_URL = "http://localhost:8001"
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8001")
 TEST_EMAIL = "test@example.com"
 TEST_PASSWORD = "password123"
 
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline HMM map-matcher (travel/mapMatching.py)
+"""
+
+import unittest
+from shapely.geometry import LineString
+
+from travel.mapMatching import MapMatcher, MapMatchingConfig
+
+DEGREES_TO_METERS = 111139
+
+class FakeRouteManager:
+    """Two parallel east-west routes ~220 m apart, the second one meets the first at lon 13.41"""
+
+    def __init__(self):
+        self.lines = [
+            LineString([(52.5200, 13.400), (52.5200, 13.410)]),
+            LineString([(52.5200, 13.410), (52.5200, 13.420)]),
+        ]
+        self.info = [
+            {"route_id": "bus_100", "transport_type": "bus"},
+            {"route_id": "tram_m10", "transport_type": "tram"},
+        ]
+
+    def get_route_candidates(self, lat, lon, radius_meters=1000):
+        from shapely.geometry import Point
+        area = Point(lat, lon).buffer(radius_meters / DEGREES_TO_METERS)
+        return [(i, line) for i, line in enumerate(self.lines) if line.intersects(area)]
+
+    def get_route_info(self, route_idx):
+        return self.info[route_idx]
+
+class TestMapMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = MapMatcher(FakeRouteManager(), DEGREES_TO_METERS, config=MapMatchingConfig())
+
+    def test_single_route(self):
+        lons = [13.401, 13.403, 13.405, 13.407]
+        result = self.matcher.match([52.52001] * 4, lons)
+        self.assertEqual(result["route_ids"], ["bus_100"])
+        self.assertEqual(result["primary_transport_type"], "bus")
+        self.assertEqual(result["matched_ratio"], 1.0)
+
+    def test_route_change_creates_legs(self):
+        lons = [13.401, 13.403, 13.405, 13.407, 13.413, 13.415, 13.417, 13.419]
+        result = self.matcher.match([52.52001] * len(lons), lons)
+        self.assertEqual(result["route_ids"], ["bus_100", "tram_m10"])
+        self.assertEqual([leg["transport_type"] for leg in result["legs"]], ["bus", "tram"])
+
+    def test_gap_is_unmatched(self):
+        lats = [52.52001, 52.52001, 52.53, 52.53, 52.53]
+        lons = [13.401, 13.403, 13.405, 13.406, 13.407]
+        result = self.matcher.match(lats, lons)
+        self.assertEqual(result["legs"][-1]["route_id"], None)
+        self.assertEqual(result["matched_ratio"], 0.4)
+
+    def test_subsampling_keeps_endpoints(self):
+        matcher = MapMatcher(FakeRouteManager(), DEGREES_TO_METERS, config=MapMatchingConfig(max_points=10))
+        lons = [13.401 + i * 0.00001 for i in range(100)]
+        lats, sampled = matcher._subsample([52.52] * 100, lons)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], lons[0])
+        self.assertEqual(sampled[-1], lons[-1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the versioned schema migrations (misc/migrations.py)
+"""
+
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from misc import migrations
+from misc.models import GlobalCounter, TravelHistory, User
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'app.db')}")
+        SQLModel.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_fresh_database_applies_everything_once(self):
+        versions = [version for version, _, _ in migrations.MIGRATIONS]
+        self.assertEqual(migrations.migrate(self.engine), versions)
+        self.assertEqual(migrations.migrate(self.engine), [])
+        self.assertEqual(migrations.current_version(self.engine), versions[-1])
+
+        indexes = {ix["name"] for ix in inspect(self.engine).get_indexes("travelhistory")}
+        self.assertIn("ix_travelhistory_user_timestamp_id", indexes)
+        self.assertNotIn("ix_travelhistory_user_timestamp", indexes)
+        indexes = {ix["name"] for ix in inspect(self.engine).get_indexes("userhours")}
+        self.assertTrue({"ix_userhours_user", "ix_userhours_total"} <= indexes)
+
+    def test_point_count_added_to_old_databases(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE travelhistory DROP COLUMN point_count"))
+            conn.execute(text(
+                "INSERT INTO travelhistory (user_id, timestamp, startLatitude, listLatitude, startLongitude, "
+                "listLongitude, distance, duration, created_at) VALUES "
+                "(1, '2024-05-01 08:00:00', 52.5, '[52.5, 52.6, 52.7]', 13.4, '[13.4, 13.5, 13.6]', 2.0, 600, '2024-05-01 08:00:00')"
+            ))
+        migrations.migrate(self.engine)
+        with Session(self.engine) as session:
+            self.assertEqual(session.exec(select(TravelHistory.point_count)).one(), 3)
+
+    def test_ended_backfilled_from_rollup(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE travelhistory DROP COLUMN ended"))
+            for travel_id in (1, 2):
+                conn.execute(text(
+                    "INSERT INTO travelhistory (id, user_id, timestamp, startLatitude, startLongitude, point_count, "
+                    "distance, duration, created_at) VALUES "
+                    f"({travel_id}, 1, '2024-05-01 08:00:00', 52.5, 13.4, 0, 2.0, 600, '2024-05-01 08:00:00')"
+                ))
+            conn.execute(text(
+                "INSERT INTO userdailytravel (user_id, day, mode, trips, seconds, km, last_travel_id) "
+                "VALUES (1, '2024-05-01', 'unknown', 1, 600, 2.0, 1)"
+            ))
+        migrations.migrate(self.engine)
+        with Session(self.engine) as session:
+            self.assertEqual(session.exec(select(TravelHistory.id, TravelHistory.ended).order_by(TravelHistory.id)).all(),
+                             [(1, True), (2, False)])
+
+    def counters(self):
+        with Session(self.engine) as session:
+            return {counter.name: counter.value for counter in session.exec(select(GlobalCounter))}
+
+    def test_counters_seeded_and_kept_by_triggers(self):
+        with Session(self.engine) as session:
+            session.add(User(id=1, email="a@example.com", hashed_password="x", points=30))
+            session.commit()
+        migrations.migrate(self.engine)
+        self.assertEqual(self.counters(), {"users_count": 1, "points_total": 30})
+
+        with Session(self.engine) as session:
+            session.add(User(id=2, email="b@example.com", hashed_password="x", points=5))
+            session.commit()
+        with self.engine.begin() as conn:
+            conn.execute(text('UPDATE "user" SET points = points + 10 WHERE id = 1'))
+        self.assertEqual(self.counters(), {"users_count": 2, "points_total": 45})
+
+        with self.engine.begin() as conn:
+            conn.execute(text('DELETE FROM "user" WHERE id = 2'))
+        self.assertEqual(self.counters(), {"users_count": 1, "points_total": 40})
+
+if __name__ == '__main__':
+    unittest.main()
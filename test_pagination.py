@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset (cursor) pagination (misc/pagination.py)
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from misc.models import ManualRide
+from misc.pagination import decode_cursor, encode_cursor, keyset_page, next_page
+
+class TestKeysetPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        start = datetime(2024, 5, 1, 8, 0)
+        # Pairs of rides share a timestamp so pages have to split ties by id
+        for i in range(7):
+            self.session.add(ManualRide(user_id=1, transport_type="bus", start_location="A", end_location="B",
+                                        duration_minutes=10, date="2024-05-01", time="08:00",
+                                        created_at=start + timedelta(minutes=i // 2)))
+        self.session.add(ManualRide(user_id=2, transport_type="bus", start_location="A", end_location="B",
+                                    duration_minutes=10, date="2024-05-01", time="08:00", created_at=start))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def page(self, cursor, limit):
+        statement = keyset_page(select(ManualRide).where(ManualRide.user_id == 1),
+                                ManualRide.created_at, ManualRide.id, cursor, limit)
+        rides, next_cursor = next_page(self.session.exec(statement).all(), limit,
+                                       lambda ride: ride.created_at, lambda ride: ride.id)
+        return [ride.id for ride in rides], next_cursor
+
+    def test_cursor_round_trip(self):
+        timestamp = datetime(2024, 5, 1, 8, 0, 30, 123456)
+        self.assertEqual(decode_cursor(encode_cursor(timestamp, 42)), (timestamp, 42))
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_pages_cover_every_row_once(self):
+        seen, cursor = [], None
+        while True:
+            ids, cursor = self.page(cursor, 3)
+            seen.extend(ids)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2, 1])
+
+    def test_last_full_page_has_no_cursor(self):
+        ids, cursor = self.page(None, 7)
+        self.assertEqual(len(ids), 7)
+        self.assertIsNone(cursor)
+
+if __name__ == '__main__':
+    unittest.main()
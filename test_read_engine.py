@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the read-only engine used by pure-read endpoints (misc/db.py)
+"""
+
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, select
+
+from misc import db
+from misc.models import User
+
+class TestReadEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmpdir.name, 'app.db')}"
+        self.engine = db.create_db_engine(url)
+        SQLModel.metadata.create_all(self.engine)
+        self.read_engine = db.create_db_engine(db.sqlite_read_only_url(url),
+                                               {**db.SQLITE_PROFILE, "journalMode": None, "synchronous": None})
+
+    def tearDown(self):
+        self.read_engine.dispose()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_read_only_url(self):
+        self.assertEqual(db.sqlite_read_only_url("sqlite+aiosqlite:///./db/app.db"),
+                         "sqlite+aiosqlite:///file:./db/app.db?mode=ro&uri=true")
+        self.assertIsNone(db.sqlite_read_only_url("sqlite://"))
+
+    def test_reads_committed_writes_and_refuses_its_own(self):
+        with Session(self.read_engine) as reader:
+            self.assertEqual(reader.exec(select(User)).all(), [])
+        with Session(self.engine) as writer:
+            writer.add(User(id=123456789, email="a@example.com", hashed_password="x"))
+            writer.commit()
+        with Session(self.read_engine) as reader:
+            self.assertEqual(reader.exec(select(User.id)).all(), [123456789])
+            with self.assertRaises(OperationalError):
+                reader.exec(text("DELETE FROM user"))
+
+    def test_in_memory_urls_skip_queue_pool_options(self):
+        for url in ("sqlite://", "sqlite:///:memory:"):
+            memory_engine = db.create_db_engine(url)
+            with Session(memory_engine) as session:
+                self.assertEqual(session.exec(text("SELECT 1")).one(), (1,))
+            memory_engine.dispose()
+        self.assertEqual(self.engine.pool.size(), db.POOL["size"])
+
+    def test_dependency_closes_its_session(self):
+        saved = db.read_engine
+        self.addCleanup(setattr, db, "read_engine", saved)
+        db.read_engine = self.read_engine
+        dependency = db.get_sync_read_session()
+        session = next(dependency)
+        session.exec(select(User)).all()
+        self.assertEqual(self.read_engine.pool.checkedout(), 1)
+        dependency.close()
+        self.assertEqual(self.read_engine.pool.checkedout(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded route popularity counter (travel/heavyHitters.py),
+the rolling window counters (travel/rollingCounters.py), operator aggregates
+(travel/operatorAggregates.py), the analytics
+event store (travel/analyticsStore.py) and materialized views
+(travel/materializedView.py), plus the merged snapshot cache in RouteAnalytics
+"""
+
+import os
+import tempfile
+import unittest
+import random
+import threading
+import time
+
+from travel.heavyHitters import SpaceSaving
+from travel.rollingCounters import RollingCounter, WindowedCounter
+from travel.analyticsStore import AnalyticsStore
+from travel.materializedView import MaterializedView
+from travel.operatorAggregates import OperatorAggregates
+from travel import RouteAnalytics
+
+class TestSpaceSaving(unittest.TestCase):
+
+    def test_exact_below_capacity(self):
+        sketch = SpaceSaving(capacity=10)
+        for key, count in [("a", 5), ("b", 3), ("c", 1)]:
+            for _ in range(count):
+                sketch.add(key)
+        self.assertEqual(sketch.top(2), [("a", 5), ("b", 3)])
+        self.assertEqual(sketch.error("a"), 0)
+
+    def test_memory_stays_bounded(self):
+        sketch = SpaceSaving(capacity=20)
+        for i in range(5000):
+            sketch.add(f"route_{i}")
+        self.assertEqual(len(sketch), 20)
+        self.assertLessEqual(len(sketch._heap), 4 * 20)
+        self.assertEqual(sketch.total, 5000)
+        self.assertEqual(sum(sketch.counts().values()), 5000)
+
+    def test_heavy_hitters_survive_noise(self):
+        rng = random.Random(7)
+        sketch = SpaceSaving(capacity=50)
+        for i in range(20000):
+            if i % 4 == 0:
+                sketch.add("bus_100")
+            elif i % 10 == 1:
+                sketch.add("tram_m10")
+            else:
+                sketch.add(f"noise_{rng.randint(0, 100000)}")
+        top = [key for key, _ in sketch.top(2)]
+        self.assertEqual(top, ["bus_100", "tram_m10"])
+        count = dict(sketch.top(1))["bus_100"]
+        self.assertGreaterEqual(count, 5000)
+        self.assertLessEqual(count - sketch.error("bus_100"), 5000)
+
+    def test_round_trip(self):
+        sketch = SpaceSaving(capacity=5)
+        for i in range(50):
+            sketch.add(f"route_{i % 7}")
+        restored = SpaceSaving.from_dict(sketch.to_dict())
+        self.assertEqual(restored.top(5), sketch.top(5))
+        self.assertEqual(restored.total, 50)
+        shrunk = SpaceSaving.from_dict(sketch.to_dict(), capacity=2)
+        self.assertEqual(len(shrunk), 2)
+
+class TestRollingCounters(unittest.TestCase):
+
+    NOW = 1_700_000_000.0
+
+    def test_minute_windows(self):
+        counter = WindowedCounter()
+        counter.add("bus_100", timestamp=self.NOW - 30 * 60)
+        counter.add("bus_100", timestamp=self.NOW - 5 * 60)
+        counter.add("tram_m10", 3, timestamp=self.NOW - 60)
+        self.assertEqual(counter.count("bus_100", 10 * 60, now=self.NOW), 1)
+        self.assertEqual(counter.count("bus_100", 60 * 60, now=self.NOW), 2)
+        self.assertEqual(counter.total(10 * 60, now=self.NOW), 4)
+        self.assertEqual(counter.top(60 * 60, now=self.NOW), [("tram_m10", 3), ("bus_100", 2)])
+
+    def test_hour_windows(self):
+        counter = WindowedCounter()
+        counter.add("bus_100", timestamp=self.NOW - 2 * 86400)
+        counter.add("bus_100", timestamp=self.NOW - 3 * 3600)
+        self.assertEqual(counter.count("bus_100", 60 * 60, now=self.NOW), 0)
+        self.assertEqual(counter.count("bus_100", 24 * 3600, now=self.NOW), 1)
+        self.assertEqual(counter.count("bus_100", 7 * 86400, now=self.NOW), 2)
+        self.assertEqual(counter.total(7 * 86400, now=self.NOW + 8 * 86400), 0)
+
+    def test_ring_reuses_expired_slots(self):
+        ring = RollingCounter(slot_seconds=60, slots=60)
+        for minute in range(180):
+            ring.add("bus_100", timestamp=self.NOW + minute * 60)
+        now = self.NOW + 179 * 60
+        self.assertEqual(ring.total(3600, now=now), 60)
+        self.assertEqual(ring.total(600, now=now), 10)
+        # Events older than the ring are dropped instead of corrupting a live slot
+        ring.add("bus_100", timestamp=self.NOW)
+        self.assertEqual(ring.total(3600, now=now), 60)
+
+class TestOperatorAggregates(unittest.TestCase):
+
+    def test_running_totals_and_shares(self):
+        aggregates = OperatorAggregates({"BVG": {"bus": 2}})
+        aggregates.add("BVG", "tram")
+        aggregates.add(None, "bus")
+        summary = aggregates.summary()
+        self.assertEqual(summary["total_routes"], 4)
+        self.assertEqual(summary["operators"][0], {"operator": "BVG", "routes": 3, "types": {"bus": 2, "tram": 1}, "share": 75.0})
+        self.assertEqual(summary["operators"][1]["operator"], "unknown")
+        self.assertEqual(summary["transport_types"], {"bus": 3, "tram": 1})
+        self.assertEqual(summary["type_shares"], {"bus": 75.0, "tram": 25.0})
+
+class TestAnalyticsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "analytics.db")
+        self.store = AnalyticsStore(self.path, flush_interval=3600)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_flush_upserts_counters(self):
+        for _ in range(3):
+            self.store.record_route_usage("bus_100", "bus", "BVG")
+        self.store.record_route_usage("tram_m10", "tram", "BVG")
+        self.assertEqual(self.store.load_route_counts()[1], 0)
+        self.assertEqual(self.store.flush(), 4)
+        self.store.record_route_usage("bus_100", "bus", "BVG")
+        self.store.flush()
+
+        counts, total = self.store.load_route_counts()
+        self.assertEqual(counts, {"bus_100": 4, "tram_m10": 1})
+        self.assertEqual(total, 5)
+        self.assertEqual(self.store.load_operator_counts(), {"BVG": {"bus": 4, "tram": 1}})
+
+    def test_file_created_on_first_flush(self):
+        self.assertFalse(self.store.exists())
+        self.store.record_route_usage("bus_100")
+        self.assertFalse(os.path.exists(self.path))
+        self.store.flush()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_batch_limit_triggers_flush(self):
+        self.store.max_batch = 2
+        self.store.record_route_usage("bus_100")
+        self.store.record_route_usage("bus_100")
+        self.assertEqual(self.store.load_route_counts()[0], {"bus_100": 2})
+
+    def test_compaction_keeps_counters(self):
+        self.store.record_route_usage("bus_100", timestamp=1000.0)
+        self.store.record_route_usage("bus_100")
+        self.store.flush()
+        self.assertEqual(self.store.compact(), 1)
+        self.assertEqual(self.store.load_route_counts()[0], {"bus_100": 2})
+
+    def test_counts_shared_between_connections(self):
+        other = AnalyticsStore(self.path, flush_interval=3600)
+        self.store.record_route_usage("bus_100")
+        other.record_route_usage("bus_100")
+        self.store.flush()
+        other.flush()
+        self.assertEqual(self.store.load_route_counts()[0], {"bus_100": 2})
+        other.close()
+
+    def test_merged_snapshot_includes_other_workers(self):
+        other = AnalyticsStore(self.path, flush_interval=3600)
+        for _ in range(3):
+            other.record_route_usage("bus_100", "bus", "BVG")
+        other.flush()
+        self.store.record_route_usage("tram_m10", "tram", "BVG")
+        self.store.record_route_usage("tram_m10", "tram", "BVG")
+        self.store.record_route_usage("bus_100", "bus", "BVG")
+
+        snapshot = self.store.merged_snapshot(limit=10)
+        self.assertEqual(snapshot["top"], [("bus_100", 4), ("tram_m10", 2)])
+        self.assertEqual(snapshot["total"], 6)
+        self.assertEqual(snapshot["distinct"], 2)
+        self.assertEqual(snapshot["operators"], {"BVG": {"bus": 4, "tram": 2}})
+        self.assertEqual(other.merged_snapshot(limit=10)["total"], 3)
+        other.close()
+
+    def test_operator_counts_by_range(self):
+        day = 86400 * 20000
+        self.store.record_route_usage("bus_100", "bus", "BVG", timestamp=day + 3600)
+        self.store.record_route_usage("bus_100", "bus", "BVG", timestamp=day + 5 * 3600)
+        self.store.record_route_usage("s1", "train", "DB", timestamp=day + 86400 + 60)
+        self.store.flush()
+        self.assertEqual(self.store.load_operator_counts_between(day, day + 86400), {"BVG": {"bus": 2}})
+        self.assertEqual(self.store.load_operator_counts_between(day + 4 * 3600, day + 2 * 86400),
+                         {"BVG": {"bus": 1}, "DB": {"train": 1}})
+        counts, last_id = self.store.load_operator_snapshot()
+        self.assertEqual(counts, {"BVG": {"bus": 2}, "DB": {"train": 1}})
+        self.assertEqual(last_id, 3)
+
+    def test_hourly_counts_seeded_from_event_log(self):
+        self.store.record_route_usage("bus_100", "bus", "BVG", timestamp=7200.0)
+        self.store.flush()
+        with self.store._conn:
+            self.store._conn.execute("DROP TABLE operator_hourly_counts")
+        reopened = AnalyticsStore(self.path, flush_interval=3600)
+        self.assertEqual(reopened.load_operator_counts_between(0, 86400), {"BVG": {"bus": 1}})
+        reopened.close()
+
+    def test_read_events_since(self):
+        self.store.record_route_usage("bus_100", "bus", "BVG", timestamp=1000.0)
+        self.store.record_route_usage("tram_m10", "tram", "BVG")
+        self.store.flush()
+        events = self.store.read_events_since(0, since_ts=2000.0)
+        self.assertEqual([e[2] for e in events], ["tram_m10"])
+        self.assertEqual(self.store.read_events_since(events[-1][0]), [])
+
+class TestMaterializedView(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = AnalyticsStore(os.path.join(self.tmpdir.name, "analytics.db"), flush_interval=3600)
+        self.calls = 0
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def builder(self):
+        self.calls += 1
+        return {"version": self.calls}
+
+    def test_requests_do_not_rebuild(self):
+        view = MaterializedView("dashboard", self.builder, self.store, refresh_interval=3600)
+        first = view.get()
+        for _ in range(100):
+            self.assertIs(view.get(), first)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(first.payload, {"version": 1})
+        view.stop()
+
+    def test_workers_share_snapshot(self):
+        worker_a = MaterializedView("dashboard", self.builder, self.store, refresh_interval=3600)
+        worker_b = MaterializedView("dashboard", self.builder, self.store, refresh_interval=3600)
+        self.assertEqual(worker_a.refresh().etag, worker_b.refresh().etag)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_served_while_revalidating(self):
+        def slow_builder():
+            if self.calls:
+                time.sleep(0.5)
+            return self.builder()
+
+        view = MaterializedView("dashboard", slow_builder, self.store, refresh_interval=0.2)
+        first = view.get()
+        time.sleep(0.3)
+        started = time.time()
+        self.assertIs(view.get(), first)
+        self.assertLess(time.time() - started, 0.1)
+        deadline = time.time() + 5
+        while view.get() is first and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(view.get().payload, {"version": 2})
+        view.stop()
+
+class TestMergedSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.reads = 0
+        outer = self
+
+        class SlowStore:
+            def merged_snapshot(self, limit):
+                outer.reads += 1
+                if outer.reads > 1:
+                    time.sleep(0.5)
+                return {"top": [], "total": outer.reads, "distinct": 0, "operators": {}}
+
+        # Only the snapshot cache is exercised, so skip the file-backed constructor
+        self.analytics = RouteAnalytics.__new__(RouteAnalytics)
+        self.analytics.store = SlowStore()
+        self.analytics.route_usage = SpaceSaving(capacity=10)
+        self.analytics.operator_stats = {}
+        self.analytics._read_cache_seconds = 0.2
+        self.analytics._snapshot = None
+        self.analytics._snapshot_at = 0.0
+        self.analytics._snapshot_lock = threading.Lock()
+        self.analytics._snapshot_refreshing = False
+
+    def test_expired_snapshot_served_while_refreshing(self):
+        self.assertEqual(self.analytics.get_total_usage(), 1)
+        time.sleep(0.3)
+        started = time.time()
+        self.assertEqual(self.analytics.get_total_usage(), 1)
+        self.assertEqual(self.analytics.get_total_usage(), 1)
+        self.assertLess(time.time() - started, 0.1)
+        deadline = time.time() + 5
+        while self.analytics.get_total_usage() == 1 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.analytics.get_total_usage(), 2)
+        self.assertEqual(self.reads, 2)
+
+if __name__ == '__main__':
+    unittest.main()
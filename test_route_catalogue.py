@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the route id -> metadata catalogue built by RouteManager
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import travel
+
+class TestRouteCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        routes = [
+            {"coordinates": [[52.52, 13.40], [52.52, 13.41]],
+             "metadata": {"route_id": "bus_100", "route_name": "Bus 100", "operator": "BVG", "transport_type": "bus"}},
+            {"coordinates": [[52.52, 13.41], [52.52, 13.42]],
+             "metadata": {"route_id": "bus_100", "route_name": "Bus 100", "operator": "BVG", "transport_type": "bus"}},
+            [[52.50, 13.30], [52.51, 13.30]],
+        ]
+        path = os.path.join(self.tmpdir.name, "routes.json")
+        with open(path, "w") as f:
+            json.dump({"routes": routes, "cache_created": time.time()}, f)
+        self.manager = travel.RouteManager()
+        self.manager._cache_file = path
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_segments_merge_by_id(self):
+        details = self.manager.get_route_details("bus_100")
+        self.assertEqual(details["name"], "Bus 100")
+        self.assertEqual(details["operator"], "BVG")
+        self.assertEqual(details["segments"], 2)
+        self.assertAlmostEqual(details["length_km"], 1.354, places=3)
+        self.assertAlmostEqual(details["centroid"][1], 13.41, places=5)
+
+    def test_unnamed_route_uses_hash_id(self):
+        route_id = travel.make_route_id([[52.50, 13.30], [52.51, 13.30]])
+        details = self.manager.get_route_details(route_id)
+        self.assertEqual(details["name"], route_id)
+        self.assertEqual(details["transport_type"], "unknown")
+        self.assertAlmostEqual(details["length_km"], 1.11, places=2)
+        self.assertIsNone(self.manager.get_route_details("missing"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,12 +8,13 @@ with lazy loading and spatial indexing.
 
 import time
 import random
+import os
 import requests
 import json
 from datetime import datetime
 
 # Test configuration
-BASE_URL = "http://localhost:8000"
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 TEST_TOKEN = "your_test_token_here"  # Replace with valid JWT
 
 # Test coordinates around Berlin
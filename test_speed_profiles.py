@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming speed histograms and batched pattern store (travel/speedProfiles.py)
+"""
+
+import os
+import pickle
+import random
+import statistics
+import tempfile
+import unittest
+
+from travel.speedProfiles import SpeedHistogram, PatternStore
+
+class TestSpeedHistogram(unittest.TestCase):
+
+    def test_moments_match_raw_list(self):
+        rng = random.Random(3)
+        speeds = [rng.uniform(10, 60) for _ in range(5000)]
+        histogram = SpeedHistogram()
+        histogram.add_many(speeds)
+        self.assertEqual(histogram.count, 5000)
+        self.assertAlmostEqual(histogram.mean(), statistics.mean(speeds), places=6)
+        self.assertAlmostEqual(histogram.variance(), statistics.variance(speeds), places=3)
+        self.assertAlmostEqual(histogram.quantile(0.5), statistics.median(speeds), delta=2)
+        self.assertEqual(histogram.min, min(speeds))
+
+    def test_size_is_fixed(self):
+        histogram = SpeedHistogram(bin_width=2, max_speed=200)
+        size = len(histogram.to_bytes())
+        histogram.add_many(range(100000))
+        self.assertEqual(len(histogram.to_bytes()), size)
+        self.assertEqual(histogram.bins[-1], 100000 - 198)
+
+    def test_round_trip_and_legacy_pickle(self):
+        histogram = SpeedHistogram()
+        histogram.add_many([12.5, 20.0, 33.3])
+        restored = SpeedHistogram.from_blob(histogram.to_bytes())
+        self.assertEqual(list(restored.bins), list(histogram.bins))
+        self.assertEqual((restored.count, restored.max), (3, 33.3))
+
+        legacy = SpeedHistogram.from_blob(pickle.dumps([12.5, 20.0, 33.3]))
+        self.assertEqual(list(legacy.bins), list(histogram.bins))
+
+    def test_density_prefers_matching_distribution(self):
+        bus, train = SpeedHistogram(), SpeedHistogram()
+        bus.add_many([18, 20, 22, 19, 21] * 10)
+        train.add_many([70, 80, 90, 75, 85] * 10)
+        self.assertGreater(bus.density(20), train.density(20))
+        self.assertGreater(train.density(80), bus.density(80))
+        self.assertGreater(bus.density(150), 0)
+
+class TestPatternStore(unittest.TestCase):
+
+    def test_batched_flush(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = PatternStore(os.path.join(tmpdir, "patterns.db"), flush_interval=3600)
+            histogram = SpeedHistogram()
+            for speed in (10, 20, 30):
+                histogram.add(speed)
+                store.mark_dirty("bus", lambda: (histogram.to_bytes(), 0.5, "", 0.1, histogram.count))
+            self.assertEqual(store.load(), [])
+            self.assertEqual(store.flush(), 1)
+            rows = store.load()
+            self.assertEqual(rows[0][0], "bus")
+            self.assertEqual(SpeedHistogram.from_blob(rows[0][1]).count, 3)
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
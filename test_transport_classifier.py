@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch trip transport classifier (travel/transportClassifier.py)
+"""
+
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+
+from travel.transportClassifier import (
+    FEATURE_NAMES, TransportClassifier, build_feature_matrix, trip_features,
+)
+
+def synthetic_trip(rng, transport_type, matched=True):
+    """Straight eastward trip; trains are fast with few stops, buses slow with many"""
+    step_km, stops, pace_kmh = {"bus": (0.2, 6, 20), "train": (1.0, 1, 80)}[transport_type]
+    n = 30
+    steps = np.full(n - 1, step_km * rng.uniform(0.8, 1.2))
+    steps[rng.sample(range(n - 1), stops)] = 0.0
+    lons = 13.4 + np.concatenate([[0.0], np.cumsum(steps)]) / 68.0
+    distance = float(steps.sum())
+    return {
+        "lats": [52.52] * n,
+        "lons": lons.tolist(),
+        "duration": distance / (pace_kmh * rng.uniform(0.8, 1.2)) * 3600,
+        "matched_type": transport_type if matched else None,
+        "matched_ratio": 1.0 if matched else 0.0,
+    }
+
+class TestTripFeatures(unittest.TestCase):
+
+    def test_feature_row(self):
+        row = trip_features([52.52, 52.52, 52.52], [13.40, 13.40, 13.41], 60, matched_type="tram", matched_ratio=0.5)
+        self.assertEqual(len(row), len(FEATURE_NAMES))
+        features = dict(zip(FEATURE_NAMES, row))
+        self.assertAlmostEqual(features["distance_km"], 0.68, places=2)
+        self.assertEqual(features["dwell_fraction"], 0.5)
+        self.assertEqual(features["matched_tram"], 0.5)
+
+    def test_degenerate_trips(self):
+        matrix = build_feature_matrix([{"lats": [], "lons": [], "duration": 0}, {"lats": [52.5], "lons": [13.4], "duration": 60}])
+        self.assertEqual(matrix.shape, (2, len(FEATURE_NAMES)))
+        self.assertTrue(np.isfinite(matrix).all())
+
+class TestTransportClassifier(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.trips = [synthetic_trip(rng, t) for t in ["bus", "train"] * 100]
+
+    def test_predict_many_batch(self):
+        labels = [t["matched_type"] for t in self.trips]
+        classifier = TransportClassifier().fit(build_feature_matrix(self.trips), labels)
+        self.assertGreater(classifier.accuracy(build_feature_matrix(self.trips), labels), 0.95)
+
+        rng = random.Random(2)
+        unmatched = [synthetic_trip(rng, t, matched=False) for t in ["bus", "train"] * 500]
+        predicted, confidences = classifier.predict_many(build_feature_matrix(unmatched))
+        self.assertEqual(len(predicted), 1000)
+        self.assertGreater(np.mean([p == t for p, t in zip(predicted, ["bus", "train"] * 500)]), 0.9)
+        self.assertTrue(((confidences > 0.5) & (confidences <= 1.0)).all())
+
+    def test_untrained_and_round_trip(self):
+        features = build_feature_matrix(self.trips[:3])
+        self.assertEqual(TransportClassifier().predict_many(features)[0], ["unknown"] * 3)
+
+        classifier = TransportClassifier().fit(build_feature_matrix(self.trips), [t["matched_type"] for t in self.trips], epochs=50)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "model.npz")
+            classifier.save(path)
+            restored = TransportClassifier.load(path)
+        np.testing.assert_allclose(restored.predict_proba(features), classifier.predict_proba(features))
+        self.assertEqual(restored.classes, ["bus", "train"])
+
+if __name__ == '__main__':
+    unittest.main()
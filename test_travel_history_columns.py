@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the deferred TravelHistory coordinate columns and the stored point count
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import undefer
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import travel
+from misc.models import TravelHistory
+from travel.sessionEngine import TripSessionEngine
+
+class TestTravelHistoryColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(self.engine)
+        with Session(self.engine) as session:
+            session.add(TravelHistory(user_id=1, startLatitude=52.5, startLongitude=13.4,
+                                      listLatitude=[52.5] * 500, listLongitude=[13.4] * 500,
+                                      point_count=500, distance=3.0, duration=600))
+            session.commit()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_coordinates_deferred_by_default(self):
+        with Session(self.engine) as session:
+            trip = session.exec(select(TravelHistory)).one()
+            self.assertIn("listLatitude", inspect(trip).unloaded)
+            self.assertEqual(trip.point_count, 500)
+            trip = session.exec(
+                select(TravelHistory).options(undefer(TravelHistory.listLatitude)).execution_options(populate_existing=True)
+            ).one()
+            self.assertNotIn("listLatitude", inspect(trip).unloaded)
+            self.assertEqual(len(trip.listLatitude), 500)
+
+    def test_continuing_pings_write_coordinates_at_checkpoints(self):
+        saved = travel.trip_engine
+        self.addCleanup(setattr, travel, "trip_engine", saved)
+        travel.trip_engine = TripSessionEngine()
+        start = datetime(2024, 5, 1, 8, 0)
+        with Session(self.engine) as session:
+            for i in range(travel.CHECKPOINT_POINTS + 5):
+                transition = travel.trip_engine.process_ping(7, True, 52.5 + i / 1e3, 13.4, start + timedelta(seconds=10 * i))
+                travel._persist_transition(session, 7, transition)
+                trip = session.exec(select(TravelHistory).where(TravelHistory.user_id == 7).options(
+                    undefer(TravelHistory.listLatitude)).execution_options(populate_existing=True)).one()
+                self.assertEqual(trip.point_count, i + 1)
+                # The stored list only moves at the start and at each checkpoint
+                self.assertEqual(len(trip.listLatitude), 1 if i < travel.CHECKPOINT_POINTS else travel.CHECKPOINT_POINTS + 1)
+
+if __name__ == '__main__':
+    unittest.main()
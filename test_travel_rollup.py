@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-user daily travel rollup (travel/dailyRollup.py)
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import travel
+from misc import leaderboard
+from misc.models import TravelHistory, TravelMatch, User, UserDailyTravel
+from travel.sessionEngine import TripSessionEngine, SessionTimeouts, IDLE
+from travel.dailyRollup import (
+    add_to_rollup, rollup_closed_trip, reassign_trip_mode, stats_statements, rebuild_rollups,
+    hours_statement, summarize_hours, hours_leaderboard_statement
+)
+
+class TestDailyRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.day = datetime(2024, 5, 1, 8, 0)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def add_trip(self, started_at, duration, distance, user_id=1, ended=False):
+        trip = TravelHistory(user_id=user_id, timestamp=started_at, startLatitude=52.5, startLongitude=13.4,
+                             listLatitude=[52.5], listLongitude=[13.4], distance=distance, duration=duration,
+                             ended=ended)
+        self.session.add(trip)
+        self.session.commit()
+        self.session.refresh(trip)
+        return trip
+
+    def close_trip(self, trip):
+        rollup_closed_trip(self.session, trip.user_id, trip.id, trip.timestamp, trip.duration, trip.distance)
+        self.session.commit()
+
+    def stats(self, start=None, user_id=1):
+        rollup_statement, recent_statement = stats_statements(user_id, start)
+        trips, seconds, km = self.session.exec(rollup_statement).one()
+        recent = self.session.exec(recent_statement).all()
+        return trips + len(recent), seconds + sum(d for d, _ in recent), km + sum(k for _, k in recent)
+
+    def test_upsert_accumulates(self):
+        add_to_rollup(self.session, 1, self.day.date(), "bus", 1, 600, 5.0, travel_id=3)
+        add_to_rollup(self.session, 1, self.day.date(), "bus", 1, 300, 2.0, travel_id=2)
+        self.session.commit()
+        row = self.session.exec(select(UserDailyTravel)).one()
+        self.assertEqual((row.trips, row.seconds, row.km, row.last_travel_id), (2, 900, 7.0, 3))
+
+    def test_stats_combine_rollup_and_open_trips(self):
+        first = self.add_trip(self.day, 600, 5.0)
+        self.close_trip(first)
+        self.add_trip(self.day - timedelta(days=3), 900, 8.0)  # older, not rolled up
+        self.close_trip(self.add_trip(self.day + timedelta(hours=1), 60, 0.5))  # too short to count
+        self.add_trip(self.day + timedelta(hours=2), 300, 1.5)  # still open
+
+        self.assertEqual(self.session.exec(select(UserDailyTravel)).one().trips, 1)
+        self.assertEqual(self.stats(self.day.replace(hour=0)), (2, 900, 6.5))
+        self.assertEqual(self.stats(), (3, 1800, 14.5))
+        self.assertEqual(self.stats(user_id=2), (0, 0, 0))
+
+    def test_reassign_moves_trip_between_modes(self):
+        trip = self.add_trip(self.day, 600, 5.0)
+        self.close_trip(trip)
+        reassign_trip_mode(self.session, trip, None, "train")
+        self.session.commit()
+        rows = {row.mode: row.trips for row in self.session.exec(select(UserDailyTravel))}
+        self.assertEqual(rows, {"unknown": 0, "train": 1})
+        self.assertEqual(self.stats(), (1, 600, 5.0))
+
+    def test_rebuild_matches_incremental(self):
+        bus = self.add_trip(self.day, 600, 5.0, ended=True)
+        self.session.add(TravelMatch(travel_id=bus.id, user_id=1, primary_transport_type="bus"))
+        self.add_trip(self.day + timedelta(hours=3), 1200, 12.0, ended=True)
+        self.add_trip(self.day, 900, 3.0, user_id=2, ended=True)
+        # Closed a minute ago: counted although it ended well inside the stale timeout
+        just_closed = self.add_trip(datetime.utcnow() - timedelta(minutes=6), 300, 2.0, ended=True)
+        open_trip = self.add_trip(datetime.utcnow() - timedelta(minutes=1), 240, 1.0)
+
+        self.assertEqual(rebuild_rollups(self.session), 4)
+        rows = {(row.user_id, row.day, row.mode): row for row in self.session.exec(select(UserDailyTravel))}
+        self.assertEqual(rows[(1, self.day.date(), "bus")].trips, 1)
+        self.assertEqual(rows[(1, self.day.date(), "unknown")].km, 12.0)
+        self.assertEqual(max(row.last_travel_id for row in rows.values() if row.user_id == 1), just_closed.id)
+        self.assertEqual(self.stats(), (4, 2340, 20.0))
+
+        self.assertEqual(rebuild_rollups(self.session, user_ids=[2]), 1)
+        self.assertEqual(self.stats(user_id=2), (1, 900, 3.0))
+
+    def test_hours_roll_over_by_bucket(self):
+        today = self.day.date()
+        add_to_rollup(self.session, 1, today, "bus", 1, 3600, 10.0)
+        add_to_rollup(self.session, 1, today - timedelta(days=3), "tram", 1, 7200, 20.0)
+        add_to_rollup(self.session, 1, today - timedelta(days=20), "unknown", 1, 1800, 5.0)
+        add_to_rollup(self.session, 2, today, "train", 1, 5400, 30.0)
+        self.session.commit()
+
+        starts = {"daily": today, "weekly": today - timedelta(days=7), "monthly": today - timedelta(days=30)}
+        hours = summarize_hours(self.session.exec(hours_statement(1, starts)).all())
+        self.assertEqual(hours["total"], {"total": 3.5, "daily": 1.0, "weekly": 3.0, "monthly": 3.5})
+        self.assertEqual(hours["train"]["weekly"], 2.0)
+        self.assertEqual(hours["ferry"]["total"], 0.0)
+
+        # Eight days later the same buckets give the new period values, no reset needed
+        starts = {period: start + timedelta(days=8) for period, start in starts.items()}
+        hours = summarize_hours(self.session.exec(hours_statement(1, starts)).all())
+        self.assertEqual((hours["total"]["daily"], hours["total"]["weekly"]), (0.0, 0.0))
+
+        ranked = self.session.exec(hours_leaderboard_statement(today)).all()
+        self.assertEqual([(user_id, seconds) for user_id, seconds in ranked], [(2, 5400), (1, 3600)])
+        self.assertEqual(self.session.exec(hours_leaderboard_statement(limit=1)).all()[0][0], 1)
+
+    def test_closed_trip_is_not_revived_or_counted_twice(self):
+        self.session.add(User(id=1, email="a@example.com", hashed_password="x"))
+        self.session.commit()
+        timeouts = SessionTimeouts(confirm_seconds=120, ending_grace_seconds=300, stale_seconds=900)
+        saved_engine, saved_hours = travel.trip_engine, leaderboard.boards["hours"]
+        self.addCleanup(setattr, travel, "trip_engine", saved_engine)
+        self.addCleanup(leaderboard.boards.__setitem__, "hours", saved_hours)
+        leaderboard.boards["hours"] = leaderboard.RankedBoard()
+
+        travel.trip_engine = TripSessionEngine(timeouts)
+        for seconds in range(0, 660, 60):
+            transition = travel.trip_engine.process_ping(1, True, 52.5 + seconds / 1e4, 13.4, self.day + timedelta(seconds=seconds))
+            travel._persist_transition(self.session, 1, transition)
+        for seconds in (660, 1000):  # off the route, then past the ending grace
+            transition = travel.trip_engine.process_ping(1, False, 52.6, 13.4, self.day + timedelta(seconds=seconds))
+            travel._persist_transition(self.session, 1, transition)
+        self.assertTrue(transition.closed_valid)
+        closed = transition.closed_trip
+        row = self.session.exec(select(UserDailyTravel)).one()
+        before = (row.trips, row.seconds, row.km, leaderboard.boards["hours"].score(1))
+
+        # A fresh worker inside the stale window must not pick the closed trip up again
+        travel.trip_engine = TripSessionEngine(timeouts)
+        travel._hydrate_trip_state(self.session, 1, self.day + timedelta(seconds=1100))
+        self.assertEqual(travel.trip_engine.get_state(1).state, IDLE)
+        travel._persist_transition(self.session, 1, travel.trip_engine.touch(1, None, self.day + timedelta(seconds=2000)))
+        self.assertFalse(rollup_closed_trip(self.session, 1, closed.travel_id, closed.started_at,
+                                            closed.duration_seconds, closed.distance_km))
+        self.session.commit()
+
+        self.session.expire_all()
+        row = self.session.exec(select(UserDailyTravel)).one()
+        self.assertEqual((row.trips, row.seconds, row.km, leaderboard.boards["hours"].score(1)), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tests for the trip session state machine (travel/sessionEngine.py) and the
+ping pre-filter (travel/pingFilter.py), plus the ping interval hints
+(travel/pingHints.py) and the location context cache (travel/locationContext.py)
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from travel.sessionEngine import (
+    TripSessionEngine, SessionTimeouts, TripState,
+    IDLE, CANDIDATE, RIDING, ENDING,
+)
+from travel.pingFilter import (
+    PingFilter, PingFilterConfig,
+    ACCEPT, LOW_ACCURACY, DUPLICATE, STATIONARY, OUTSIDE_SERVICE_AREA,
+)
+from travel.pingHints import PingIntervalConfig, recommend_ping_interval
+from travel.locationContext import LocationContext, LocationContextCache
+
+START = datetime(2025, 1, 1, 8, 0, 0)
+
+def at(seconds):
+    return START + timedelta(seconds=seconds)
+
+class TestTripSessionEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = TripSessionEngine(SessionTimeouts(confirm_seconds=120, ending_grace_seconds=300, stale_seconds=900))
+
+    def ping(self, seconds, on_route=True, lat=52.52, lon=13.405):
+        return self.engine.process_ping(1, on_route, lat, lon, at(seconds))
+
+    def test_off_route_ping_stays_idle(self):
+        transition = self.ping(0, on_route=False)
+        self.assertEqual(transition.session_type, "none")
+        self.assertEqual(transition.state, IDLE)
+
+    def test_candidate_confirms_into_riding(self):
+        self.assertEqual(self.ping(0).state, CANDIDATE)
+        self.assertEqual(self.ping(60, lat=52.53).state, CANDIDATE)
+        transition = self.ping(130, lat=52.54)
+        self.assertEqual(transition.session_type, "continuing")
+        self.assertEqual(transition.state, RIDING)
+        self.assertAlmostEqual(transition.trip.distance_km, 2.22, places=1)
+
+    def test_short_candidate_is_invalid(self):
+        self.ping(0)
+        transition = self.ping(30, on_route=False)
+        self.assertEqual(transition.session_type, "invalid")
+        self.assertFalse(transition.closed_valid)
+        self.assertEqual(self.engine.get_state(1).state, IDLE)
+
+    def test_ending_grace_resumes_ride(self):
+        self.ping(0)
+        self.ping(150)
+        self.assertEqual(self.ping(200, on_route=False).state, ENDING)
+        transition = self.ping(260)
+        self.assertEqual(transition.state, RIDING)
+        self.assertIsNone(transition.trip.ending_since)
+
+    def test_ending_grace_expiry_closes_ride(self):
+        self.ping(0)
+        self.ping(150)
+        self.ping(200, on_route=False)
+        transition = self.ping(520, on_route=False)
+        self.assertEqual(transition.session_type, "ended")
+        self.assertTrue(transition.closed_valid)
+        self.assertEqual(transition.closed_trip.duration_seconds, 150)
+
+    def test_stale_gap_closes_before_new_trip(self):
+        self.ping(0)
+        self.ping(150)
+        transition = self.ping(150 + 1000)
+        self.assertEqual(transition.session_type, "new")
+        self.assertTrue(transition.closed_valid)
+        self.assertEqual(transition.closed_trip.duration_seconds, 150)
+        self.assertEqual(transition.trip.latitudes, [52.52])
+
+    def test_hydrated_trip_continues(self):
+        self.engine.hydrate(1, TripState(
+            state=RIDING, travel_id=7, started_at=at(0), last_ping_at=at(200),
+            last_on_route_at=at(200), latitudes=[52.52], longitudes=[13.405]
+        ))
+        transition = self.ping(260)
+        self.assertEqual(transition.session_type, "continuing")
+        self.assertEqual(transition.trip.travel_id, 7)
+        self.assertEqual(transition.trip.duration_seconds, 260)
+
+    def test_touch_extends_ride_without_points(self):
+        self.ping(0)
+        self.ping(150)
+        transition = self.engine.touch(1, True, at(400))
+        self.assertEqual(transition.state, RIDING)
+        self.assertEqual(transition.trip.duration_seconds, 400)
+        self.assertEqual(len(transition.trip.latitudes), 2)
+
+    def test_touch_without_position_expires_grace(self):
+        self.ping(0)
+        self.ping(150)
+        self.ping(200, on_route=False)
+        self.assertEqual(self.engine.touch(1, None, at(300)).state, ENDING)
+        transition = self.engine.touch(1, None, at(520))
+        self.assertEqual(transition.session_type, "ended")
+
+    def test_touch_never_opens_trip(self):
+        self.assertEqual(self.engine.touch(1, True, at(0)).session_type, "none")
+
+    def test_evict_drops_idle_users_and_silent_trips(self):
+        self.ping(0)
+        self.engine.process_ping(2, True, 52.52, 13.405, at(0))
+        self.engine.process_ping(2, True, 52.53, 13.405, at(600))
+        self.engine.process_ping(3, False, 52.52, 13.405, at(600))
+        self.assertEqual(self.engine.evict(at(300)), 2)
+        self.assertFalse(self.engine.has_user(1))
+        self.assertTrue(self.engine.has_user(2))
+        self.assertFalse(self.engine.has_user(3))
+
+class TestPingFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.filter = PingFilter(PingFilterConfig(max_accuracy_meters=100, duplicate_meters=1, min_movement_meters=15))
+        self.filter.record(1, 52.52, 13.405, at(0), True)
+
+    def test_decisions(self):
+        self.assertEqual(self.filter.check(1, 52.53, 13.405, at(10), accuracy=500)[0], LOW_ACCURACY)
+        self.assertEqual(self.filter.check(1, 52.52, 13.405, at(10))[0], DUPLICATE)
+        self.assertEqual(self.filter.check(1, 52.53, 13.405, at(0))[0], DUPLICATE)
+        self.assertEqual(self.filter.check(1, 52.52005, 13.405, at(10))[0], STATIONARY)
+        self.assertEqual(self.filter.check(1, 52.53, 13.405, at(10))[0], ACCEPT)
+
+    def test_service_area(self):
+        area = (52.0, 13.0, 53.0, 14.0)
+        self.assertEqual(self.filter.check(2, 48.1, 11.5, at(0), service_area=area)[0], OUTSIDE_SERVICE_AREA)
+        self.assertEqual(self.filter.check(2, 52.5, 13.5, at(0), service_area=area)[0], ACCEPT)
+
+    def test_evict_forgets_quiet_users(self):
+        self.filter.record(2, 52.52, 13.405, at(600), True)
+        self.assertEqual(self.filter.evict(at(300)), 1)
+        self.assertIsNone(self.filter.check(1, 52.52, 13.405, at(700))[1])
+        self.assertIsNotNone(self.filter.check(2, 52.53, 13.405, at(700))[1])
+
+    def test_stats_count_shed_work(self):
+        self.filter.check(1, 52.52, 13.405, at(10))
+        self.filter.check(1, 52.53, 13.405, at(20))
+        stats = self.filter.get_stats()
+        self.assertEqual(stats["total_pings"], 2)
+        self.assertEqual(stats["skipped_db_round_trips"], 1)
+        self.assertEqual(stats["shed_percentage"], 50.0)
+
+class TestPingIntervalHints(unittest.TestCase):
+
+    def setUp(self):
+        self.config = PingIntervalConfig()
+
+    def hint(self, state, distance=None, speed=None):
+        return recommend_ping_interval(state, distance, speed, self.config)[0]
+
+    def test_active_sessions_ping_often(self):
+        self.assertEqual(self.hint(CANDIDATE, 5), self.config.candidate_seconds)
+        self.assertEqual(self.hint(ENDING, 50), self.config.ending_seconds)
+        self.assertEqual(self.hint(RIDING, 5, speed=25), self.config.riding_fast_seconds)
+
+    def test_idle_interval_grows_with_corridor_distance(self):
+        near = self.hint(IDLE, 50)
+        mid = self.hint(IDLE, 500)
+        far = self.hint(IDLE, 5000)
+        outside = self.hint(IDLE, None)
+        self.assertLess(near, mid)
+        self.assertLess(mid, far)
+        self.assertLess(far, outside)
+        self.assertEqual(self.hint(IDLE, 50, speed=8), self.config.candidate_seconds)
+
+class TestLocationContextCache(unittest.TestCase):
+
+    def setUp(self):
+        self.built = []
+        def builder(lat, lon):
+            self.built.append((lat, lon))
+            return LocationContext(latitude=lat, longitude=lon)
+        self.cache = LocationContextCache(builder, cell_meters=5, max_entries=2)
+
+    def test_same_cell_is_built_once(self):
+        first = self.cache.get(52.52, 13.405, generation=1)
+        second = self.cache.get(52.52001, 13.40501, generation=1)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.built), 1)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_least_recently_used_cell_is_evicted(self):
+        self.cache.get(52.52, 13.405, generation=1)
+        self.cache.get(52.53, 13.405, generation=1)
+        self.cache.get(52.52, 13.405, generation=1)
+        self.cache.get(52.54, 13.405, generation=1)
+        self.cache.get(52.53, 13.405, generation=1)
+        self.assertEqual(len(self.built), 4)
+        self.assertEqual(self.cache.get_stats()["entries"], 2)
+
+    def test_new_route_generation_clears_cache(self):
+        self.cache.get(52.52, 13.405, generation=1)
+        self.cache.get(52.52, 13.405, generation=2)
+        self.assertEqual(len(self.built), 2)
+
+if __name__ == '__main__':
+    unittest.main()
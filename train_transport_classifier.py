@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Transport Classifier Training Script
+Trains the trip transport classifier from stored trips. Labels come from
+map matches that cover most of the trip; the saved model is picked up by the
+API on the next start.
+
+Usage: python train_transport_classifier.py [--min-matched-ratio R] [--limit N] [--holdout F] [--output PATH]
+"""
+
+import os
+import sys
+import random
+import argparse
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from misc import db
+import travel
+from travel.transportClassifier import ROUTE_TYPES, TransportClassifier, build_feature_matrix
+
+def labelled_trips(records, min_matched_ratio):
+    """Trips whose map match is confident enough to use as a label"""
+    return [
+        record for record in records
+        if record["matched_type"] in ROUTE_TYPES and record["matched_ratio"] >= min_matched_ratio
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the trip transport classifier")
+    parser.add_argument("--min-matched-ratio", type=float, default=0.8, help="minimum matched share for a trip to be used as a label")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of trips to load")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of labelled trips kept back for evaluation")
+    parser.add_argument("--output", default=travel.TRANSPORT_MODEL_FILE, help="where to write the model")
+    args = parser.parse_args()
+
+    print("Transport Classifier Training")
+    print("=" * 50)
+
+    db.init_database()
+    trips = labelled_trips(travel.load_trip_records(limit=args.limit), args.min_matched_ratio)
+    print(f"Found {len(trips)} labelled trips: {dict(Counter(t['matched_type'] for t in trips))}")
+
+    if len({t["matched_type"] for t in trips}) < 2:
+        print("✗ Need labelled trips of at least two transport types, run match_trips.py first")
+        return
+
+    random.Random(42).shuffle(trips)
+    split = int(len(trips) * (1 - args.holdout)) if len(trips) > 10 else len(trips)
+    train, test = trips[:split], trips[split:]
+
+    classifier = TransportClassifier().fit(
+        build_feature_matrix(train), [t["matched_type"] for t in train]
+    )
+    print(f"✓ Training accuracy: {classifier.accuracy(build_feature_matrix(train), [t['matched_type'] for t in train]):.1%}")
+    if test:
+        print(f"✓ Holdout accuracy: {classifier.accuracy(build_feature_matrix(test), [t['matched_type'] for t in test]):.1%}")
+
+    classifier.save(args.output)
+    print(f"✓ Saved model to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -14,13 +14,39 @@ import threading
 import hashlib
 import statistics
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pickle
 import sqlite3
+from misc import config, leaderboard
+from .sessionEngine import (
+    TripSessionEngine, SessionTimeouts, TripState, TripTransition,
+    IDLE, CANDIDATE, RIDING, ENDING,
+)
+from .pingFilter import (
+    PingFilter, PingFilterConfig,
+    ACCEPT, OUTSIDE_SERVICE_AREA, SHORT_CIRCUIT,
+)
+from .pingHints import PingIntervalConfig, recommend_ping_interval
+from .mapMatching import MapMatcher, MapMatchingConfig
+from .locationContext import LocationContext, LocationContextCache
+from .heavyHitters import SpaceSaving
+from .analyticsStore import AnalyticsStore
+from .speedProfiles import SpeedHistogram, PatternStore
+from .transportClassifier import TransportClassifier, build_feature_matrix
+from .rollingCounters import WindowedCounter
+from .materializedView import MaterializedView, ViewSnapshot
+from .operatorAggregates import OperatorAggregates
+from .dailyRollup import (
+    MIN_STATS_TRIP_SECONDS, rollup_closed_trip, reassign_trip_mode,
+    stats_statements, rebuild_rollups, HOURS_PERIODS, hours_statement,
+    summarize_hours, hours_leaderboard_statement
+)
 
 CACHE_FILE = "cached_routes.json"
-ANALYTICS_CACHE_FILE = "route_analytics.pkl"
+ANALYTICS_CACHE_FILE = "route_analytics.pkl"  # legacy, migrated into ANALYTICS_DB_FILE on startup
+ANALYTICS_DB_FILE = "route_analytics.db"
 TRANSPORT_PATTERNS_FILE = "transport_patterns.db"
+TRANSPORT_MODEL_FILE = "transport_classifier.npz"
 
 @dataclass
 class RouteMetadata:
@@ -39,7 +65,7 @@ class RouteMetadata:
 @dataclass
 class TransportTypePattern:
     """Pattern data for transport type detection"""
-    speed_profile: List[float] = field(default_factory=list)
+    speed_profile: SpeedHistogram = field(default_factory=SpeedHistogram)
     stop_frequency: float = 0.0
     route_geometry: str = ""
     confidence: float = 0.0
@@ -512,15 +538,52 @@ def update_route_cache(force_update=False):
     print(f"Route cache updated with {len(routes)} routes")
     return len(routes)
 
+def _split_route_entry(route):
+    """Routes are plain coordinate lists, or dicts with coordinates and metadata (OSM)."""
+    if isinstance(route, dict):
+        return route.get("coordinates", []), route.get("metadata")
+    return route, None
+
+def _metadata_value(metadata, key, default):
+    if metadata is None:
+        return default
+    if isinstance(metadata, dict):
+        return metadata.get(key) or default
+    return getattr(metadata, key, None) or default
+
+def make_route_id(coords, metadata=None):
+    """
+    Stable route id: the source id when the route has metadata, otherwise a hash
+    of its first points, so ids survive cache reloads.
+    """
+    source_id = _metadata_value(metadata, "route_id", None)
+    if source_id:
+        return source_id
+    head = ";".join(f"{float(lat):.5f},{float(lon):.5f}" for lat, lon in coords[:10])
+    return f"route_{hashlib.md5(head.encode()).hexdigest()[:12]}"
+
+def _route_length_km(coords):
+    """Great-circle length of a (lat, lon) polyline"""
+    points = np.radians(np.asarray(coords, dtype=float))
+    lat1, lat2 = points[:-1, 0], points[1:, 0]
+    dlat, dlon = lat2 - lat1, points[1:, 1] - points[:-1, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return float(2 * 6371 * np.arcsin(np.sqrt(np.clip(a, 0, 1))).sum())
+
 class RouteManager:
     """Manages route loading and caching."""
     
     def __init__(self):
         self._routes = None
         self._routes_lines = None
+        self._route_ids = []
+        self._route_info = []
+        self._catalogue = {}
         self._spatial_index = {}
+        self._service_area = None
         self._loaded = False
         self._cache_file = CACHE_FILE
+        self.generation = 0  # bumped on every (re)load, lets caches notice new route data
         
     def _load_routes(self):
         """Load routes from cache or APIs."""
@@ -553,12 +616,25 @@ class RouteManager:
             self._routes = get_all_routes()
             self._update_cache()
         
-        # Convert to LineString objects
+        # Convert to LineString objects, keeping a stable id per route
         self._routes_lines = []
+        self._route_ids = []
+        self._route_info = []
+        self._catalogue = {}
         for i, route in enumerate(self._routes):
-            if len(route) > 1:
+            coords, metadata = _split_route_entry(route)
+            if len(coords) > 1:
                 try:
-                    self._routes_lines.append(LineString(route))
+                    self._routes_lines.append(LineString(coords))
+                    route_id = make_route_id(coords, metadata)
+                    self._route_ids.append(route_id)
+                    self._route_info.append({
+                        "route_id": route_id,
+                        "transport_type": _metadata_value(metadata, "transport_type", "unknown"),
+                        "operator": _metadata_value(metadata, "operator", "unknown"),
+                        "route_name": _metadata_value(metadata, "route_name", ""),
+                    })
+                    self._add_to_catalogue(route_id, self._route_info[-1], coords, self._routes_lines[-1])
                 except Exception as e:
                     print(f"Route {i} invalid: {e}")
         
@@ -566,8 +642,35 @@ class RouteManager:
         self._build_spatial_index()
         
         self._loaded = True
+        self.generation += 1
         print(f"Route loading complete: {len(self._routes_lines)} valid routes")
     
+    def _add_to_catalogue(self, route_id, info, coords, line):
+        """Index route metadata by id; segments sharing an id are merged"""
+        length_km = _route_length_km(coords)
+        centroid = line.centroid
+        entry = self._catalogue.get(route_id)
+        if entry is None:
+            self._catalogue[route_id] = {
+                "route_id": route_id,
+                "name": info["route_name"] or route_id,
+                "operator": info["operator"],
+                "transport_type": info["transport_type"],
+                "length_km": round(length_km, 3),
+                "centroid": [round(centroid.x, 6), round(centroid.y, 6)],
+                "segments": 1,
+            }
+            return
+        # Length-weighted centroid of all segments
+        total = entry["length_km"] + length_km
+        if total > 0:
+            entry["centroid"] = [
+                round((entry["centroid"][0] * entry["length_km"] + centroid.x * length_km) / total, 6),
+                round((entry["centroid"][1] * entry["length_km"] + centroid.y * length_km) / total, 6),
+            ]
+        entry["length_km"] = round(total, 3)
+        entry["segments"] += 1
+    
     def _update_cache(self):
         """Update the route cache file."""
         cache_data = {
@@ -614,11 +717,25 @@ class RouteManager:
                 continue
         
         print(f"Spatial index built with {len(self._spatial_index)} grid cells")
+        
+        # Bounding box of all routes (routes are stored as lat, lon)
+        if self._routes_lines:
+            all_bounds = [line.bounds for line in self._routes_lines]
+            self._service_area = (
+                min(b[0] for b in all_bounds), min(b[1] for b in all_bounds),
+                max(b[2] for b in all_bounds), max(b[3] for b in all_bounds)
+            )
     
     def get_nearby_routes_optimized(self, lat, lon, radius_meters=1000):
         """
         Get nearby routes using spatial index for better performance.
         """
+        return [route for _, route in self.get_route_candidates(lat, lon, radius_meters)]
+    
+    def get_route_candidates(self, lat, lon, radius_meters=1000):
+        """
+        Get (route_index, LineString) pairs for routes within radius_meters.
+        """
         self._load_routes()
         
         if not self._routes_lines:
@@ -652,18 +769,43 @@ class RouteManager:
                 if route_idx < len(self._routes_lines):
                     route = self._routes_lines[route_idx]
                     if route.intersects(user_area):
-                        nearby_routes.append(route)
+                        nearby_routes.append((route_idx, route))
             except Exception as e:
                 print(f"Error checking route {route_idx}: {e}")
                 continue
         
         return nearby_routes
     
+    def get_route_id(self, route_idx):
+        """Stable id of the route at route_idx"""
+        self._load_routes()
+        return self._route_ids[route_idx]
+    
+    def get_route_info(self, route_idx):
+        """Id, transport type, operator and name of the route at route_idx"""
+        self._load_routes()
+        return self._route_info[route_idx]
+    
+    def get_route_details(self, route_id):
+        """Catalogue entry (name, operator, transport type, length, centroid) for route_id, or None"""
+        self._load_routes()
+        details = self._catalogue.get(route_id)
+        return dict(details) if details else None
+    
     def get_routes_lines(self):
         """Get all route lines (loads routes if not already loaded)."""
         self._load_routes()
         return self._routes_lines
     
+    def get_service_area(self, margin_meters=2000):
+        """Bounding box (min_lat, min_lon, max_lat, max_lon) around all routes, or None."""
+        self._load_routes()
+        if not self._service_area:
+            return None
+        margin = margin_meters / DEGREES_TO_METERS
+        min_lat, min_lon, max_lat, max_lon = self._service_area
+        return (min_lat - margin, min_lon - margin, max_lat + margin, max_lon + margin)
+    
     def get_routes_count(self):
         """Get total number of routes."""
         self._load_routes()
@@ -675,13 +817,67 @@ class RouteManager:
         self._routes = get_all_routes()
         self._update_cache()
         self._routes_lines = None
+        self._route_ids = []
+        self._route_info = []
+        self._catalogue = {}
         self._spatial_index = {}
+        self._service_area = None
         self._loaded = False
         self._load_routes()
 
 # Global route manager instance
 route_manager = RouteManager()
 
+# Global trip session engine, timeouts come from the "tracking" config section
+_tracking_cfg = config.config.get('tracking', {})
+trip_engine = TripSessionEngine(SessionTimeouts(
+    confirm_seconds=_tracking_cfg.get('confirmSeconds', 120),
+    ending_grace_seconds=_tracking_cfg.get('endingGraceSeconds', 300),
+    stale_seconds=_tracking_cfg.get('staleSeconds', 900),
+))
+# Open trips store their coordinate lists every this many new points, and in full on close
+CHECKPOINT_POINTS = _tracking_cfg.get('checkpointPoints', 30)
+
+# Global ping pre-filter; without a configured service area the route bounding box is used
+_service_area_cfg = _tracking_cfg.get('serviceArea')
+ping_filter = PingFilter(PingFilterConfig(
+    max_accuracy_meters=_tracking_cfg.get('maxAccuracyMeters', 100.0),
+    duplicate_meters=_tracking_cfg.get('duplicateMeters', 1.0),
+    min_movement_meters=_tracking_cfg.get('minMovementMeters', 15.0),
+    service_area=tuple(_service_area_cfg) if _service_area_cfg else None,
+))
+
+# Per-user state of users that went quiet is dropped every this many seconds
+EVICT_INTERVAL_SECONDS = _tracking_cfg.get('evictIntervalSeconds', 600)
+_last_eviction = time.monotonic()
+_eviction_lock = threading.Lock()
+
+def evict_quiet_users():
+    """
+    Drop idle users, and trips silent for longer than stale_seconds, from this
+    worker's trip states and ping filter. They are rehydrated on the next ping.
+    """
+    global _last_eviction
+    with _eviction_lock:
+        if time.monotonic() - _last_eviction < EVICT_INTERVAL_SECONDS:
+            return 0
+        _last_eviction = time.monotonic()
+    silent_since = datetime.utcnow() - timedelta(seconds=trip_engine.timeouts.stale_seconds)
+    ping_filter.evict(silent_since)
+    return trip_engine.evict(silent_since)
+
+# Ping interval hints returned by /gps/track
+ping_interval_config = PingIntervalConfig(
+    candidate_seconds=_tracking_cfg.get('candidatePingSeconds', 10),
+    ending_seconds=_tracking_cfg.get('endingPingSeconds', 15),
+    riding_seconds=_tracking_cfg.get('ridingPingSeconds', 30),
+    riding_fast_seconds=_tracking_cfg.get('ridingFastPingSeconds', 60),
+    idle_near_seconds=_tracking_cfg.get('idleNearPingSeconds', 20),
+    idle_mid_seconds=_tracking_cfg.get('idleMidPingSeconds', 60),
+    idle_far_seconds=_tracking_cfg.get('idleFarPingSeconds', 120),
+    idle_outside_seconds=_tracking_cfg.get('idleOutsidePingSeconds', 300),
+)
+
 # Legacy compatibility functions
 def get_routes():
     """Get raw route data for backwards compatibility."""
@@ -695,6 +891,17 @@ def get_routes_lines():
 DEGREES_TO_METERS = 111139  
 ROUTE_WIDTH_METERS = 20     
 RESAMPLE_EVERY_METERS = 10  
+CONTEXT_RADIUS_METERS = 1000
+TRANSPORT_TYPE_RADIUS_METERS = 100
+
+# Per-location context cache, see travel.locationContext
+_location_cfg = config.config.get('locationContext', {})
+location_context_cache = LocationContextCache(
+    lambda lat, lon: build_location_context(lat, lon),
+    cell_meters=_location_cfg.get('cellMeters', 5.0),
+    max_entries=_location_cfg.get('maxEntries', 10000),
+    degrees_to_meters=DEGREES_TO_METERS,
+)
 
 def interpolate_linestring(line: LineString, step_meters: float):
     total_length = line.length
@@ -743,34 +950,81 @@ def is_user_on_any_nearby_route(user_lat, user_lon, routes_lines=None):
         print(f"Error checking if user is on route: {e}")
         return False
 
-def gpsinput(user_id, lat, lon, timestamp=None):
+def build_location_context(lat, lon, radius_meters=CONTEXT_RADIUS_METERS):
+    """
+    Compute the LocationContext of a point with a single spatial index query.
+    
+    The on-route test is a distance check against ROUTE_WIDTH_METERS, the same
+    corridor the buffered routes describe, without building buffers.
+    """
+    context = LocationContext(latitude=lat, longitude=lon)
+    user_point = Point(lat, lon)
+    
+    for route_idx, route in route_manager.get_route_candidates(lat, lon, radius_meters):
+        distance_m = route.distance(user_point) * DEGREES_TO_METERS
+        context.candidates.append((route_idx, distance_m))
+        if context.nearest_distance_m is None or distance_m < context.nearest_distance_m:
+            context.nearest_route_index = route_idx
+            context.nearest_distance_m = distance_m
+    
+    if context.nearest_route_index is None:
+        return context
+    
+    context.on_route = context.nearest_distance_m <= ROUTE_WIDTH_METERS
+    info = route_manager.get_route_info(context.nearest_route_index)
+    context.nearest_route_id = info["route_id"]
+    context.operator = info["operator"]
+    
+    # Same 100 m radius detect_transport_type uses
+    if context.nearest_distance_m <= TRANSPORT_TYPE_RADIUS_METERS:
+        if info["transport_type"] != "unknown":
+            context.transport_type, context.transport_confidence = info["transport_type"], 0.8
+        else:
+            context.transport_type, context.transport_confidence = route_analytics.predict_transport_type(lat, lon)
+    
+    return context
+
+def get_location_context(lat, lon):
+    """Cached LocationContext of the cell containing (lat, lon)."""
+    return location_context_cache.get(lat, lon, route_manager.generation)
+
+def gpsinput(user_id, lat, lon, timestamp=None, accuracy=None, speed=None):
     """
     Enhanced GPS input processing that tracks travel sessions and calculates duration.
     
     This function determines if a user is on public transportation by checking their
-    GPS coordinates against known transit routes, and manages travel sessions with
-    proper state tracking.
+    GPS coordinates against known transit routes, and feeds the result through the
+    trip session state machine (see travel.sessionEngine). It is the only code path
+    behind /gps/track.
     
     Args:
         user_id: User identifier (string or int)
         lat: Latitude coordinate (-90 to 90)
         lon: Longitude coordinate (-180 to 180)
         timestamp: Optional ISO timestamp string or datetime object
+        accuracy: Optional horizontal accuracy of the fix in meters
+        speed: Optional speed reported by the device in m/s
+    
+    Pings are first classified by the ping pre-filter (see travel.pingFilter).
+    Low-accuracy, duplicate and stationary pings only advance the trip timers
+    in memory; pings outside the service area skip the route geometry check.
     
     Returns:
         dict: Travel session information containing:
             - on_transport: Boolean indicating if user is on public transport
-            - session_type: "new", "continuing", "ended", "invalid", or "none"
+            - session_type: "new", "continuing", "ending", "ended", "invalid", "none" or "error"
+            - session_state: Trip state after this ping ("idle", "candidate", "riding", "ending")
             - duration: Duration in seconds of current/completed session
             - distance: Distance traveled in kilometers
             - transport_type: Detected transport type ("bus", "train", "tram", etc.)
             - travel_id: Database ID of the travel session
+            - completed_trip: Duration/distance/id of a valid trip closed by this ping, else None
+            - filter_decision: Pre-filter outcome ("accepted", "stationary", ...)
+            - speed_kmh: Device-reported speed in km/h (0.0 when not reported)
+            - next_ping_seconds: Recommended interval until the next ping
+            - ping_hint_reason: Why that interval was chosen
     """
     from misc.db import get_session
-    from misc.models import TravelHistory, User
-    from sqlmodel import select
-    from datetime import datetime, timedelta
-    import time
     
     # Input validation
     try:
@@ -784,183 +1038,289 @@ def gpsinput(user_id, lat, lon, timestamp=None):
     if not (-180 <= lon <= 180):
         raise ValueError(f"Invalid longitude: {lon}. Must be between -180 and 180.")
     
-    # Handle timestamp conversion
-    if timestamp is None:
-        timestamp = datetime.utcnow()
-    elif isinstance(timestamp, str):
-        try:
-            # Handle various ISO format variations
-            timestamp = timestamp.replace('Z', '+00:00')
-            timestamp = datetime.fromisoformat(timestamp)
-        except ValueError as e:
-            print(f"Warning: Invalid timestamp format '{timestamp}', using current time. Error: {e}")
-            timestamp = datetime.utcnow()
-    elif not isinstance(timestamp, datetime):
-        print(f"Warning: Unexpected timestamp type {type(timestamp)}, using current time.")
-        timestamp = datetime.utcnow()
+    timestamp = _parse_ping_timestamp(timestamp)
+    evict_quiet_users()
+    
+    decision, last_ping = ping_filter.check(
+        user_id_int, lat, lon, timestamp, accuracy, route_manager.get_service_area()
+    )
+    if decision in SHORT_CIRCUIT:
+        return _short_circuit_ping(user_id_int, decision, last_ping, timestamp, lat, lon, speed)
     
     # Check if user is on any transportation route
-    try:
-        is_on_route = is_user_on_any_nearby_route(lat, lon)
-    except Exception as e:
-        print(f"Error checking route proximity: {e}")
-        is_on_route = False
+    if decision == OUTSIDE_SERVICE_AREA:
+        context = LocationContext(latitude=lat, longitude=lon)
+    else:
+        try:
+            context = get_location_context(lat, lon)
+        except Exception as e:
+            print(f"Error checking route proximity: {e}")
+            context = LocationContext(latitude=lat, longitude=lon)
+    is_on_route = context.on_route
     
     try:
         with get_session() as session:
-            # Verify user exists
-            user_statement = select(User).where(User.id == user_id_int)
-            user = session.exec(user_statement).first()
-            if not user:
-                raise ValueError(f"User with ID {user_id} not found.")
+            _sync_trip_state(session, user_id_int, timestamp)
+            transition = trip_engine.process_ping(user_id_int, is_on_route, lat, lon, timestamp)
+            _persist_transition(session, user_id_int, transition)
             
-            # Get the most recent travel history for this user
-            statement = select(TravelHistory).where(
-                TravelHistory.user_id == user_id_int
-            ).order_by(TravelHistory.timestamp.desc()).limit(1)
-            
-            last_travel = session.exec(statement).first()
-            
-            if is_on_route:
-                # User is currently on a transportation route
-                session_timeout_minutes = 10
-                
-                if (last_travel and 
-                    last_travel.timestamp > (timestamp - timedelta(minutes=session_timeout_minutes))):
-                    
-     
-                    if last_travel.listLatitude is None:
-                        last_travel.listLatitude = [last_travel.startLatitude]
-                    if last_travel.listLongitude is None:
-                        last_travel.listLongitude = [last_travel.startLongitude]
-                    
-                    last_travel.listLatitude.append(lat)
-                    last_travel.listLongitude.append(lon)
-                    
-                    duration_seconds = (timestamp - last_travel.timestamp).total_seconds()
-                    last_travel.duration = duration_seconds
-                    
-                    # Calculate total distance traveled using all coordinates
-                    if len(last_travel.listLatitude) > 1:
-                        try:
-                            distance = calculate_total_distance(
-                                last_travel.listLatitude, 
-                                last_travel.listLongitude
-                            )
-                            last_travel.distance = distance
-                        except Exception as e:
-                            print(f"Error calculating distance: {e}")
-                            last_travel.distance = 0.0
-                    
-                    # Update the session in database
-                    session.add(last_travel)
-                    session.commit()
-                    
-                    return {
-                        "on_transport": True,
-                        "session_type": "continuing",
-                        "duration": duration_seconds,
-                        "distance": last_travel.distance,
-                        "transport_type": detect_transport_type(lat, lon),
-                        "travel_id": last_travel.id
-                    }
-                else:
-                    # Start new travel session
-                    try:
-                        new_travel = TravelHistory(
-                            user_id=user_id_int,
-                            timestamp=timestamp,
-                            startLatitude=lat,
-                            startLongitude=lon,
-                            listLatitude=[lat],
-                            listLongitude=[lon],
-                            distance=0.0,
-                            duration=0.0
-                        )
-                        session.add(new_travel)
-                        session.commit()
-                        session.refresh(new_travel)
-                        
-                        return {
-                            "on_transport": True,
-                            "session_type": "new",
-                            "duration": 0.0,
-                            "distance": 0.0,
-                            "transport_type": detect_transport_type(lat, lon),
-                            "travel_id": new_travel.id
-                        }
-                    except Exception as e:
-                        print(f"Error creating new travel session: {e}")
-                        return {
-                            "on_transport": False,
-                            "session_type": "error",
-                            "duration": 0.0,
-                            "distance": 0.0,
-                            "transport_type": None,
-                            "travel_id": None
-                        }
-            else:
-                # User is not on a transportation route
-                session_end_timeout_minutes = 15
-                minimum_valid_duration_seconds = 120  # 2 minutes
-                
-                if (last_travel and 
-                    last_travel.timestamp > (timestamp - timedelta(minutes=session_end_timeout_minutes))):
-                    
-                    # Recently was on transport, consider this the end of travel session
-                    final_duration = (timestamp - last_travel.timestamp).total_seconds()
-                    
-                    if final_duration > minimum_valid_duration_seconds:
-                        # Valid travel session completed
-                        last_travel.duration = final_duration
-                        session.add(last_travel)
-                        session.commit()
-                        
-                        return {
-                            "on_transport": False,
-                            "session_type": "ended",
-                            "duration": final_duration,
-                            "distance": last_travel.distance,
-                            "transport_type": detect_transport_type(lat, lon),
-                            "travel_id": last_travel.id
-                        }
-                    else:
-                        # Session too short to be valid transport, remove it
-                        try:
-                            session.delete(last_travel)
-                            session.commit()
-                        except Exception as e:
-                            print(f"Error deleting invalid travel session: {e}")
-                        
-                        return {
-                            "on_transport": False,
-                            "session_type": "invalid",
-                            "duration": 0.0,
-                            "distance": 0.0,
-                            "transport_type": None,
-                            "travel_id": None
-                        }
-                
-                # No active or recent travel session
-                return {
-                    "on_transport": False,
-                    "session_type": "none",
-                    "duration": 0.0,
-                    "distance": 0.0,
-                    "transport_type": None,
-                    "travel_id": None
-                }
-                
+    except ValueError:
+        raise
     except Exception as e:
         print(f"Database error in gpsinput: {e}")
-        return {
-            "on_transport": False,
-            "session_type": "error",
-            "duration": 0.0,
-            "distance": 0.0,
-            "transport_type": None,
-            "travel_id": None
+        trip_engine.forget(user_id_int)
+        ping_filter.forget(user_id_int)
+        return _session_result(False, "error")
+    
+    _queue_map_matching(transition)
+    result = _transition_result(transition, context.transport_type)
+    if result["on_transport"] and context.on_route:
+        result["route_id"] = context.nearest_route_id
+        result["operator"] = context.operator
+    result["filter_decision"] = decision
+    result["speed_kmh"] = _speed_kmh(speed)
+    _add_ping_hint(result, context.nearest_distance_m, speed)
+    ping_filter.record(user_id_int, lat, lon, timestamp, is_on_route, context.transport_type, context.nearest_distance_m)
+    return result
+
+def _speed_kmh(speed):
+    """Device speed (m/s) in km/h, 0.0 when the device did not report one"""
+    return round(speed * 3.6, 2) if speed else 0.0
+
+def _add_ping_hint(result, corridor_distance, speed):
+    result["next_ping_seconds"], result["ping_hint_reason"] = recommend_ping_interval(
+        result["session_state"], corridor_distance, speed, ping_interval_config
+    )
+
+def _short_circuit_ping(user_id, decision, last_ping, timestamp, lat, lon, speed=None):
+    """Handle a filtered ping without route geometry; the DB is only touched if a trip closes."""
+    from misc.db import get_session
+    
+    # A low-accuracy fix says nothing about the route, the others stand where the last ping stood
+    on_route = None if decision not in ("duplicate", "stationary") or last_ping is None else last_ping.on_route
+    transition = trip_engine.touch(user_id, on_route, timestamp)
+    
+    if transition.closed_trip is not None:
+        try:
+            with get_session() as session:
+                _persist_transition(session, user_id, transition)
+        except Exception as e:
+            print(f"Database error in gpsinput: {e}")
+            trip_engine.forget(user_id)
+            ping_filter.forget(user_id)
+            return _session_result(False, "error")
+        _queue_map_matching(transition)
+    
+    # Reuse the last detected transport type instead of another geometry lookup
+    transport_type = (last_ping.transport_type if last_ping else None) or "unknown"
+    result = _transition_result(transition, transport_type)
+    result["filter_decision"] = decision
+    result["speed_kmh"] = _speed_kmh(speed)
+    _add_ping_hint(result, last_ping.corridor_distance if last_ping else None, speed)
+    return result
+
+def _queue_map_matching(transition):
+    """Completed trips are matched to the routes actually ridden, off the request path"""
+    closed = transition.closed_trip
+    if closed is not None and transition.closed_valid and closed.travel_id is not None:
+        map_matcher.submit(closed.travel_id)
+
+def _parse_ping_timestamp(timestamp):
+    if timestamp is None:
+        return datetime.utcnow()
+    if isinstance(timestamp, str):
+        try:
+            # Handle various ISO format variations
+            parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            # Stored timestamps are naive UTC
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        except ValueError as e:
+            print(f"Warning: Invalid timestamp format '{timestamp}', using current time. Error: {e}")
+            return datetime.utcnow()
+    if not isinstance(timestamp, datetime):
+        print(f"Warning: Unexpected timestamp type {type(timestamp)}, using current time.")
+        return datetime.utcnow()
+    return timestamp
+
+def _hydrate_trip_state(session, user_id, timestamp):
+    """Rebuild a user's trip state from the DB after a restart or on a fresh worker."""
+    from misc.models import TravelHistory, User
+    from sqlmodel import select
+    from sqlalchemy.orm import undefer
+    
+    user = session.exec(select(User.id).where(User.id == user_id)).first()
+    if not user:
+        raise ValueError(f"User with ID {user_id} not found.")
+    
+    last_travel = session.exec(
+        select(TravelHistory).options(undefer(TravelHistory.listLatitude), undefer(TravelHistory.listLongitude))
+        .where(TravelHistory.user_id == user_id)
+        .order_by(TravelHistory.timestamp.desc()).limit(1)
+    ).first()
+    
+    trip = None
+    if last_travel and not last_travel.ended:
+        # A trip left open past the stale timeout is still loaded, the next ping closes it
+        last_activity = last_travel.timestamp + timedelta(seconds=last_travel.duration or 0)
+        confirmed = (last_travel.duration or 0) >= trip_engine.timeouts.confirm_seconds
+        trip = TripState(
+            state=RIDING if confirmed else CANDIDATE,
+            travel_id=last_travel.id,
+            started_at=last_travel.timestamp,
+            last_ping_at=last_activity,
+            last_on_route_at=last_activity,
+            latitudes=list(last_travel.listLatitude or [last_travel.startLatitude]),
+            longitudes=list(last_travel.listLongitude or [last_travel.startLongitude]),
+            distance_km=last_travel.distance or 0.0,
+        )
+        trip.persisted_points = len(trip.latitudes)
+    trip_engine.hydrate(user_id, trip)
+
+def _sync_trip_state(session, user_id, timestamp):
+    """
+    Check this worker's trip state against the user's latest TravelHistory row
+    and rehydrate when they disagree. Every worker keeps its own TripState, so
+    another worker may have opened, extended or closed the trip meanwhile.
+    """
+    from misc.models import TravelHistory
+    from sqlmodel import select
+    
+    if not trip_engine.has_user(user_id):
+        _hydrate_trip_state(session, user_id, timestamp)
+        return
+    
+    latest = session.exec(
+        select(TravelHistory.id, TravelHistory.ended, TravelHistory.point_count)
+        .where(TravelHistory.user_id == user_id)
+        .order_by(TravelHistory.timestamp.desc()).limit(1)
+    ).first()
+    trip = trip_engine.get_state(user_id)
+    if trip.state == IDLE:
+        in_sync = latest is None or latest.ended
+    else:
+        in_sync = trip.travel_id is None or (
+            latest is not None and latest.id == trip.travel_id and not latest.ended
+            and latest.point_count == len(trip.latitudes)
+        )
+    if not in_sync:
+        _hydrate_trip_state(session, user_id, timestamp)
+
+def _persist_transition(session, user_id, transition):
+    """Write what a trip transition changed; pings that change nothing skip the DB."""
+    from misc.models import TravelHistory
+    from sqlmodel import update, delete
+    
+    closed = transition.closed_trip
+    rolled_up = False
+    if closed is not None and closed.travel_id is not None:
+        # Only the worker that actually ends the trip writes it, another one may have closed it already
+        still_open = (TravelHistory.id == closed.travel_id, TravelHistory.ended == False)
+        if transition.closed_valid:
+            closed_here = session.exec(update(TravelHistory).where(*still_open).values(
+                listLatitude=list(closed.latitudes),
+                listLongitude=list(closed.longitudes),
+                point_count=len(closed.latitudes),
+                distance=closed.distance_km,
+                duration=closed.duration_seconds,
+                ended=True,
+            )).rowcount
+            # Stats read the daily rollup, so fold the trip in with the same commit
+            if closed_here:
+                rolled_up = rollup_closed_trip(session, user_id, closed.travel_id, closed.started_at,
+                                               closed.duration_seconds, closed.distance_km)
+        else:
+            # Too short to be valid transport, remove it
+            session.exec(delete(TravelHistory).where(*still_open))
+    
+    trip = transition.trip
+    if transition.session_type == "new":
+        new_travel = TravelHistory(
+            user_id=user_id,
+            timestamp=trip.started_at,
+            startLatitude=trip.latitudes[0],
+            startLongitude=trip.longitudes[0],
+            listLatitude=list(trip.latitudes),
+            listLongitude=list(trip.longitudes),
+            point_count=len(trip.latitudes),
+            distance=0.0,
+            duration=0.0
+        )
+        session.add(new_travel)
+        session.commit()
+        session.refresh(new_travel)
+        trip.persisted_points = len(trip.latitudes)
+        trip_engine.attach_travel_id(user_id, new_travel.id)
+        if rolled_up:
+            leaderboard.record_hours(user_id, closed.started_at.date(), closed.duration_seconds)
+        return
+    
+    if transition.session_type == "continuing" and trip.travel_id is not None:
+        # Scalars on every ping; the coordinate lists only at checkpoints, so a ping
+        # does not rewrite the whole trip. A revived trip resumes from its last checkpoint.
+        values = dict(point_count=len(trip.latitudes), distance=trip.distance_km, duration=trip.duration_seconds)
+        if len(trip.latitudes) - trip.persisted_points >= CHECKPOINT_POINTS:
+            values.update(listLatitude=list(trip.latitudes), listLongitude=list(trip.longitudes))
+            trip.persisted_points = len(trip.latitudes)
+        updated = session.exec(update(TravelHistory).where(
+            TravelHistory.id == trip.travel_id, TravelHistory.ended == False
+        ).values(**values)).rowcount
+        if not updated:
+            # Closed or removed by another worker; the next ping rehydrates from the DB
+            trip_engine.forget(user_id)
+    
+    session.commit()
+    if rolled_up:
+        leaderboard.record_hours(user_id, closed.started_at.date(), closed.duration_seconds)
+
+def _session_result(on_transport, session_type, state=IDLE, duration=0.0, distance=0.0,
+                    transport_type=None, travel_id=None, completed_trip=None):
+    return {
+        "on_transport": on_transport,
+        "session_type": session_type,
+        "session_state": state,
+        "duration": duration,
+        "distance": distance,
+        "transport_type": transport_type,
+        "travel_id": travel_id,
+        "completed_trip": completed_trip,
+        "route_id": None,
+        "operator": None,
+        "filter_decision": ACCEPT,
+        "speed_kmh": 0.0,
+        "next_ping_seconds": None,
+        "ping_hint_reason": None
+    }
+
+def _transition_result(transition, transport_type):
+    completed = None
+    if transition.closed_trip is not None and transition.closed_valid:
+        closed = transition.closed_trip
+        completed = {
+            "travel_id": closed.travel_id,
+            "duration": closed.duration_seconds,
+            "distance": closed.distance_km
         }
+    
+    trip = transition.trip
+    if trip is not None:
+        on_transport = transition.state in (CANDIDATE, RIDING)
+        return _session_result(
+            on_transport, transition.session_type, transition.state,
+            trip.duration_seconds, trip.distance_km,
+            transport_type if on_transport else None,
+            trip.travel_id, completed
+        )
+    
+    if completed:
+        return _session_result(
+            False, transition.session_type, transition.state,
+            completed["duration"], completed["distance"],
+            transport_type, completed["travel_id"], completed
+        )
+    
+    return _session_result(False, transition.session_type, transition.state)
 
 
 def calculate_total_distance(latitudes, longitudes):
@@ -1003,10 +1363,10 @@ def detect_transport_type(lat, lon, speed_kmh=None, travel_history=None):
         Tuple of (transport_type, confidence_score)
     """
     try:
-        # Get nearby routes with metadata
-        nearby_routes = get_nearby_routes(lat, lon, radius_meters=100)
+        # Nearest route from the cached location context
+        context = get_location_context(lat, lon)
         
-        if not nearby_routes:
+        if context.nearest_distance_m is None or context.nearest_distance_m > TRANSPORT_TYPE_RADIUS_METERS:
             return "unknown", 0.0
         
         # Use analytics system for prediction
@@ -1018,9 +1378,8 @@ def detect_transport_type(lat, lon, speed_kmh=None, travel_history=None):
             lat, lon, speed_kmh, stop_pattern
         )
         
-        # Update usage analytics
-        route_id = f"route_{hash((lat, lon))}"
-        route_analytics.update_route_usage(route_id, transport_type)
+        # Usage is counted per real route id by /gps/track, not per coordinate
+        route_id = context.nearest_route_id
         
         # Learn from this interaction if we have speed data
         if speed_kmh is not None and travel_history and len(travel_history) > 5:
@@ -1030,7 +1389,7 @@ def detect_transport_type(lat, lon, speed_kmh=None, travel_history=None):
                     transport_type, 
                     recent_speeds, 
                     len(travel_history) / 10.0,  # Simplified stop frequency
-                    f"route_{hash((lat, lon))}"
+                    route_id
                 )
         
         return transport_type, confidence
@@ -1040,45 +1399,71 @@ def detect_transport_type(lat, lon, speed_kmh=None, travel_history=None):
         return "unknown", 0.0 
 
 
+def _travel_stats_start(timeframe):
+    """Start of a stats window, or None for all time"""
+    now = datetime.utcnow()
+    
+    if timeframe == "daily":
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif timeframe == "weekly":
+        return now - timedelta(days=7)
+    elif timeframe == "monthly":
+        return now - timedelta(days=30)
+    return None
+
+def _summarize_travel_stats(timeframe, rollup, recent):
+    """Combine the rollup totals with the trips not rolled up yet"""
+    trip_count, total_duration, total_distance = rollup
+    trip_count += len(recent)
+    total_duration += sum(duration for duration, _ in recent)
+    total_distance += sum(distance for _, distance in recent)
+    
+    return {
+        "timeframe": timeframe,
+        "total_duration_minutes": total_duration / 60,
+        "total_distance_km": total_distance,
+        "trip_count": trip_count,
+        "average_trip_duration": (total_duration / trip_count / 60) if trip_count > 0 else 0,
+        "average_trip_distance": (total_distance / trip_count) if trip_count > 0 else 0
+    }
+
 def get_user_travel_stats(user_id, timeframe="daily"):
     """Get user travel statistics for different timeframes"""
     from misc.db import get_session
-    from misc.models import TravelHistory
-    from sqlmodel import select
-    from datetime import datetime, timedelta
     
+    rollup_statement, recent_statement = stats_statements(int(user_id), _travel_stats_start(timeframe))
     with get_session() as session:
-        now = datetime.utcnow()
-        
-        if timeframe == "daily":
-            start_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif timeframe == "weekly":
-            start_time = now - timedelta(days=7)
-        elif timeframe == "monthly":
-            start_time = now - timedelta(days=30)
-        else:
-            start_time = datetime.min
-        
-        statement = select(TravelHistory).where(
-            TravelHistory.user_id == int(user_id),
-            TravelHistory.timestamp >= start_time,
-            TravelHistory.duration > 120  # Only count trips longer than 2 minutes
-        )
-        
-        travels = session.exec(statement).all()
-        
-        total_duration = sum(travel.duration for travel in travels)
-        total_distance = sum(travel.distance for travel in travels)
-        trip_count = len(travels)
-        
-        return {
-            "timeframe": timeframe,
-            "total_duration_minutes": total_duration / 60,
-            "total_distance_km": total_distance,
-            "trip_count": trip_count,
-            "average_trip_duration": (total_duration / trip_count / 60) if trip_count > 0 else 0,
-            "average_trip_distance": (total_distance / trip_count) if trip_count > 0 else 0
-        }
+        rollup = session.exec(rollup_statement).one()
+        recent = session.exec(recent_statement).all()
+        return _summarize_travel_stats(timeframe, rollup, recent)
+
+async def get_user_travel_stats_async(session, user_id, timeframe="daily"):
+    """Async variant of get_user_travel_stats for handlers holding an AsyncSession"""
+    rollup_statement, recent_statement = stats_statements(int(user_id), _travel_stats_start(timeframe))
+    rollup = (await session.exec(rollup_statement)).one()
+    recent = (await session.exec(recent_statement)).all()
+    return _summarize_travel_stats(timeframe, rollup, recent)
+
+def hours_period_starts():
+    """First rollup day of each hours period, matching the travel stats windows"""
+    return {period: _travel_stats_start(period).date() for period in HOURS_PERIODS}
+
+async def get_user_hours_async(session, user_id):
+    """Per-mode travel hours (total, daily, weekly, monthly) summed from the daily rollup"""
+    rows = (await session.exec(hours_statement(int(user_id), hours_period_starts()))).all()
+    return summarize_hours(rows)
+
+def get_hours_leaderboard(session, period="total", limit=None):
+    """[(user_id, hours)] ranked by travel time in the period ("total" for all time)"""
+    start = None if period == "total" else hours_period_starts()[period]
+    rows = session.exec(hours_leaderboard_statement(start, limit)).all()
+    return [(user_id, seconds / 3600) for user_id, seconds in rows]
+
+def _utc_timestamp(value: datetime) -> float:
+    """POSIX timestamp of value, treating naive datetimes as UTC like the rest of the models"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
 
 class RouteAnalytics:
     """Track route usage and learn transport patterns."""
@@ -1086,107 +1471,166 @@ class RouteAnalytics:
     def __init__(self):
         self.analytics_cache = {}
         self.transport_patterns = {}
-        self.route_usage_stats = defaultdict(int)
+        analytics_cfg = config.config.get('analytics', {})
+        # Bounded top-k of route usage, keyed by RouteManager route ids
+        self.route_usage = SpaceSaving(analytics_cfg.get('topRoutesCapacity', 500))
         self.operator_stats = defaultdict(lambda: defaultdict(int))
-        self.popular_routes = []
+        self.store = AnalyticsStore(
+            analytics_cfg.get('dbFile', ANALYTICS_DB_FILE),
+            flush_interval=analytics_cfg.get('flushIntervalSeconds', 5),
+            max_batch=analytics_cfg.get('maxBatch', 1000),
+            retention_days=analytics_cfg.get('eventRetentionDays', 8),
+            compact_interval=analytics_cfg.get('compactIntervalSeconds', 3600),
+        )
+        # Merged cross-worker view served to /analytics/*, refreshed at most this often
+        self._read_cache_seconds = analytics_cfg.get('readCacheSeconds', 2)
+        self._snapshot = None
+        self._snapshot_at = 0.0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_refreshing = False
+        # Rolling minute/hour windows, fed by tailing the shared event log so all workers agree
+        self.route_windows = WindowedCounter()
+        self.operator_windows = WindowedCounter()
+        # Lifetime operator totals, seeded from the counters and then fed by the same tail
+        self.operator_aggregates = OperatorAggregates()
+        self._aggregates_seed_id = None
+        self._events_seen_id = 0
+        self._windows_synced_at = 0.0
+        self._windows_lock = threading.Lock()
+        speed_cfg = config.config.get('speedProfiles', {})
+        self._speed_bin_width = speed_cfg.get('binWidthKmh', 2)
+        self._speed_max = speed_cfg.get('maxKmh', 200)
+        self._min_profile_samples = speed_cfg.get('minSamples', 20)
+        self.pattern_store = PatternStore(
+            speed_cfg.get('dbFile', TRANSPORT_PATTERNS_FILE),
+            flush_interval=speed_cfg.get('flushIntervalSeconds', 10),
+        )
+        self.classifier = TransportClassifier()
         self._load_analytics_cache()
         self._load_transport_patterns()
+        self.load_classifier()
     
     def _load_analytics_cache(self):
-        """Load cached analytics data."""
+        """Load aggregated analytics from the counter tables."""
         try:
             if os.path.exists(ANALYTICS_CACHE_FILE):
-                with open(ANALYTICS_CACHE_FILE, 'rb') as f:
-                    data = pickle.load(f)
-                    self.analytics_cache = data.get('analytics_cache', {})
-                    self.route_usage_stats = data.get('route_usage_stats', defaultdict(int))
-                    self.operator_stats = data.get('operator_stats', defaultdict(lambda: defaultdict(int)))
-                    self.popular_routes = data.get('popular_routes', [])
-                    print(f"Loaded {len(self.analytics_cache)} analytics entries")
+                self._migrate_pickle_cache()
+            if not self.store.exists():
+                return  # nothing recorded yet, the file is created on the first flush
+            
+            counts, total = self.store.load_route_counts(self.route_usage.capacity)
+            self.route_usage = SpaceSaving.from_dict({"counts": counts, "total": total}, self.route_usage.capacity)
+            for operator, types in self.store.load_operator_counts().items():
+                self.operator_stats[operator].update(types)
+            self.analytics_cache = self.store.load_route_info()
+            print(f"Loaded {len(counts)} route counters ({total} usage events)")
         except Exception as e:
             print(f"Analytics cache load failed: {e}")
     
+    def _migrate_pickle_cache(self):
+        """Fold a legacy route_analytics.pkl into the counter tables once."""
+        with open(ANALYTICS_CACHE_FILE, 'rb') as f:
+            data = pickle.load(f)
+        
+        if self.store.is_empty():
+            if 'route_usage' in data:
+                route_counts = data['route_usage'].get('counts', {})
+            else:
+                route_counts = dict(data.get('route_usage_stats', {}))
+            operator_counts = {
+                (operator, transport_type): count
+                for operator, types in data.get('operator_stats', {}).items()
+                for transport_type, count in types.items()
+            }
+            self.store.add_counts(route_counts, operator_counts)
+            self.store.save_route_info(data.get('analytics_cache', {}))
+            print(f"Migrated {len(route_counts)} route counters from {ANALYTICS_CACHE_FILE}")
+        
+        os.replace(ANALYTICS_CACHE_FILE, ANALYTICS_CACHE_FILE + ".migrated")
+    
     def _save_analytics_cache(self):
-        """Save analytics to file."""
+        """Flush buffered events and persist per-route analytics."""
         try:
-            data = {
-                'analytics_cache': self.analytics_cache,
-                'route_usage_stats': dict(self.route_usage_stats),
-                'operator_stats': dict(self.operator_stats),
-                'popular_routes': self.popular_routes
-            }
-            with open(ANALYTICS_CACHE_FILE, 'wb') as f:
-                pickle.dump(data, f)
+            self.store.flush()
+            self.store.save_route_info(self.analytics_cache)
         except Exception as e:
             print(f"Error saving analytics cache: {e}")
     
     def _load_transport_patterns(self):
-        """Load transport type patterns from SQLite database."""
+        """Load transport type patterns, converting legacy pickled speed lists."""
         try:
-            if os.path.exists(TRANSPORT_PATTERNS_FILE):
-                conn = sqlite3.connect(TRANSPORT_PATTERNS_FILE)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT transport_type, speed_profile, stop_frequency, 
-                           route_geometry, confidence, sample_count
-                    FROM transport_patterns
-                ''')
-                
-                for row in cursor.fetchall():
-                    transport_type, speed_profile, stop_frequency, route_geometry, confidence, sample_count = row
-                    self.transport_patterns[transport_type] = TransportTypePattern(
-                        speed_profile=pickle.loads(speed_profile),
-                        stop_frequency=stop_frequency,
-                        route_geometry=route_geometry,
-                        confidence=confidence,
-                        sample_count=sample_count
-                    )
-                
-                conn.close()
+            if not self.pattern_store.exists():
+                return
+            for row in self.pattern_store.load():
+                transport_type, speed_profile, stop_frequency, route_geometry, confidence, sample_count = row
+                self.transport_patterns[transport_type] = TransportTypePattern(
+                    speed_profile=SpeedHistogram.from_blob(speed_profile, self._speed_bin_width, self._speed_max),
+                    stop_frequency=stop_frequency,
+                    route_geometry=route_geometry,
+                    confidence=confidence,
+                    sample_count=sample_count
+                )
+            if self.transport_patterns:
                 print(f"Loaded {len(self.transport_patterns)} transport patterns")
         except Exception as e:
             print(f"Error loading transport patterns: {e}")
-            self._create_transport_patterns_db()
-    
-    def _create_transport_patterns_db(self):
-        """Create the transport patterns database."""
-        try:
-            conn = sqlite3.connect(TRANSPORT_PATTERNS_FILE)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transport_patterns (
-                    transport_type TEXT PRIMARY KEY,
-                    speed_profile BLOB,
-                    stop_frequency REAL,
-                    route_geometry TEXT,
-                    confidence REAL,
-                    sample_count INTEGER
-                )
-            ''')
-            conn.commit()
-            conn.close()
-            print("Created transport patterns database")
-        except Exception as e:
-            print(f"Error creating transport patterns database: {e}")
     
     def update_route_usage(self, route_id: str, transport_type: str = None, operator: str = None):
         """Update route usage statistics."""
-        self.route_usage_stats[route_id] += 1
+        self.route_usage.add(route_id)
         
         if transport_type:
             self.operator_stats[operator or 'unknown'][transport_type] += 1
         
-        # Update popular routes list
-        self._update_popular_routes()
-        
-        # Save periodically
-        if sum(self.route_usage_stats.values()) % 100 == 0:
-            self._save_analytics_cache()
+        # Buffered, the store flushes on its own timer
+        self.store.record_route_usage(route_id, transport_type, operator)
+    
+    def _merged_snapshot(self):
+        """
+        Totals merged across all workers from the shared store, cached briefly.
+        Only the first call reads the store inline; after that an expired snapshot
+        is still served while a background thread reads the next one, so request
+        threads never wait on the store. Falls back to this worker's in-memory
+        counters if the store can't be read.
+        """
+        with self._snapshot_lock:
+            if self._snapshot is not None:
+                if time.time() - self._snapshot_at >= self._read_cache_seconds and not self._snapshot_refreshing:
+                    self._snapshot_refreshing = True
+                    threading.Thread(target=self._refresh_snapshot, daemon=True).start()
+                return self._snapshot
+        self._refresh_snapshot()
+        return self._snapshot or {
+            "top": self.route_usage.top(self.route_usage.capacity),
+            "total": self.route_usage.total,
+            "distinct": len(self.route_usage),
+            "operators": {operator: dict(types) for operator, types in self.operator_stats.items()},
+        }
     
-    def _update_popular_routes(self):
-        """Update the list of popular routes."""
-        sorted_routes = sorted(self.route_usage_stats.items(), key=lambda x: x[1], reverse=True)
-        self.popular_routes = sorted_routes[:50]  # Keep top 50
+    def _refresh_snapshot(self):
+        try:
+            snapshot = self.store.merged_snapshot(self.route_usage.capacity)
+        except Exception as e:
+            print(f"Analytics store read failed, serving local counters: {e}")
+            snapshot = None
+        with self._snapshot_lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+                self._snapshot_at = time.time()
+            self._snapshot_refreshing = False
+    
+    @property
+    def route_usage_stats(self) -> Dict[str, int]:
+        """Usage counts of the most used routes, merged across workers"""
+        return dict(self._merged_snapshot()["top"])
+    
+    def get_total_usage(self) -> int:
+        """Number of usage events recorded by all workers"""
+        return self._merged_snapshot()["total"]
+    
+    def get_tracked_routes_count(self) -> int:
+        """Number of distinct routes used, across all workers"""
+        return self._merged_snapshot()["distinct"]
     
     def get_route_analytics(self, route_id: str) -> Dict[str, Any]:
         """Get analytics for a specific route."""
@@ -1196,12 +1640,92 @@ class RouteAnalytics:
         return self.analytics_cache[route_id]
     
     def get_popular_routes(self, limit: int = 10) -> List[Tuple[str, int]]:
-        """Get most popular routes."""
-        return self.popular_routes[:limit]
+        """Get most popular routes, merged across workers."""
+        return self._merged_snapshot()["top"][:limit]
+    
+    def load_classifier(self, path: str = TRANSPORT_MODEL_FILE):
+        """Load the offline-trained trip classifier, if one has been trained."""
+        try:
+            if os.path.exists(path):
+                self.classifier = TransportClassifier.load(path)
+                print(f"Loaded transport classifier ({', '.join(self.classifier.classes)})")
+        except Exception as e:
+            print(f"Error loading transport classifier: {e}")
+    
+    def classify_trips(self, trips: List[Dict]) -> List[Tuple[str, float]]:
+        """
+        Classify a batch of trips in one call.
+        
+        trips are dicts as returned by load_trip_records; returns
+        (transport_type, confidence) per trip, "unknown" without a trained model.
+        """
+        labels, confidences = self.classifier.predict_many(build_feature_matrix(trips))
+        return [(label, round(float(confidence), 3)) for label, confidence in zip(labels, confidences)]
     
     def get_operator_stats(self) -> Dict[str, Dict[str, int]]:
-        """Get operator statistics."""
-        return dict(self.operator_stats)
+        """Get operator statistics, merged across workers."""
+        return self._merged_snapshot()["operators"]
+    
+    def _sync_windows(self):
+        """Fold newly flushed events from every worker into the rolling windows."""
+        with self._windows_lock:
+            if time.time() - self._windows_synced_at < self._read_cache_seconds:
+                return
+            try:
+                if self._aggregates_seed_id is None:
+                    counts, self._aggregates_seed_id = self.store.load_operator_snapshot()
+                    self.operator_aggregates.reset(counts)
+                since = time.time() - self.route_windows.max_window_seconds
+                batch = 50000
+                while True:
+                    events = self.store.read_events_since(self._events_seen_id, since, batch)
+                    for event_id, ts, route_id, transport_type, operator in events:
+                        self.route_windows.add(route_id, 1, ts)
+                        if transport_type:
+                            self.operator_windows.add((operator or 'unknown', transport_type), 1, ts)
+                            if event_id > self._aggregates_seed_id:
+                                self.operator_aggregates.add(operator, transport_type)
+                        self._events_seen_id = event_id
+                    if len(events) < batch:
+                        break
+            except Exception as e:
+                print(f"Error syncing analytics windows: {e}")
+            self._windows_synced_at = time.time()
+    
+    def get_popular_routes_window(self, minutes: int, limit: int = 10) -> List[Tuple[str, int]]:
+        """Most used routes in the last `minutes` minutes (up to a week)."""
+        self._sync_windows()
+        return self.route_windows.top(minutes * 60, limit)
+    
+    def get_usage_in_window(self, minutes: int) -> int:
+        """Route usage events in the last `minutes` minutes (up to a week)."""
+        self._sync_windows()
+        return self.route_windows.total(minutes * 60)
+    
+    def get_operator_stats_window(self, minutes: int) -> Dict[str, Dict[str, int]]:
+        """Operator statistics for the last `minutes` minutes (up to a week)."""
+        self._sync_windows()
+        stats = defaultdict(dict)
+        for (operator, transport_type), count in self.operator_windows.counts(minutes * 60).items():
+            stats[operator][transport_type] = count
+        return dict(stats)
+    
+    def get_operator_summary(self, minutes: int = None, start: datetime = None, end: datetime = None) -> Dict[str, Any]:
+        """
+        Operator and transport type totals with shares.
+        
+        Lifetime by default; the last `minutes` minutes from the rolling windows;
+        or [start, end) from the hourly buckets in the analytics store.
+        """
+        if start is not None:
+            end = end or datetime.now(timezone.utc)
+            return OperatorAggregates(
+                self.store.load_operator_counts_between(_utc_timestamp(start), _utc_timestamp(end))
+            ).summary()
+        if minutes:
+            return OperatorAggregates(self.get_operator_stats_window(minutes)).summary()
+        self._sync_windows()
+        return self.operator_aggregates.summary()
     
     def analyze_transport_patterns(self, user_travel_data: List[Dict]) -> Dict[str, Any]:
         """Analyze transport patterns from user travel data."""
@@ -1275,10 +1799,13 @@ class RouteAnalytics:
                     predictions.append(('train', 0.8))
         
         # Use learned patterns for additional prediction
-        for transport_type, pattern in self.transport_patterns.items():
-            if pattern.confidence > 0.5:
-                # Simple pattern matching based on confidence
-                predictions.append((transport_type, pattern.confidence * 0.5))
+        if speed_kmh is not None:
+            predictions.extend(self.score_speed(speed_kmh))
+        else:
+            for transport_type, pattern in self.transport_patterns.items():
+                if pattern.confidence > 0.5:
+                    # No speed to compare against, fall back to pattern confidence
+                    predictions.append((transport_type, pattern.confidence * 0.5))
         
         # Combine predictions
         if predictions:
@@ -1292,18 +1819,38 @@ class RouteAnalytics:
         
         return 'unknown', 0.0
     
+    def score_speed(self, speed_kmh: float) -> List[Tuple[str, float]]:
+        """
+        Score speed_kmh against each learned speed distribution.
+        
+        Returns (transport_type, score) where score is the type's share of the
+        combined bin likelihood, scaled by the pattern's confidence.
+        """
+        likelihoods = {
+            transport_type: pattern.speed_profile.density(speed_kmh)
+            for transport_type, pattern in self.transport_patterns.items()
+            if pattern.speed_profile.count >= self._min_profile_samples
+        }
+        total = sum(likelihoods.values())
+        if not total:
+            return []
+        return [
+            (transport_type, likelihood / total * self.transport_patterns[transport_type].confidence)
+            for transport_type, likelihood in likelihoods.items()
+        ]
+    
     def learn_transport_pattern(self, transport_type: str, speed_data: List[float], 
                                stop_frequency: float, route_geometry: str):
         """Learn transport patterns from real usage data."""
         if transport_type not in self.transport_patterns:
-            self.transport_patterns[transport_type] = TransportTypePattern()
+            self.transport_patterns[transport_type] = TransportTypePattern(
+                speed_profile=SpeedHistogram(self._speed_bin_width, self._speed_max)
+            )
         
         pattern = self.transport_patterns[transport_type]
         
         # Update speed profile
-        pattern.speed_profile.extend(speed_data)
-        if len(pattern.speed_profile) > 1000:  # Limit size
-            pattern.speed_profile = pattern.speed_profile[-1000:]
+        pattern.speed_profile.add_many(speed_data)
         
         # Update stop frequency (exponential moving average)
         alpha = 0.1
@@ -1320,30 +1867,70 @@ class RouteAnalytics:
         self._save_transport_pattern(transport_type, pattern)
     
     def _save_transport_pattern(self, transport_type: str, pattern: TransportTypePattern):
-        """Save transport pattern to database."""
-        try:
-            conn = sqlite3.connect(TRANSPORT_PATTERNS_FILE)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO transport_patterns
-                (transport_type, speed_profile, stop_frequency, route_geometry, confidence, sample_count)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                transport_type,
-                pickle.dumps(pattern.speed_profile),
-                pattern.stop_frequency,
-                pattern.route_geometry,
-                pattern.confidence,
-                pattern.sample_count
-            ))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Error saving transport pattern: {e}")
+        """Queue transport pattern for the next batched write."""
+        self.pattern_store.mark_dirty(transport_type, lambda: (
+            pattern.speed_profile.to_bytes(),
+            pattern.stop_frequency,
+            pattern.route_geometry,
+            pattern.confidence,
+            pattern.sample_count
+        ))
+
+def load_trip_records(travel_ids=None, limit=None):
+    """
+    Stored trips joined with their map match, as classifier input dicts
+    (id, user_id, lats, lons, duration, distance, matched_type, matched_ratio).
+    """
+    from misc.db import get_session
+    from misc.models import TravelHistory, TravelMatch
+    from sqlmodel import select
+    from sqlalchemy.orm import undefer
+    
+    statement = select(TravelHistory, TravelMatch).options(
+        undefer(TravelHistory.listLatitude), undefer(TravelHistory.listLongitude)
+    ).join(
+        TravelMatch, TravelMatch.travel_id == TravelHistory.id, isouter=True
+    )
+    if travel_ids is not None:
+        statement = statement.where(TravelHistory.id.in_(travel_ids))
+    statement = statement.order_by(TravelHistory.id)
+    if limit:
+        statement = statement.limit(limit)
+    
+    with get_session() as session:
+        return [
+            {
+                "id": trip.id,
+                "user_id": trip.user_id,
+                "lats": trip.listLatitude or [],
+                "lons": trip.listLongitude or [],
+                "duration": trip.duration,
+                "distance": trip.distance,
+                "matched_type": match.primary_transport_type if match else None,
+                "matched_ratio": match.matched_ratio if match else 0.0,
+            }
+            for trip, match in session.exec(statement).all()
+        ]
 
 # Global analytics instance
 route_analytics = RouteAnalytics()
 
+# Offline matcher for completed trips
+_map_matching_cfg = config.config.get('mapMatching', {})
+map_matcher = MapMatcher(
+    route_manager,
+    DEGREES_TO_METERS,
+    transport_predictor=lambda lat, lon, speed_kmh: route_analytics.predict_transport_type(lat, lon, speed_kmh),
+    on_matched=reassign_trip_mode,
+    config=MapMatchingConfig(
+        search_radius_meters=_map_matching_cfg.get('searchRadiusMeters', 50.0),
+        sigma_meters=_map_matching_cfg.get('sigmaMeters', 15.0),
+        switch_penalty=_map_matching_cfg.get('switchPenalty', 8.0),
+        max_points=_map_matching_cfg.get('maxPoints', 500),
+        workers=_map_matching_cfg.get('workers', 2),
+    )
+)
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two points using Haversine formula."""
     import math
@@ -1360,16 +1947,13 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     
     return r * c
 
-def gpsinput(user, lat, lon):
-    return is_user_on_any_nearby_route(lat, lon)
-
 def get_user_points(user_id):
     """Get user's current points from the database"""
-    from misc.db import get_session
+    from misc import db
     from misc.models import User
-    from sqlmodel import select
+    from sqlmodel import Session, select
     
-    with get_session() as session:
+    with Session(db.read_engine) as session:
         user = session.exec(select(User).where(User.id == int(user_id))).first()
         if user:
             return user.points
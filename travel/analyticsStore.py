@@ -0,0 +1,382 @@
+"""
+Append-only analytics event log with incremental SQLite counters.
+
+Route usage and operator events are buffered in memory and flushed on a timer
+(or when the buffer fills) in one transaction over a long-lived connection:
+
+    analytics_events      append-only log, one row per event batch entry
+    route_usage_counts    route_id -> count, UPSERT increments
+    operator_counts       (operator, transport_type) -> count, UPSERT increments
+    operator_hourly_counts  the same per UTC hour, for today / this week / custom ranges
+    route_info            small per-route metadata (JSON)
+    materialized_views    prebuilt read models (e.g. the dashboard) shared by all workers
+
+A flush costs one INSERT plus one UPSERT per distinct key in the batch, so
+persistence cost per event stays constant however much history exists.
+Compaction prunes events past the retention window; the counters keep the
+totals. Startup reads the counter tables instead of replaying the log.
+
+The file is opened (and created) on first use, so importing the module or
+constructing a store touches nothing on disk.
+
+Every worker process opens the same file and only ever adds deltas, so the
+counter tables are the merged, cross-worker truth. Readers combine them with
+their own not-yet-flushed deltas (merged_snapshot).
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+ROUTE_USAGE = "route_usage"
+
+class AnalyticsStore:
+    """Batched writer and aggregate reader for the analytics SQLite file"""
+
+    def __init__(self, path: str, flush_interval: float = 5.0, max_batch: int = 1000,
+                 retention_days: float = 8, compact_interval: float = 3600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.retention_seconds = retention_days * 86400
+        self.compact_interval = compact_interval
+
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._pending_events: List[Tuple[float, str, str, Optional[str], Optional[str]]] = []
+        self._pending_routes = Counter()
+        self._pending_operators = Counter()
+        self._pending_operator_hours = Counter()
+        self._last_compaction = time.time()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+        # One connection for the life of the process, shared by the flusher and readers
+        self._connection: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The store's connection, opened (and the file created) on first use"""
+        if self._connection is None:
+            with self._open_lock:
+                if self._connection is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    self._create_tables(conn)
+                    self._connection = conn
+        return self._connection
+
+    def exists(self) -> bool:
+        """Whether the store file has been created yet"""
+        return self._connection is not None or os.path.exists(self.path)
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection):
+        # Runs before the connection is shared, so no _db_lock
+        with conn:
+            has_hourly = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'operator_hourly_counts'"
+            ).fetchone() is not None
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS analytics_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    kind TEXT NOT NULL,
+                    route_id TEXT,
+                    transport_type TEXT,
+                    operator TEXT
+                );
+                CREATE INDEX IF NOT EXISTS ix_analytics_events_ts ON analytics_events (ts);
+                CREATE TABLE IF NOT EXISTS route_usage_counts (
+                    route_id TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS ix_route_usage_counts_count ON route_usage_counts (count);
+                CREATE TABLE IF NOT EXISTS operator_counts (
+                    operator TEXT NOT NULL,
+                    transport_type TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (operator, transport_type)
+                );
+                CREATE TABLE IF NOT EXISTS operator_hourly_counts (
+                    hour INTEGER NOT NULL,
+                    operator TEXT NOT NULL,
+                    transport_type TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (hour, operator, transport_type)
+                );
+                CREATE TABLE IF NOT EXISTS route_info (
+                    route_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS materialized_views (
+                    name TEXT PRIMARY KEY,
+                    built_at REAL NOT NULL DEFAULT 0,
+                    etag TEXT,
+                    payload TEXT,
+                    lease_until REAL NOT NULL DEFAULT 0
+                );
+            ''')
+            if not has_hourly:
+                # Seed hourly buckets from whatever the retained event log still covers
+                conn.execute('''
+                    INSERT INTO operator_hourly_counts (hour, operator, transport_type, count)
+                    SELECT CAST(ts / 3600 AS INTEGER), COALESCE(operator, 'unknown'), transport_type, COUNT(*)
+                    FROM analytics_events WHERE kind = ? AND transport_type IS NOT NULL
+                    GROUP BY 1, 2, 3
+                ''', (ROUTE_USAGE,))
+
+    # --- writes ---
+
+    def record_route_usage(self, route_id: str, transport_type: Optional[str] = None,
+                           operator: Optional[str] = None, timestamp: Optional[float] = None):
+        """Buffer one usage event; O(1), the DB is touched by the next flush"""
+        with self._lock:
+            self._pending_events.append((timestamp or time.time(), ROUTE_USAGE, route_id, transport_type, operator))
+            self._pending_routes[route_id] += 1
+            if transport_type:
+                self._pending_operators[(operator or 'unknown', transport_type)] += 1
+                self._pending_operator_hours[(int((timestamp or time.time()) // 3600), operator or 'unknown', transport_type)] += 1
+            full = len(self._pending_events) >= self.max_batch
+        self._ensure_flusher()
+        if full:
+            self.flush()
+
+    def add_counts(self, route_counts: Dict[str, int], operator_counts: Dict[Tuple[str, str], int]):
+        """Fold pre-aggregated counts (e.g. a legacy cache) straight into the counters"""
+        with self._db_lock, self._conn:
+            self._upsert_counts(route_counts, operator_counts)
+
+    def save_route_info(self, entries: Dict[str, dict]):
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO route_info (route_id, data) VALUES (?, ?) "
+                "ON CONFLICT(route_id) DO UPDATE SET data = excluded.data",
+                [(route_id, json.dumps(data, default=str)) for route_id, data in entries.items()]
+            )
+
+    def _upsert_counts(self, route_counts, operator_counts):
+        self._conn.executemany(
+            "INSERT INTO route_usage_counts (route_id, count) VALUES (?, ?) "
+            "ON CONFLICT(route_id) DO UPDATE SET count = count + excluded.count",
+            list(route_counts.items())
+        )
+        self._conn.executemany(
+            "INSERT INTO operator_counts (operator, transport_type, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(operator, transport_type) DO UPDATE SET count = count + excluded.count",
+            [(operator, transport_type, count) for (operator, transport_type), count in operator_counts.items()]
+        )
+
+    def flush(self):
+        """Write buffered events and counter deltas in a single transaction"""
+        with self._lock:
+            events, self._pending_events = self._pending_events, []
+            routes, self._pending_routes = self._pending_routes, Counter()
+            operators, self._pending_operators = self._pending_operators, Counter()
+            operator_hours, self._pending_operator_hours = self._pending_operator_hours, Counter()
+        if not events:
+            return 0
+
+        try:
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO analytics_events (ts, kind, route_id, transport_type, operator) VALUES (?, ?, ?, ?, ?)",
+                    events
+                )
+                self._upsert_counts(routes, operators)
+                self._conn.executemany(
+                    "INSERT INTO operator_hourly_counts (hour, operator, transport_type, count) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(hour, operator, transport_type) DO UPDATE SET count = count + excluded.count",
+                    [key + (count,) for key, count in operator_hours.items()]
+                )
+        except sqlite3.Error as e:
+            print(f"Analytics flush failed, keeping {len(events)} events for retry: {e}")
+            with self._lock:
+                self._pending_events[:0] = events
+                self._pending_routes.update(routes)
+                self._pending_operators.update(operators)
+                self._pending_operator_hours.update(operator_hours)
+            return 0
+        return len(events)
+
+    def compact(self, now: Optional[float] = None):
+        """Drop log rows past the retention window; counters already hold their totals"""
+        cutoff = (now or time.time()) - self.retention_seconds
+        with self._db_lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM analytics_events WHERE ts < ?", (cutoff,)).rowcount
+        self._last_compaction = time.time()
+        return deleted
+
+    # --- background flushing ---
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="analytics-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - self._last_compaction >= self.compact_interval:
+                    self.compact()
+            except Exception as e:
+                print(f"Analytics flusher error: {e}")
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        try:
+            self.flush()
+            with self._db_lock:
+                if self._connection is not None:
+                    self._connection.close()
+        except Exception as e:
+            print(f"Error closing analytics store: {e}")
+
+    # --- reads ---
+
+    def load_route_counts(self, limit: Optional[int] = None) -> Tuple[Dict[str, int], int]:
+        """(top route counts, total events) from the counter table"""
+        with self._db_lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM route_usage_counts").fetchone()[0]
+            query = "SELECT route_id, count FROM route_usage_counts ORDER BY count DESC"
+            rows = self._conn.execute(query + " LIMIT ?", (limit,)) if limit else self._conn.execute(query)
+            return dict(rows.fetchall()), total
+
+    def load_operator_counts(self) -> Dict[str, Dict[str, int]]:
+        with self._db_lock:
+            rows = self._conn.execute("SELECT operator, transport_type, count FROM operator_counts").fetchall()
+        stats = {}
+        for operator, transport_type, count in rows:
+            stats.setdefault(operator, {})[transport_type] = count
+        return stats
+
+    def load_operator_snapshot(self) -> Tuple[Dict[str, Dict[str, int]], int]:
+        """Lifetime operator counts and the id of the last event they include, read consistently"""
+        with self._db_lock, self._conn:
+            # Counters and events are written in the same flush transaction
+            self._conn.execute("BEGIN")
+            rows = self._conn.execute("SELECT operator, transport_type, count FROM operator_counts").fetchall()
+            last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM analytics_events").fetchone()[0]
+        stats = {}
+        for operator, transport_type, count in rows:
+            stats.setdefault(operator, {})[transport_type] = count
+        return stats, last_id
+
+    def load_operator_counts_between(self, start_ts: float, end_ts: float) -> Dict[str, Dict[str, int]]:
+        """Operator counts for [start_ts, end_ts), summed from hourly buckets (whole hours at the edges)"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT operator, transport_type, SUM(count) FROM operator_hourly_counts "
+                "WHERE hour >= ? AND hour <= ? GROUP BY operator, transport_type",
+                (int(start_ts // 3600), int((end_ts - 1e-6) // 3600))
+            ).fetchall()
+        stats = {}
+        for operator, transport_type, count in rows:
+            stats.setdefault(operator, {})[transport_type] = count
+        return stats
+
+    def load_route_info(self) -> Dict[str, dict]:
+        with self._db_lock:
+            rows = self._conn.execute("SELECT route_id, data FROM route_info").fetchall()
+        return {route_id: json.loads(data) for route_id, data in rows}
+
+    def read_events_since(self, last_id: int, since_ts: float = 0, limit: int = 50000) -> List[tuple]:
+        """Flushed route usage events (id, ts, route_id, transport_type, operator) after last_id, from all workers"""
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT id, ts, route_id, transport_type, operator FROM analytics_events "
+                "WHERE id > ? AND ts >= ? AND kind = ? ORDER BY id LIMIT ?",
+                (last_id, since_ts, ROUTE_USAGE, limit)
+            ).fetchall()
+
+    def count_routes(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM route_usage_counts").fetchone()[0]
+
+    def pending_counts(self) -> Tuple[Counter, Counter]:
+        """Copies of this process's unflushed route and operator deltas"""
+        with self._lock:
+            return Counter(self._pending_routes), Counter(self._pending_operators)
+
+    def merged_snapshot(self, limit: int) -> dict:
+        """
+        Cross-worker totals: the shared counter tables plus this process's
+        pending deltas. Other workers' pending deltas show up after their next
+        flush, at most flush_interval later.
+        """
+        pending_routes, pending_operators = self.pending_counts()
+        # Pending keys can push stored routes out of the top, read enough to re-rank
+        stored, total = self.load_route_counts(limit + len(pending_routes))
+        stored_ids = set(stored)
+        distinct = self.count_routes()
+
+        merged = Counter(stored)
+        for route_id, count in pending_routes.items():
+            merged[route_id] += count
+        new_ids = [route_id for route_id in pending_routes if route_id not in stored_ids]
+        if new_ids:
+            with self._db_lock:
+                placeholders = ",".join("?" * len(new_ids))
+                known = self._conn.execute(
+                    f"SELECT route_id, count FROM route_usage_counts WHERE route_id IN ({placeholders})", new_ids
+                ).fetchall()
+            for route_id, count in known:
+                merged[route_id] += count
+            distinct += len(new_ids) - len(known)
+
+        operators = self.load_operator_counts()
+        for (operator, transport_type), count in pending_operators.items():
+            types = operators.setdefault(operator, {})
+            types[transport_type] = types.get(transport_type, 0) + count
+
+        return {
+            "top": merged.most_common(limit),
+            "total": total + sum(pending_routes.values()),
+            "distinct": distinct,
+            "operators": operators,
+        }
+
+    def load_view(self, name: str) -> Optional[Tuple[float, str, str]]:
+        """(built_at, etag, payload JSON) of a materialized view, None if never built"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT built_at, etag, payload FROM materialized_views WHERE name = ? AND payload IS NOT NULL",
+                (name,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def claim_view(self, name: str, lease_seconds: float, now: Optional[float] = None) -> bool:
+        """Take the rebuild lease for a view; False while another worker holds it"""
+        now = now or time.time()
+        with self._db_lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO materialized_views (name, lease_until) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET lease_until = excluded.lease_until "
+                "WHERE materialized_views.lease_until < ?",
+                (name, now + lease_seconds, now)
+            )
+            return cursor.rowcount == 1
+
+    def save_view(self, name: str, built_at: float, etag: str, payload: str):
+        """Publish a rebuilt view and release the lease"""
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "UPDATE materialized_views SET built_at = ?, etag = ?, payload = ?, lease_until = 0 WHERE name = ?",
+                (built_at, etag, payload, name)
+            )
+
+    def is_empty(self) -> bool:
+        with self._db_lock:
+            return self._conn.execute("SELECT 1 FROM route_usage_counts LIMIT 1").fetchone() is None
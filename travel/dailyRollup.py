@@ -0,0 +1,183 @@
+"""
+Per-user daily travel rollup (UserDailyTravel) behind the travel stats.
+
+Each finished trip is folded into one (user, day, mode) row with UPSERT
+increments, in the same transaction that closes the trip. Every row also
+records the highest TravelHistory id folded in; trips above that watermark
+(the open trip, or anything not rolled up yet) are read directly. Stats for
+any window are therefore one sum over at most a few hundred small rows plus
+a handful of recent trips, and never touch the coordinate columns.
+
+The same buckets are the per-mode hours behind UserHours responses and the
+hours leaderboards: daily, weekly and monthly values are bucket sums over the
+period, so nothing has to be reset when a period rolls over.
+
+Days are UTC days of the trip start, so windows are aligned to whole days.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, delete, func
+from sqlmodel import select
+
+from misc.models import TravelHistory, TravelMatch, User, UserDailyTravel
+
+MIN_STATS_TRIP_SECONDS = 120  # shorter trips are not counted in stats
+
+def _insert_for(session):
+    """INSERT construct with ON CONFLICT support for the session's database"""
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def add_to_rollup(session, user_id: int, day, mode: str, trips: int, seconds: float, km: float, travel_id: int = 0):
+    """Atomically add deltas to one (user, day, mode) row"""
+    table = UserDailyTravel.__table__
+    statement = _insert_for(session)(table).values(
+        user_id=user_id, day=day, mode=mode, trips=trips, seconds=seconds, km=km, last_travel_id=travel_id
+    )
+    excluded = statement.excluded
+    session.exec(statement.on_conflict_do_update(
+        index_elements=["user_id", "day", "mode"],
+        set_={
+            "trips": table.c.trips + excluded.trips,
+            "seconds": table.c.seconds + excluded.seconds,
+            "km": table.c.km + excluded.km,
+            "last_travel_id": case(
+                (excluded.last_travel_id > table.c.last_travel_id, excluded.last_travel_id),
+                else_=table.c.last_travel_id
+            ),
+        }
+    ))
+
+def rollup_closed_trip(session, user_id: int, travel_id: int, started_at: datetime, seconds: float, km: float):
+    """Fold a finished trip into the rollup; caller commits. Returns whether it counted"""
+    if seconds <= MIN_STATS_TRIP_SECONDS:
+        return False
+    _lock_user(session, user_id)
+    # A trip at or below the watermark is already folded in, never count it twice
+    if travel_id <= session.exec(_watermark(user_id)).one():
+        return False
+    match = session.exec(select(TravelMatch.primary_transport_type).where(TravelMatch.travel_id == travel_id)).first()
+    add_to_rollup(session, user_id, started_at.date(), match or "unknown", 1, seconds, km, travel_id)
+    return True
+
+def reassign_trip_mode(session, travel: TravelHistory, old_mode: Optional[str], new_mode: str):
+    """Move a rolled-up trip to its map-matched mode; caller commits"""
+    old_mode = old_mode or "unknown"
+    if old_mode == new_mode or travel.duration <= MIN_STATS_TRIP_SECONDS:
+        return
+    if travel.id > session.exec(_watermark(travel.user_id)).one():
+        return  # not rolled up yet, it will be folded in with its mode
+    day = travel.timestamp.date()
+    add_to_rollup(session, travel.user_id, day, old_mode, -1, -travel.duration, -travel.distance)
+    add_to_rollup(session, travel.user_id, day, new_mode, 1, travel.duration, travel.distance)
+
+def _watermark(user_id: int):
+    return select(func.coalesce(func.max(UserDailyTravel.last_travel_id), 0)).where(
+        UserDailyTravel.user_id == user_id
+    )
+
+def stats_statements(user_id: int, start: Optional[datetime]):
+    """
+    (rollup totals, trips above the watermark) statements for a stats window
+    starting at `start` (None for all time).
+    """
+    rollup = select(
+        func.coalesce(func.sum(UserDailyTravel.trips), 0),
+        func.coalesce(func.sum(UserDailyTravel.seconds), 0.0),
+        func.coalesce(func.sum(UserDailyTravel.km), 0.0),
+    ).where(UserDailyTravel.user_id == user_id)
+    recent = select(TravelHistory.duration, TravelHistory.distance).where(
+        TravelHistory.user_id == user_id,
+        TravelHistory.duration > MIN_STATS_TRIP_SECONDS,
+        TravelHistory.id > _watermark(user_id).scalar_subquery(),
+    )
+    if start is not None:
+        rollup = rollup.where(UserDailyTravel.day >= start.date())
+        recent = recent.where(TravelHistory.timestamp >= start)
+    return rollup, recent
+
+# UserHours transport groups; rollup modes outside them only count towards the total
+HOURS_GROUPS = {"bus": ("bus",), "train": ("train", "tram", "metro"), "ferry": ("ferry",)}
+HOURS_PERIODS = ("daily", "weekly", "monthly")
+
+def hours_statement(user_id: int, period_starts: dict):
+    """Per-mode seconds for all time and for each period, in one pass over the user's buckets"""
+    return select(
+        UserDailyTravel.mode,
+        func.sum(UserDailyTravel.seconds),
+        *[func.sum(case((UserDailyTravel.day >= period_starts[period], UserDailyTravel.seconds), else_=0.0))
+          for period in HOURS_PERIODS],
+    ).where(UserDailyTravel.user_id == user_id).group_by(UserDailyTravel.mode)
+
+def summarize_hours(rows) -> dict:
+    """{"total"|group: {"total", "daily", "weekly", "monthly"}} in hours from hours_statement rows"""
+    hours = {group: dict.fromkeys(("total",) + HOURS_PERIODS, 0.0) for group in ("total",) + tuple(HOURS_GROUPS)}
+    group_of = {mode: group for group, modes in HOURS_GROUPS.items() for mode in modes}
+    for mode, *seconds in rows:
+        targets = [hours["total"]] + ([hours[group_of[mode]]] if mode in group_of else [])
+        for target in targets:
+            for key, value in zip(("total",) + HOURS_PERIODS, seconds):
+                target[key] += (value or 0) / 3600
+    return hours
+
+def hours_leaderboard_statement(start_day=None, limit: Optional[int] = None):
+    """(user_id, seconds) ranked by travel time since start_day (all time for None)"""
+    seconds = func.sum(UserDailyTravel.seconds).label("seconds")
+    statement = select(UserDailyTravel.user_id, seconds).group_by(UserDailyTravel.user_id)
+    if start_day is not None:
+        statement = statement.where(UserDailyTravel.day >= start_day)
+    statement = statement.order_by(seconds.desc(), UserDailyTravel.user_id)
+    if limit:
+        statement = statement.limit(limit)
+    return statement
+
+def _lock_user(session, user_id: int):
+    """
+    Serialise rollup writers of one user: a row lock on PostgreSQL, SQLite
+    already allows a single writer (FOR UPDATE is dropped there).
+    """
+    session.exec(select(User.id).where(User.id == user_id).with_for_update()).first()
+
+def rebuild_rollups(session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the rollup from ended TravelHistory rows (scalar columns only)
+    for the given users, or everyone. Open trips are left to the live path.
+
+    Each user is rebuilt in its own transaction under the same lock
+    rollup_closed_trip takes, so a trip closing meanwhile is either already
+    ended here or lands above the new watermark and is folded in live.
+    Returns the number of rollup rows written.
+    """
+    if user_ids is None:
+        user_ids = set(session.exec(select(TravelHistory.user_id).distinct()).all())
+        user_ids.update(session.exec(select(UserDailyTravel.user_id).distinct()).all())
+    written = 0
+    for user_id in sorted(user_ids):
+        _lock_user(session, user_id)
+        session.exec(delete(UserDailyTravel).where(UserDailyTravel.user_id == user_id))
+        statement = select(
+            TravelHistory.id, TravelHistory.timestamp, TravelHistory.duration,
+            TravelHistory.distance, TravelMatch.primary_transport_type,
+        ).join(TravelMatch, TravelMatch.travel_id == TravelHistory.id, isouter=True).where(
+            TravelHistory.user_id == user_id,
+            TravelHistory.ended == True,
+            TravelHistory.duration > MIN_STATS_TRIP_SECONDS,
+        )
+        totals = defaultdict(lambda: [0, 0.0, 0.0, 0])
+        for travel_id, started_at, duration, distance, mode in session.exec(statement):
+            row = totals[(started_at.date(), mode or "unknown")]
+            row[0] += 1
+            row[1] += duration
+            row[2] += distance
+            row[3] = max(row[3], travel_id)
+        for (day, mode), (trips, seconds, km, last_travel_id) in totals.items():
+            session.add(UserDailyTravel(user_id=user_id, day=day, mode=mode, trips=trips,
+                                        seconds=seconds, km=km, last_travel_id=last_travel_id))
+        session.commit()
+        written += len(totals)
+    return written
@@ -0,0 +1,89 @@
+"""
+Bounded streaming top-k counter (Space-Saving, Metwally et al.).
+
+At most `capacity` keys are tracked. A new key arriving at a full table
+replaces the key with the smallest count and inherits that count as its
+error bound. Any key seen more than total / capacity times is guaranteed to
+be tracked, and the sum of all counts always equals the number of events.
+
+A min-heap with lazy invalidation finds the eviction victim, so an update
+costs amortised O(log k) and memory stays O(k) however many distinct keys
+the stream contains.
+"""
+import heapq
+import threading
+from typing import Dict, List, Tuple
+
+class SpaceSaving:
+    """Approximate heavy hitters over an unbounded key stream"""
+
+    def __init__(self, capacity: int = 500):
+        self.capacity = max(1, capacity)
+        self.total = 0
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, key: str, count: int = 1):
+        with self._lock:
+            self.total += count
+            if key in self._counts:
+                self._counts[key] += count
+            elif len(self._counts) < self.capacity:
+                self._counts[key] = count
+                self._errors[key] = 0
+            else:
+                min_count, min_key = self._pop_min()
+                del self._counts[min_key]
+                del self._errors[min_key]
+                self._counts[key] = min_count + count
+                self._errors[key] = min_count
+
+            heapq.heappush(self._heap, (self._counts[key], key))
+            # Stale heap entries pile up on hot keys, rebuild before they dominate
+            if len(self._heap) > 4 * self.capacity:
+                self._rebuild_heap()
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                return count, key
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """The `limit` most frequent keys as (key, count), highest first"""
+        with self._lock:
+            return heapq.nlargest(limit, self._counts.items(), key=lambda item: item[1])
+
+    def error(self, key: str) -> int:
+        """Upper bound on how much the count of key is overestimated"""
+        return self._errors.get(key, 0)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"capacity": self.capacity, "total": self.total,
+                    "counts": dict(self._counts), "errors": dict(self._errors)}
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int = None) -> "SpaceSaving":
+        sketch = cls(capacity or data.get("capacity", 500))
+        # Keep the largest entries if the capacity shrank
+        kept = heapq.nlargest(sketch.capacity, data.get("counts", {}).items(), key=lambda item: item[1])
+        for key, count in kept:
+            sketch._counts[key] = count
+            sketch._errors[key] = data.get("errors", {}).get(key, 0)
+        sketch.total = data.get("total", sum(sketch._counts.values()))
+        sketch._rebuild_heap()
+        return sketch
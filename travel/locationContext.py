@@ -0,0 +1,88 @@
+"""
+Per-location context shared by everything that asks "what is around this point".
+
+A LocationContext bundles the nearby route candidates, the on-route flag, the
+nearest route and its transport type, all derived from a single spatial
+index query. Contexts are cached in a small LRU keyed by a quantised
+coordinate cell: users riding the same corridor hit the same cells, so most
+pings skip the geometry entirely. Contexts are computed at the cell centre,
+which keeps cached answers independent of which ping filled the cell.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+@dataclass
+class LocationContext:
+    """Everything the tracking path needs to know about one location"""
+    latitude: float
+    longitude: float
+    candidates: List[Tuple[int, float]] = field(default_factory=list)  # (route index, distance in meters)
+    on_route: bool = False
+    nearest_route_index: Optional[int] = None
+    nearest_route_id: Optional[str] = None
+    nearest_distance_m: Optional[float] = None
+    operator: str = "unknown"
+    transport_type: str = "unknown"
+    transport_confidence: float = 0.0
+
+class LocationContextCache:
+    """Thread-safe LRU of LocationContext objects keyed by coordinate cell"""
+
+    def __init__(self, builder: Callable[[float, float], LocationContext],
+                 cell_meters: float = 5.0, max_entries: int = 10000, degrees_to_meters: float = 111139):
+        self.builder = builder
+        self.cell_degrees = cell_meters / degrees_to_meters
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], LocationContext]" = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return round(lat / self.cell_degrees), round(lon / self.cell_degrees)
+
+    def get(self, lat: float, lon: float, generation=None) -> LocationContext:
+        """
+        Context of the cell containing (lat, lon).
+
+        generation identifies the loaded route set; a change drops every entry.
+        """
+        key = self.cell(lat, lon)
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+            context = self._entries.get(key)
+            if context is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return context
+            self.misses += 1
+
+        # Build outside the lock, a duplicate build for a hot cell is harmless
+        context = self.builder(key[0] * self.cell_degrees, key[1] * self.cell_degrees)
+
+        with self._lock:
+            self._entries[key] = context
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return context
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0,
+            }
@@ -0,0 +1,206 @@
+"""
+Offline map-matching of completed trips.
+
+The live path only knows whether a user is near *some* route. Once a trip is
+closed, its recorded points are matched to the routes actually ridden with a
+Hidden Markov Model:
+
+    states        candidate routes within search_radius_meters of each point,
+                  plus an "unmatched" state for gaps (walking, missing routes)
+    emission      Gaussian in the point-to-route distance
+    transition    free on the same route, switch_penalty for changing route
+
+Viterbi picks the most likely route sequence, consecutive points on the same
+route form a leg. Matching runs on a small worker pool off the request path
+and the result is stored as a TravelMatch row.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from shapely.geometry import Point
+
+from .sessionEngine import _haversine_km
+
+UNMATCHED = None
+
+@dataclass
+class MapMatchingConfig:
+    """Model parameters for the trip matcher"""
+    search_radius_meters: float = 50.0   # routes further away are not candidates
+    sigma_meters: float = 15.0           # GPS noise
+    switch_penalty: float = 8.0          # log-probability cost of changing route
+    max_points: int = 500                # longer trips are evenly subsampled
+    workers: int = 2
+
+class MapMatcher:
+    """HMM/Viterbi matcher over the route spatial index"""
+
+    def __init__(self, route_manager, degrees_to_meters: float,
+                 transport_predictor: Optional[Callable] = None,
+                 config: Optional[MapMatchingConfig] = None,
+                 on_matched: Optional[Callable] = None):
+        self.route_manager = route_manager
+        self.degrees_to_meters = degrees_to_meters
+        self.transport_predictor = transport_predictor
+        self.config = config or MapMatchingConfig()
+        # on_matched(session, travel, previous_type, new_type) runs in the match transaction
+        self.on_matched = on_matched
+        self._pool = None
+
+    def _emission(self, distance_m: float) -> float:
+        return -0.5 * (distance_m / self.config.sigma_meters) ** 2
+
+    def _transition(self, prev, state) -> float:
+        if prev == state:
+            return 0.0
+        if prev is UNMATCHED or state is UNMATCHED:
+            return -self.config.switch_penalty / 2
+        return -self.config.switch_penalty
+
+    def _candidates(self, lat: float, lon: float) -> Dict[Optional[int], float]:
+        """Emission log-probabilities of every state at one point"""
+        radius = self.config.search_radius_meters
+        point = Point(lat, lon)
+        states = {UNMATCHED: self._emission(radius)}
+        for route_idx, route in self.route_manager.get_route_candidates(lat, lon, radius):
+            distance_m = route.distance(point) * self.degrees_to_meters
+            if distance_m <= radius:
+                states[route_idx] = self._emission(distance_m)
+        return states
+
+    def viterbi(self, latitudes: List[float], longitudes: List[float]) -> List[Optional[int]]:
+        """Most likely route index per point, None where no route fits"""
+        if not latitudes:
+            return []
+
+        scores = self._candidates(latitudes[0], longitudes[0])
+        back_pointers = []
+        for lat, lon in zip(latitudes[1:], longitudes[1:]):
+            emissions = self._candidates(lat, lon)
+            step_scores, step_back = {}, {}
+            for state, emission in emissions.items():
+                prev, best = max(
+                    ((p, score + self._transition(p, state)) for p, score in scores.items()),
+                    key=lambda item: item[1]
+                )
+                step_scores[state] = best + emission
+                step_back[state] = prev
+            scores = step_scores
+            back_pointers.append(step_back)
+
+        state = max(scores.items(), key=lambda item: item[1])[0]
+        path = [state]
+        for step_back in reversed(back_pointers):
+            state = step_back[state]
+            path.append(state)
+        path.reverse()
+        return path
+
+    def match(self, latitudes: List[float], longitudes: List[float], avg_speed_kmh: Optional[float] = None) -> dict:
+        """Match a point sequence; returns route_ids, legs, primary_transport_type and matched_ratio"""
+        latitudes, longitudes = self._subsample(latitudes, longitudes)
+        path = self.viterbi(latitudes, longitudes)
+
+        legs = []
+        start = 0
+        for i in range(1, len(path) + 1):
+            if i == len(path) or path[i] != path[start]:
+                legs.append(self._build_leg(path[start], latitudes, longitudes, start, i - 1, avg_speed_kmh))
+                start = i
+
+        route_ids = []
+        for leg in legs:
+            if leg["route_id"] and leg["route_id"] not in route_ids:
+                route_ids.append(leg["route_id"])
+
+        matched_points = sum(leg["end_index"] - leg["start_index"] + 1 for leg in legs if leg["route_id"])
+        distance_by_type = {}
+        for leg in legs:
+            if leg["route_id"]:
+                distance_by_type[leg["transport_type"]] = distance_by_type.get(leg["transport_type"], 0.0) + leg["distance_km"]
+
+        return {
+            "route_ids": route_ids,
+            "legs": legs,
+            "primary_transport_type": max(distance_by_type.items(), key=lambda item: item[1])[0] if distance_by_type else "unknown",
+            "matched_ratio": round(matched_points / len(path), 3) if path else 0.0,
+        }
+
+    def _subsample(self, latitudes, longitudes) -> Tuple[List[float], List[float]]:
+        if len(latitudes) <= self.config.max_points:
+            return list(latitudes), list(longitudes)
+        step = len(latitudes) / self.config.max_points
+        indices = [int(i * step) for i in range(self.config.max_points - 1)] + [len(latitudes) - 1]
+        return [latitudes[i] for i in indices], [longitudes[i] for i in indices]
+
+    def _build_leg(self, route_idx, latitudes, longitudes, start, end, avg_speed_kmh) -> dict:
+        distance_km = sum(
+            _haversine_km(latitudes[i - 1], longitudes[i - 1], latitudes[i], longitudes[i])
+            for i in range(start + 1, end + 1)
+        )
+        if route_idx is UNMATCHED:
+            return {"route_id": None, "transport_type": "unknown", "start_index": start,
+                    "end_index": end, "distance_km": round(distance_km, 3)}
+
+        info = self.route_manager.get_route_info(route_idx)
+        transport_type = info.get("transport_type", "unknown")
+        if transport_type == "unknown" and self.transport_predictor:
+            middle = (start + end) // 2
+            transport_type = self.transport_predictor(latitudes[middle], longitudes[middle], avg_speed_kmh)[0]
+
+        return {"route_id": info["route_id"], "transport_type": transport_type, "start_index": start,
+                "end_index": end, "distance_km": round(distance_km, 3)}
+
+    def match_travel(self, travel_id: int) -> Optional[dict]:
+        """Match one stored trip and upsert its TravelMatch row"""
+        from misc.db import get_session
+        from misc.models import TravelHistory, TravelMatch
+        from sqlmodel import select
+        from sqlalchemy.orm import undefer
+
+        with get_session() as session:
+            travel = session.get(TravelHistory, travel_id, options=[
+                undefer(TravelHistory.listLatitude), undefer(TravelHistory.listLongitude)
+            ])
+            if not travel or not travel.listLatitude:
+                return None
+
+            avg_speed_kmh = None
+            if travel.duration and travel.distance:
+                avg_speed_kmh = travel.distance / (travel.duration / 3600)
+            result = self.match(travel.listLatitude, travel.listLongitude or [], avg_speed_kmh)
+
+            match = session.exec(select(TravelMatch).where(TravelMatch.travel_id == travel_id)).first()
+            if match is None:
+                match = TravelMatch(travel_id=travel_id, user_id=travel.user_id)
+            previous_type = match.primary_transport_type
+            match.route_ids = result["route_ids"]
+            match.legs = result["legs"]
+            match.primary_transport_type = result["primary_transport_type"]
+            match.matched_ratio = result["matched_ratio"]
+            match.matched_at = datetime.utcnow()
+            session.add(match)
+            if self.on_matched is not None:
+                self.on_matched(session, travel, previous_type, match.primary_transport_type)
+            session.commit()
+            return result
+
+    def _run(self, travel_id: int):
+        try:
+            return self.match_travel(travel_id)
+        except Exception as e:
+            print(f"Map matching failed for travel {travel_id}: {e}")
+            return None
+
+    def submit(self, travel_id: int):
+        """Queue a completed trip for matching on the worker pool"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="map-match")
+        return self._pool.submit(self._run, travel_id)
+
+    def match_many(self, travel_ids: List[int]) -> int:
+        """Match trips on the worker pool and wait; returns how many were matched"""
+        futures = [self.submit(travel_id) for travel_id in travel_ids]
+        return sum(1 for future in futures if future.result() is not None)
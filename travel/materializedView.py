@@ -0,0 +1,129 @@
+"""
+Periodically rebuilt read models served with stale-while-revalidate.
+
+A MaterializedView wraps an expensive builder (e.g. the analytics dashboard).
+A background thread rebuilds it every refresh_interval, so the build cost
+depends on the schedule, not on how many requests arrive. Requests always get
+the last snapshot immediately; a stale one also wakes the refresher.
+
+Snapshots are published to the shared analytics store. A worker whose
+snapshot is due first adopts a fresh shared copy if another worker already
+built one, and otherwise takes a short lease and rebuilds it, so every worker
+serves the same payload and ETag.
+"""
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+@dataclass
+class ViewSnapshot:
+    payload: Any
+    etag: str
+    built_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.built_at
+
+def make_etag(payload_json: str) -> str:
+    return '"' + hashlib.sha1(payload_json.encode()).hexdigest()[:20] + '"'
+
+class MaterializedView:
+    """A builder's output, rebuilt on a schedule and shared through an AnalyticsStore"""
+
+    def __init__(self, name: str, builder: Callable[[], Any], store=None,
+                 refresh_interval: float = 60, lease_seconds: Optional[float] = None):
+        self.name = name
+        self.builder = builder
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self.lease_seconds = lease_seconds or max(refresh_interval / 2, 5)
+        self._current: Optional[ViewSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._refresher = None
+        self.builds = 0
+
+    def get(self) -> ViewSnapshot:
+        """The current snapshot; builds synchronously only if none exists yet"""
+        self._ensure_refresher()
+        current = self._current
+        if current is None:
+            return self.refresh()
+        if current.age >= self.refresh_interval:
+            self._wake.set()  # serve stale, revalidate in the background
+        return current
+
+    def refresh(self) -> ViewSnapshot:
+        """Adopt a fresh shared snapshot or rebuild under the lease"""
+        with self._refresh_lock:
+            shared = self._load_shared()
+            if shared and shared.age < self.refresh_interval:
+                return self._adopt(shared)
+            if self.store is None or self.store.claim_view(self.name, self.lease_seconds):
+                return self._adopt(self._build(publish=self.store is not None))
+            # Another worker is rebuilding, keep serving what exists
+            if shared:
+                return self._adopt(shared)
+            if self._current:
+                return self._current
+            return self._adopt(self._build(publish=False))
+
+    def _load_shared(self) -> Optional[ViewSnapshot]:
+        if self.store is None:
+            return None
+        row = self.store.load_view(self.name)
+        if row is None:
+            return None
+        built_at, etag, payload = row
+        if self._current and self._current.etag == etag:
+            return ViewSnapshot(self._current.payload, etag, built_at)
+        return ViewSnapshot(json.loads(payload), etag, built_at)
+
+    def _build(self, publish: bool) -> ViewSnapshot:
+        payload = self.builder()
+        payload_json = json.dumps(payload, sort_keys=True, default=str)
+        snapshot = ViewSnapshot(json.loads(payload_json), make_etag(payload_json), time.time())
+        self.builds += 1
+        if publish:
+            self.store.save_view(self.name, snapshot.built_at, snapshot.etag, payload_json)
+        return snapshot
+
+    def _adopt(self, snapshot: ViewSnapshot) -> ViewSnapshot:
+        with self._lock:
+            self._current = snapshot
+        return snapshot
+
+    def _ensure_refresher(self):
+        if self._refresher is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name=f"view-{self.name}", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stopped.is_set():
+            current = self._current
+            wait = self.refresh_interval - current.age if current else 0
+            if wait > 0:
+                self._wake.wait(wait)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                if self.refresh().age >= self.refresh_interval:
+                    # Another worker holds the lease, check back shortly
+                    self._stopped.wait(1.0)
+            except Exception as e:
+                print(f"Error refreshing {self.name} view: {e}")
+                self._stopped.wait(min(self.refresh_interval, 30))
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
@@ -0,0 +1,66 @@
+"""
+Operator and transport type usage with running totals.
+
+Counts are kept per (operator, transport_type) together with per-operator,
+per-type and grand totals, all updated on every event. Market shares are
+read in O(#operators + #types) with no re-summing of the nested counts.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+class OperatorAggregates:
+    """Incrementally maintained operator / transport type counters"""
+
+    def __init__(self, counts: Optional[Dict[str, Dict[str, int]]] = None):
+        self._lock = threading.Lock()
+        self.reset(counts or {})
+
+    def reset(self, counts: Dict[str, Dict[str, int]]):
+        with self._lock:
+            self._counts = defaultdict(lambda: defaultdict(int))
+            self._operator_totals = defaultdict(int)
+            self._type_totals = defaultdict(int)
+            self.total = 0
+            for operator, types in counts.items():
+                for transport_type, count in types.items():
+                    self._add(operator, transport_type, count)
+
+    def _add(self, operator: str, transport_type: str, count: int):
+        self._counts[operator][transport_type] += count
+        self._operator_totals[operator] += count
+        self._type_totals[transport_type] += count
+        self.total += count
+
+    def add(self, operator: Optional[str], transport_type: str, count: int = 1):
+        with self._lock:
+            self._add(operator or 'unknown', transport_type, count)
+
+    def as_dict(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {operator: dict(types) for operator, types in self._counts.items()}
+
+    def summary(self) -> dict:
+        """Operators ranked by usage with shares, plus per-type totals"""
+        with self._lock:
+            total = self.total
+            operators = [
+                {
+                    "operator": operator,
+                    "routes": operator_total,
+                    "types": dict(self._counts[operator]),
+                    "share": round(operator_total / total * 100, 1) if total > 0 else 0
+                }
+                for operator, operator_total in self._operator_totals.items()
+            ]
+            type_totals = dict(self._type_totals)
+        operators.sort(key=lambda x: x['routes'], reverse=True)
+        return {
+            "operators": operators,
+            "transport_types": type_totals,
+            "type_shares": {
+                transport_type: round(count / total * 100, 1) if total > 0 else 0
+                for transport_type, count in type_totals.items()
+            },
+            "total_routes": total
+        }
@@ -0,0 +1,132 @@
+"""
+Cheap per-user pre-filter run before the route geometry check and the DB.
+
+Each ping is compared against the last ping that went through the full path
+for the same user. Pings that cannot change the trip are shed:
+
+    low_accuracy          fix is too coarse to place the user on a corridor
+    duplicate             same position or a resent timestamp
+    stationary            moved less than the movement threshold
+    outside_service_area  no route can be nearby, skip the geometry check
+
+Everything works on in-memory state, a decision costs O(1).
+"""
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+ACCEPT = "accepted"
+LOW_ACCURACY = "low_accuracy"
+DUPLICATE = "duplicate"
+STATIONARY = "stationary"
+OUTSIDE_SERVICE_AREA = "outside_service_area"
+
+# Decisions that skip geometry and DB entirely, only the trip timers move
+SHORT_CIRCUIT = (LOW_ACCURACY, DUPLICATE, STATIONARY)
+
+@dataclass
+class PingFilterConfig:
+    """Thresholds for the ping pre-filter"""
+    max_accuracy_meters: float = 100.0      # coarser fixes are dropped
+    duplicate_meters: float = 1.0           # closer than this counts as the same position
+    min_movement_meters: float = 15.0       # less movement than this is stationary
+    service_area: Optional[Tuple[float, float, float, float]] = None  # (min_lat, min_lon, max_lat, max_lon)
+
+@dataclass
+class LastPing:
+    latitude: float
+    longitude: float
+    timestamp: datetime
+    on_route: bool
+    transport_type: Optional[str] = None
+    corridor_distance: Optional[float] = None   # meters to the nearest route, None if out of range
+
+def _distance_meters(lat1, lon1, lat2, lon2):
+    # Equirectangular approximation, exact enough at the few-metre scale
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000 * math.hypot(x, y)
+
+class PingFilter:
+    """Decides per ping whether the full tracking path has to run."""
+
+    def __init__(self, config: Optional[PingFilterConfig] = None):
+        self.config = config or PingFilterConfig()
+        self._last: Dict[int, LastPing] = {}
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def check(self, user_id: int, lat: float, lon: float, timestamp: datetime,
+              accuracy: Optional[float] = None, service_area=None) -> Tuple[str, Optional[LastPing]]:
+        """
+        Classify a ping.
+
+        Returns (decision, last) where last is the last fully processed ping of
+        the user, if any. Its on_route verdict still holds for short-circuited pings.
+        """
+        area = self.config.service_area or service_area
+        with self._lock:
+            last = self._last.get(user_id)
+            decision = self._decide(last, lat, lon, timestamp, accuracy, area)
+            self.counters["total"] += 1
+            self.counters[decision] += 1
+            return decision, last
+
+    def _decide(self, last, lat, lon, timestamp, accuracy, area):
+        if accuracy is not None and accuracy > self.config.max_accuracy_meters:
+            return LOW_ACCURACY
+
+        if last is not None:
+            if timestamp <= last.timestamp:
+                return DUPLICATE
+            moved = _distance_meters(last.latitude, last.longitude, lat, lon)
+            if moved < self.config.duplicate_meters:
+                return DUPLICATE
+            if moved < self.config.min_movement_meters:
+                return STATIONARY
+
+        if area is not None:
+            min_lat, min_lon, max_lat, max_lon = area
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                return OUTSIDE_SERVICE_AREA
+
+        return ACCEPT
+
+    def record(self, user_id: int, lat: float, lon: float, timestamp: datetime, on_route: bool,
+               transport_type: Optional[str] = None, corridor_distance: Optional[float] = None):
+        """Remember a ping that went through the full path"""
+        with self._lock:
+            self._last[user_id] = LastPing(lat, lon, timestamp, on_route, transport_type, corridor_distance)
+
+    def forget(self, user_id: int):
+        with self._lock:
+            self._last.pop(user_id, None)
+
+    def evict(self, older_than: datetime) -> int:
+        """Drop users whose last full ping is older than older_than; returns how many"""
+        with self._lock:
+            quiet = [user_id for user_id, last in self._last.items() if last.timestamp < older_than]
+            for user_id in quiet:
+                del self._last[user_id]
+            return len(quiet)
+
+    def get_stats(self) -> dict:
+        """Counters of filter decisions and the share of pings that skipped work"""
+        with self._lock:
+            total = self.counters["total"]
+            shed = sum(self.counters[d] for d in SHORT_CIRCUIT)
+            return {
+                "total_pings": total,
+                "accepted": self.counters[ACCEPT],
+                "low_accuracy": self.counters[LOW_ACCURACY],
+                "duplicate": self.counters[DUPLICATE],
+                "stationary": self.counters[STATIONARY],
+                "outside_service_area": self.counters[OUTSIDE_SERVICE_AREA],
+                "skipped_route_checks": shed + self.counters[OUTSIDE_SERVICE_AREA],
+                "skipped_db_round_trips": shed,
+                "shed_percentage": round(shed / total * 100, 2) if total else 0.0,
+                "tracked_users": len(self._last),
+            }
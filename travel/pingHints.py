@@ -0,0 +1,67 @@
+"""
+Server-driven ping interval hints.
+
+/gps/track tells the client when the next ping is worth sending. The interval
+depends on the trip state, how far the user is from the nearest route corridor
+and how fast they move:
+
+    candidate / ending      short, the session is about to be confirmed or closed
+    riding                  medium, longer on fast rides where the corridor is obvious
+    idle near a corridor    short enough to catch the start of a trip
+    idle far away           long, nothing can happen until the user gets closer
+    no corridor in range    longest, the location context search found no route
+
+The corridor distance comes from the location context, which only searches
+routes within travel.CONTEXT_RADIUS_METERS (1000 m), so far_corridor_meters
+has to stay below that radius or the "far" band is never reached.
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .sessionEngine import IDLE, CANDIDATE, RIDING, ENDING
+
+@dataclass
+class PingIntervalConfig:
+    """Recommended intervals (seconds) and the distance/speed bands they apply to"""
+    candidate_seconds: int = 10
+    ending_seconds: int = 15
+    riding_seconds: int = 30
+    riding_fast_seconds: int = 60
+    idle_near_seconds: int = 20
+    idle_mid_seconds: int = 60
+    idle_far_seconds: int = 120
+    idle_outside_seconds: int = 300
+    near_corridor_meters: float = 200.0
+    far_corridor_meters: float = 500.0   # below the 1000 m location context search radius
+    fast_speed_mps: float = 15.0        # ~54 km/h, rail and express buses
+    moving_speed_mps: float = 3.0       # faster than walking
+
+def recommend_ping_interval(state: str, corridor_distance_m: Optional[float], speed_mps: Optional[float],
+                            config: Optional[PingIntervalConfig] = None) -> Tuple[int, str]:
+    """
+    Pick the next ping interval.
+
+    corridor_distance_m is None when no corridor is within search range.
+    Returns (seconds, reason).
+    """
+    config = config or PingIntervalConfig()
+
+    if state == CANDIDATE:
+        return config.candidate_seconds, "candidate_session"
+    if state == ENDING:
+        return config.ending_seconds, "session_ending"
+    if state == RIDING:
+        if speed_mps is not None and speed_mps >= config.fast_speed_mps:
+            return config.riding_fast_seconds, "riding_fast"
+        return config.riding_seconds, "riding"
+
+    # IDLE
+    if corridor_distance_m is None:
+        return config.idle_outside_seconds, "no_corridor_nearby"
+    if corridor_distance_m <= config.near_corridor_meters:
+        if speed_mps is not None and speed_mps >= config.moving_speed_mps:
+            return config.candidate_seconds, "moving_near_corridor"
+        return config.idle_near_seconds, "near_corridor"
+    if corridor_distance_m <= config.far_corridor_meters:
+        return config.idle_mid_seconds, "approaching_corridor"
+    return config.idle_far_seconds, "far_from_corridor"
@@ -0,0 +1,106 @@
+"""
+Ring-buffer counters for "how many in the last N minutes" questions.
+
+A RollingCounter is a fixed ring of time slots. Each position remembers which
+absolute slot it currently holds, so an expired slot is detected and reset
+when it is next written and skipped when read; nothing ever sweeps the ring.
+An update touches one slot, and a window read visits at most `slots`
+positions, independent of how many events were counted.
+
+WindowedCounter pairs a per-minute ring covering the last hour with a
+per-hour ring covering the last week and answers each window from the finer
+ring that spans it. Hour-ring windows are aligned to whole hours, including
+the current partial hour.
+"""
+import threading
+import time
+from collections import Counter
+from typing import Hashable, List, Optional, Tuple
+
+class RollingCounter:
+    """Per-key counts in `slots` buckets of `slot_seconds` each"""
+
+    def __init__(self, slot_seconds: int, slots: int):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self._buckets = [Counter() for _ in range(slots)]
+        self._totals = [0] * slots
+        self._slot_ids = [-1] * slots
+        self._lock = threading.Lock()
+
+    @property
+    def span_seconds(self) -> int:
+        return self.slot_seconds * self.slots
+
+    def _slot_id(self, timestamp: Optional[float]) -> int:
+        return int((time.time() if timestamp is None else timestamp) // self.slot_seconds)
+
+    def add(self, key: Hashable, count: int = 1, timestamp: Optional[float] = None):
+        slot_id = self._slot_id(timestamp)
+        pos = slot_id % self.slots
+        with self._lock:
+            held = self._slot_ids[pos]
+            if held > slot_id:
+                return  # older than the ring, already overwritten
+            if held != slot_id:
+                self._buckets[pos] = Counter()
+                self._totals[pos] = 0
+                self._slot_ids[pos] = slot_id
+            self._buckets[pos][key] += count
+            self._totals[pos] += count
+
+    def _live_positions(self, window_seconds: float, now: Optional[float]):
+        current = self._slot_id(now)
+        count = min(self.slots, max(1, -(-int(window_seconds) // self.slot_seconds)))
+        for slot_id in range(current - count + 1, current + 1):
+            pos = slot_id % self.slots
+            if self._slot_ids[pos] == slot_id:
+                yield pos
+
+    def count(self, key: Hashable, window_seconds: float, now: Optional[float] = None) -> int:
+        with self._lock:
+            return sum(self._buckets[pos].get(key, 0) for pos in self._live_positions(window_seconds, now))
+
+    def total(self, window_seconds: float, now: Optional[float] = None) -> int:
+        with self._lock:
+            return sum(self._totals[pos] for pos in self._live_positions(window_seconds, now))
+
+    def counts(self, window_seconds: float, now: Optional[float] = None) -> Counter:
+        merged = Counter()
+        with self._lock:
+            for pos in self._live_positions(window_seconds, now):
+                merged.update(self._buckets[pos])
+        return merged
+
+    def top(self, window_seconds: float, limit: int = 10, now: Optional[float] = None) -> List[Tuple[Hashable, int]]:
+        return self.counts(window_seconds, now).most_common(limit)
+
+class WindowedCounter:
+    """Minute resolution for the last hour, hour resolution for the last week"""
+
+    def __init__(self, minute_slots: int = 60, hour_slots: int = 168):
+        self.minutes = RollingCounter(60, minute_slots)
+        self.hours = RollingCounter(3600, hour_slots)
+
+    @property
+    def max_window_seconds(self) -> int:
+        return self.hours.span_seconds
+
+    def add(self, key: Hashable, count: int = 1, timestamp: Optional[float] = None):
+        self.minutes.add(key, count, timestamp)
+        self.hours.add(key, count, timestamp)
+
+    def _ring(self, window_seconds: float) -> RollingCounter:
+        return self.minutes if window_seconds <= self.minutes.span_seconds else self.hours
+
+    def count(self, key: Hashable, window_seconds: float, now: Optional[float] = None) -> int:
+        return self._ring(window_seconds).count(key, window_seconds, now)
+
+    def total(self, window_seconds: float, now: Optional[float] = None) -> int:
+        return self._ring(window_seconds).total(window_seconds, now)
+
+    def counts(self, window_seconds: float, now: Optional[float] = None) -> Counter:
+        return self._ring(window_seconds).counts(window_seconds, now)
+
+    def top(self, window_seconds: float, limit: int = 10, now: Optional[float] = None) -> List[Tuple[Hashable, int]]:
+        return self._ring(window_seconds).top(window_seconds, limit, now)
@@ -0,0 +1,218 @@
+"""
+Trip session state machine.
+
+Every GPS ping for a user moves that user's trip through
+
+    idle -> candidate -> riding <-> ending -> idle
+
+Each transition only looks at the user's in-memory TripState, so a ping costs
+O(1) no matter how long the trip already is. The engine never touches the
+database; gpsinput persists whatever the returned TripTransition describes.
+State lives per process: a worker hydrates it from the latest TravelHistory
+row, rehydrates when that row shows another worker moved the trip on, and
+evicts users that went quiet.
+"""
+import math
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+
+IDLE = "idle"
+CANDIDATE = "candidate"
+RIDING = "riding"
+ENDING = "ending"
+
+@dataclass
+class SessionTimeouts:
+    """Timeouts (seconds) driving the trip state machine"""
+    confirm_seconds: float = 120        # candidate becomes riding once the trip lasts this long
+    ending_grace_seconds: float = 300   # off-route time tolerated before a ride is closed
+    stale_seconds: float = 900          # ping gap after which an open trip is closed
+
+@dataclass
+class TripState:
+    """In-memory state of one user's current trip"""
+    state: str = IDLE
+    travel_id: Optional[int] = None
+    started_at: Optional[datetime] = None
+    last_ping_at: Optional[datetime] = None
+    last_on_route_at: Optional[datetime] = None
+    ending_since: Optional[datetime] = None
+    latitudes: List[float] = field(default_factory=list)
+    longitudes: List[float] = field(default_factory=list)
+    distance_km: float = 0.0
+    persisted_points: int = 0  # how many of the points are already stored in TravelHistory
+
+    @property
+    def duration_seconds(self) -> float:
+        if not self.started_at or not self.last_on_route_at:
+            return 0.0
+        return (self.last_on_route_at - self.started_at).total_seconds()
+
+@dataclass
+class TripTransition:
+    """Outcome of a single ping"""
+    session_type: str               # "new", "continuing", "ending", "ended", "invalid" or "none"
+    state: str                      # state after the ping
+    trip: Optional[TripState] = None        # open trip after the ping
+    closed_trip: Optional[TripState] = None # trip closed by this ping
+    closed_valid: bool = False              # closed trip was long enough to count
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+class TripSessionEngine:
+    """Per-user trip state machine with O(1) transitions and pluggable timeouts."""
+
+    def __init__(self, timeouts: Optional[SessionTimeouts] = None):
+        self.timeouts = timeouts or SessionTimeouts()
+        self._states: Dict[int, TripState] = {}
+        self._lock = threading.Lock()
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self._states
+
+    def get_state(self, user_id: int) -> TripState:
+        return self._states.get(user_id) or TripState()
+
+    def hydrate(self, user_id: int, trip: Optional[TripState] = None):
+        """Seed a user's state, e.g. from the latest TravelHistory row"""
+        with self._lock:
+            self._states[user_id] = trip or TripState()
+
+    def attach_travel_id(self, user_id: int, travel_id: int):
+        """Record the DB id of a trip opened by a "new" transition"""
+        with self._lock:
+            trip = self._states.get(user_id)
+            if trip and trip.state != IDLE:
+                trip.travel_id = travel_id
+
+    def forget(self, user_id: int):
+        with self._lock:
+            self._states.pop(user_id, None)
+
+    def evict(self, silent_since: datetime) -> int:
+        """
+        Drop idle users and open trips without a ping since silent_since.
+        Both are rebuilt from the database on the user's next ping, where a
+        trip silent for longer than stale_seconds is closed as usual.
+        Returns the number of users dropped.
+        """
+        with self._lock:
+            quiet = [user_id for user_id, trip in self._states.items()
+                     if trip.state == IDLE or trip.last_ping_at is None or trip.last_ping_at < silent_since]
+            for user_id in quiet:
+                del self._states[user_id]
+            return len(quiet)
+
+    def process_ping(self, user_id: int, on_route: bool, lat: float, lon: float, timestamp: datetime) -> TripTransition:
+        """Advance the user's trip by one ping."""
+        with self._lock:
+            trip = self._states.get(user_id)
+            if trip is None:
+                trip = self._states[user_id] = TripState()
+
+            # A long silence closes whatever was open before looking at this ping
+            closed, closed_valid = self._close_if_stale(user_id, trip, timestamp)
+            trip = self._states[user_id]
+
+            transition = self._step(user_id, trip, on_route, lat, lon, timestamp)
+            return self._merge_closed(transition, closed, closed_valid)
+
+    def touch(self, user_id: int, on_route: Optional[bool], timestamp: datetime) -> TripTransition:
+        """
+        Advance the trip timers for a ping that carries no new position.
+
+        on_route is the verdict of the user's last full ping, or None when the
+        position is unusable. Never opens a trip and never appends a point.
+        """
+        with self._lock:
+            trip = self._states.get(user_id)
+            if trip is None or trip.state == IDLE:
+                return TripTransition("none", IDLE)
+
+            closed, closed_valid = self._close_if_stale(user_id, trip, timestamp)
+            if closed is not None:
+                return self._merge_closed(TripTransition("none", IDLE), closed, closed_valid)
+
+            if on_route is not None:
+                return self._step(user_id, trip, on_route, None, None, timestamp)
+
+            trip.last_ping_at = timestamp
+            if trip.state == ENDING:
+                return self._step_ending(user_id, trip, timestamp)
+            return TripTransition("continuing", trip.state, trip=trip)
+
+    def _close_if_stale(self, user_id, trip, timestamp):
+        if trip.state != IDLE and trip.last_ping_at and \
+                (timestamp - trip.last_ping_at).total_seconds() > self.timeouts.stale_seconds:
+            return self._close(user_id, trip)
+        return None, False
+
+    def _merge_closed(self, transition, closed, closed_valid) -> TripTransition:
+        if closed is not None and transition.closed_trip is None:
+            transition.closed_trip = closed
+            transition.closed_valid = closed_valid
+            if transition.session_type == "none":
+                transition.session_type = "ended" if closed_valid else "invalid"
+        return transition
+
+    def _step(self, user_id, trip, on_route, lat, lon, timestamp) -> TripTransition:
+        """One transition; lat/lon of None extends the trip in time without adding a point"""
+        if trip.state == IDLE:
+            if not on_route or lat is None:
+                return TripTransition("none", IDLE)
+            trip = self._states[user_id] = TripState(
+                state=CANDIDATE,
+                started_at=timestamp,
+                last_ping_at=timestamp,
+                last_on_route_at=timestamp,
+                latitudes=[lat],
+                longitudes=[lon],
+            )
+            return TripTransition("new", CANDIDATE, trip=trip)
+
+        trip.last_ping_at = timestamp
+
+        if on_route:
+            if lat is None:
+                trip.last_on_route_at = timestamp
+            else:
+                self._append(trip, lat, lon, timestamp)
+            trip.ending_since = None
+            if trip.state == ENDING or trip.duration_seconds >= self.timeouts.confirm_seconds:
+                trip.state = RIDING
+            return TripTransition("continuing", trip.state, trip=trip)
+
+        if trip.state == CANDIDATE:
+            closed, valid = self._close(user_id, trip)
+            return TripTransition("ended" if valid else "invalid", IDLE, closed_trip=closed, closed_valid=valid)
+
+        if trip.state == RIDING:
+            trip.state = ENDING
+            trip.ending_since = timestamp
+            return TripTransition("ending", ENDING, trip=trip)
+
+        return self._step_ending(user_id, trip, timestamp)
+
+    def _step_ending(self, user_id, trip, timestamp) -> TripTransition:
+        # ENDING: close once the grace period has run out
+        if (timestamp - trip.ending_since).total_seconds() >= self.timeouts.ending_grace_seconds:
+            closed, valid = self._close(user_id, trip)
+            return TripTransition("ended" if valid else "invalid", IDLE, closed_trip=closed, closed_valid=valid)
+        return TripTransition("ending", ENDING, trip=trip)
+
+    def _append(self, trip: TripState, lat, lon, timestamp):
+        if trip.latitudes:
+            trip.distance_km += _haversine_km(trip.latitudes[-1], trip.longitudes[-1], lat, lon)
+        trip.latitudes.append(lat)
+        trip.longitudes.append(lon)
+        trip.last_on_route_at = timestamp
+
+    def _close(self, user_id, trip: TripState):
+        self._states[user_id] = TripState()
+        closed = replace(trip, state=IDLE)
+        return closed, closed.duration_seconds >= self.timeouts.confirm_seconds
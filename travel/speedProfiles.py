@@ -0,0 +1,229 @@
+"""
+Fixed-size streaming speed histograms and their batched SQLite store.
+
+A SpeedHistogram keeps counts in equal-width km/h bins (the last bin absorbs
+everything faster) plus running count, sum, sum of squares, min and max, so
+memory per transport type is constant however many speeds it has seen.
+Mean and variance are exact; quantiles are interpolated inside a bin.
+
+Histograms serialise to a compact little-endian blob (header + uint32 bin
+counts, a few hundred bytes) instead of a pickled list of floats. The
+PatternStore writes dirty patterns on a timer over one long-lived connection,
+opened on first use.
+"""
+import atexit
+import math
+import os
+import pickle
+import sqlite3
+import struct
+import sys
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, Optional
+
+_MAGIC = b"SH1"
+# magic, bin width, bin count, sample count, sum, sum of squares, min, max
+_HEADER = struct.Struct("<3sfHQdddd")
+
+class SpeedHistogram:
+    """Constant-memory distribution of speeds in km/h"""
+
+    def __init__(self, bin_width: float = 2.0, max_speed: float = 200.0):
+        self.bin_width = float(bin_width)
+        self.bins = array("I", [0]) * max(1, int(math.ceil(max_speed / bin_width)))
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bin(self, speed: float) -> int:
+        return min(max(int(speed / self.bin_width), 0), len(self.bins) - 1)
+
+    def add(self, speed: float):
+        if speed is None or speed < 0 or math.isnan(speed):
+            return
+        self.bins[self._bin(speed)] += 1
+        self.count += 1
+        self.total += speed
+        self.total_sq += speed * speed
+        self.min = min(self.min, speed)
+        self.max = max(self.max, speed)
+
+    def add_many(self, speeds: Iterable[float]):
+        for speed in speeds:
+            self.add(speed)
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def variance(self) -> float:
+        """Sample variance, matching statistics.variance"""
+        if self.count < 2:
+            return 0.0
+        return max(self.total_sq - self.total * self.total / self.count, 0.0) / (self.count - 1)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = min(max(q, 0.0), 1.0) * self.count
+        seen = 0
+        for i, n in enumerate(self.bins):
+            if n and seen + n >= target:
+                low = max(i * self.bin_width, self.min)
+                high = min((i + 1) * self.bin_width, self.max) if i < len(self.bins) - 1 else self.max
+                return low + (high - low) * (target - seen) / n
+            seen += n
+        return self.max
+
+    def density(self, speed: float, smoothing: float = 0.5) -> float:
+        """Smoothed probability of landing in speed's bin, never zero"""
+        return (self.bins[self._bin(speed)] + smoothing) / (self.count + smoothing * len(self.bins))
+
+    def to_bytes(self) -> bytes:
+        bins = array("I", self.bins)
+        if sys.byteorder != "little":
+            bins.byteswap()
+        header = _HEADER.pack(_MAGIC, self.bin_width, len(self.bins), self.count, self.total, self.total_sq,
+                              self.min if self.count else 0.0, self.max if self.count else 0.0)
+        return header + bins.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpeedHistogram":
+        magic, bin_width, n_bins, count, total, total_sq, low, high = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("not a speed histogram blob")
+        histogram = cls(bin_width, bin_width * n_bins)
+        histogram.bins = array("I")
+        histogram.bins.frombytes(data[_HEADER.size:_HEADER.size + 4 * n_bins])
+        if sys.byteorder != "little":
+            histogram.bins.byteswap()
+        histogram.count, histogram.total, histogram.total_sq = count, total, total_sq
+        if count:
+            histogram.min, histogram.max = low, high
+        return histogram
+
+    @classmethod
+    def from_blob(cls, data: bytes, bin_width: float = 2.0, max_speed: float = 200.0) -> "SpeedHistogram":
+        """Decode a stored profile, including legacy pickled speed lists"""
+        if data and data[:len(_MAGIC)] == _MAGIC:
+            return cls.from_bytes(data)
+        histogram = cls(bin_width, max_speed)
+        if data:
+            histogram.add_many(pickle.loads(data))
+        return histogram
+
+class PatternStore:
+    """Batched writer for transport_patterns rows over a single connection"""
+
+    def __init__(self, path: str, flush_interval: float = 10.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._dirty: Dict[str, Callable[[], tuple]] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+        self._connection: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The store's connection, opened (and the file created) on first use"""
+        if self._connection is None:
+            with self._open_lock:
+                if self._connection is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    with conn:
+                        conn.execute('''
+                            CREATE TABLE IF NOT EXISTS transport_patterns (
+                                transport_type TEXT PRIMARY KEY,
+                                speed_profile BLOB,
+                                stop_frequency REAL,
+                                route_geometry TEXT,
+                                confidence REAL,
+                                sample_count INTEGER
+                            )
+                        ''')
+                    self._connection = conn
+        return self._connection
+
+    def exists(self) -> bool:
+        """Whether the store file has been created yet"""
+        return self._connection is not None or os.path.exists(self.path)
+
+    def load(self):
+        """Rows as (transport_type, speed_profile blob, stop_frequency, route_geometry, confidence, sample_count)"""
+        with self._db_lock:
+            return self._conn.execute('''
+                SELECT transport_type, speed_profile, stop_frequency,
+                       route_geometry, confidence, sample_count
+                FROM transport_patterns
+            ''').fetchall()
+
+    def mark_dirty(self, transport_type: str, row_factory: Callable[[], tuple]):
+        """
+        Queue a pattern for the next flush. row_factory is called at flush
+        time, so repeated updates to one type cost a single write.
+        """
+        with self._lock:
+            self._dirty[transport_type] = row_factory
+        self._ensure_flusher()
+
+    def flush(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        try:
+            rows = [(transport_type,) + row_factory() for transport_type, row_factory in dirty.items()]
+            with self._db_lock, self._conn:
+                self._conn.executemany('''
+                    INSERT OR REPLACE INTO transport_patterns
+                    (transport_type, speed_profile, stop_frequency, route_geometry, confidence, sample_count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+        except sqlite3.Error as e:
+            print(f"Transport pattern flush failed, retrying later: {e}")
+            with self._lock:
+                for transport_type, row_factory in dirty.items():
+                    self._dirty.setdefault(transport_type, row_factory)
+            return 0
+        return len(rows)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="pattern-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Transport pattern flusher error: {e}")
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        try:
+            self.flush()
+            with self._db_lock:
+                if self._connection is not None:
+                    self._connection.close()
+        except Exception as e:
+            print(f"Error closing transport pattern store: {e}")
@@ -0,0 +1,161 @@
+"""
+Feature-based transport type classifier for whole trips.
+
+Each trip becomes a fixed-length feature row: speed level and spread,
+stop spacing, dwell share and the map-matched route type (one-hot, weighted
+by how much of the trip matched). A multinomial logistic regression over
+standardised features is trained offline with full-batch gradient descent
+and scored with a single matrix product, so predict_many handles thousands
+of trips per call.
+
+Stored trips only carry coordinates plus total distance and duration, so
+points are assumed evenly spaced in time; segment speeds are relative to the
+trip's average pace rather than true instantaneous speeds.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+ROUTE_TYPES = ("bus", "tram", "train", "metro", "ferry")
+FEATURE_NAMES = [
+    "speed_mean_kmh", "speed_p10_kmh", "speed_p50_kmh", "speed_p90_kmh", "speed_cv",
+    "stop_spacing_km", "dwell_fraction", "distance_km",
+] + [f"matched_{route_type}" for route_type in ROUTE_TYPES]
+_MATCHED_OFFSET = FEATURE_NAMES.index("matched_bus")
+
+STOP_SPEED_KMH = 5.0
+EARTH_RADIUS_KM = 6371.0
+
+def _segment_km(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat1, lat2 = np.radians(lats[:-1]), np.radians(lats[1:])
+    dlat = lat2 - lat1
+    dlon = np.radians(lons[1:] - lons[:-1])
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def trip_features(lats: Sequence[float], lons: Sequence[float], duration_seconds: float,
+                  distance_km: Optional[float] = None, matched_type: Optional[str] = None,
+                  matched_ratio: float = 0.0) -> np.ndarray:
+    """Feature row (ordered as FEATURE_NAMES) for one trip"""
+    row = np.zeros(len(FEATURE_NAMES))
+    lats = np.asarray(lats if lats is not None else [], dtype=float)
+    lons = np.asarray(lons if lons is not None else [], dtype=float)
+    n = min(len(lats), len(lons))
+    segments = _segment_km(lats[:n], lons[:n]) if n > 1 else np.zeros(0)
+    if distance_km is None:
+        distance_km = float(segments.sum())
+    hours = (duration_seconds or 0) / 3600
+
+    if hours > 0:
+        row[0] = distance_km / hours
+    if len(segments) and hours > 0:
+        speeds = segments / (hours / len(segments))
+        row[1:4] = np.percentile(speeds, [10, 50, 90])
+        mean = speeds.mean()
+        row[4] = speeds.std() / mean if mean > 0 else 0.0
+        slow = speeds < STOP_SPEED_KMH
+        # A stop is a run of slow segments
+        stops = int(slow[0]) + int(np.count_nonzero(slow[1:] & ~slow[:-1]))
+        row[5] = distance_km / (stops + 1)
+        row[6] = slow.mean()
+    else:
+        row[1:4] = row[0]
+        row[5] = distance_km
+    row[7] = distance_km
+    if matched_type in ROUTE_TYPES:
+        row[_MATCHED_OFFSET + ROUTE_TYPES.index(matched_type)] = matched_ratio
+    return row
+
+def build_feature_matrix(trips: Iterable[dict]) -> np.ndarray:
+    """
+    Stack trip_features over dicts with keys lats, lons, duration and
+    optionally distance, matched_type, matched_ratio.
+    """
+    rows = [
+        trip_features(trip.get("lats"), trip.get("lons"), trip.get("duration", 0), trip.get("distance"),
+                      trip.get("matched_type"), trip.get("matched_ratio", 0.0))
+        for trip in trips
+    ]
+    return np.vstack(rows) if rows else np.zeros((0, len(FEATURE_NAMES)))
+
+class TransportClassifier:
+    """Multinomial logistic regression over trip feature rows"""
+
+    def __init__(self, classes: Optional[List[str]] = None, weights: Optional[np.ndarray] = None,
+                 mean: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.classes = list(classes or [])
+        self.weights = weights
+        self.mean = mean
+        self.scale = scale
+
+    @property
+    def is_trained(self) -> bool:
+        return self.weights is not None and len(self.classes) > 0
+
+    def _design(self, features: np.ndarray) -> np.ndarray:
+        standardised = (np.asarray(features, dtype=float) - self.mean) / self.scale
+        return np.hstack([standardised, np.ones((standardised.shape[0], 1))])
+
+    def fit(self, features: np.ndarray, labels: Sequence[str], epochs: int = 500,
+            learning_rate: float = 0.5, l2: float = 1e-3, route_type_dropout: bool = True) -> "TransportClassifier":
+        """
+        Train on labelled rows. With route_type_dropout every row is also added
+        with the matched route features zeroed, so unmatched trips still get a
+        speed-and-stop based answer.
+        """
+        features = np.asarray(features, dtype=float)
+        labels = np.asarray(labels)
+        if route_type_dropout:
+            dropped = features.copy()
+            dropped[:, _MATCHED_OFFSET:] = 0.0
+            features = np.vstack([features, dropped])
+            labels = np.concatenate([labels, labels])
+
+        self.classes = sorted(set(labels.tolist()))
+        targets = np.zeros((len(labels), len(self.classes)))
+        targets[np.arange(len(labels)), np.searchsorted(self.classes, labels)] = 1.0
+
+        self.mean = features.mean(axis=0)
+        self.scale = features.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        design = self._design(features)
+        self.weights = np.zeros((design.shape[1], len(self.classes)))
+
+        for _ in range(epochs):
+            gradient = design.T @ (self._softmax(design @ self.weights) - targets) / len(design)
+            gradient[:-1] += l2 * self.weights[:-1]
+            self.weights -= learning_rate * gradient
+        return self
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        features = np.atleast_2d(np.asarray(features, dtype=float))
+        return self._softmax(self._design(features) @ self.weights)
+
+    def predict_many(self, features: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """(predicted transport types, confidences) for a batch of feature rows"""
+        features = np.atleast_2d(np.asarray(features, dtype=float))
+        if not self.is_trained or features.shape[0] == 0:
+            return ["unknown"] * features.shape[0], np.zeros(features.shape[0])
+        probabilities = self.predict_proba(features)
+        best = probabilities.argmax(axis=1)
+        return [self.classes[i] for i in best], probabilities[np.arange(len(best)), best]
+
+    def accuracy(self, features: np.ndarray, labels: Sequence[str]) -> float:
+        predicted, _ = self.predict_many(features)
+        return float(np.mean([p == l for p, l in zip(predicted, labels)])) if len(labels) else 0.0
+
+    def save(self, path: str):
+        np.savez(path, classes=np.array(self.classes), weights=self.weights, mean=self.mean,
+                 scale=self.scale, feature_names=np.array(FEATURE_NAMES))
+
+    @classmethod
+    def load(cls, path: str) -> "TransportClassifier":
+        with np.load(path) as data:
+            if list(data["feature_names"]) != FEATURE_NAMES:
+                raise ValueError("model was trained on a different feature set, retrain it")
+            return cls([str(c) for c in data["classes"]], data["weights"], data["mean"], data["scale"])